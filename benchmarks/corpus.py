@@ -0,0 +1,102 @@
+"""
+Synthetic corpus generator for benchmarks.
+
+Usage:
+  python benchmarks/corpus.py <site_root> --pages 10000
+
+Builds a throwaway site root (data/site.yaml copied from the repo, an empty
+plan/manifest) and writes N gate-passing pages under <site_root>/content/pages.
+"""
+import argparse
+import json
+import random
+import shutil
+from pathlib import Path
+
+import yaml
+
+from mock_server import REPO_ROOT, build_page, load_outline
+
+HUBS = ["work-career", "money-stress", "burnout-load", "milestones", "social-norms"]
+PAGE_TYPES = ["is-it-normal", "checklist", "red-flags", "myth-vs-reality", "explainer"]
+TOPICS = [
+    "feel anxious about meetings", "feel tired after socialising", "feel behind your friends",
+    "feel guilty about resting", "feel unsure about money", "feel bored at work",
+    "feel nervous before calls", "feel overwhelmed by chores", "feel distant from family",
+    "feel stuck in a routine",
+]
+
+
+def synthetic_title(i: int) -> str:
+    return f"Is it normal to {TOPICS[i % len(TOPICS)]} (case {i})?"
+
+
+def synthetic_slug(i: int) -> str:
+    return f"bench-page-{i:06d}"
+
+
+def init_site(root: Path, plan_items: list[dict] | None = None) -> Path:
+    """Create the directory layout generate_pages.py and quality_gates.py expect."""
+    (root / "data").mkdir(parents=True, exist_ok=True)
+    (root / "scripts").mkdir(parents=True, exist_ok=True)
+    (root / "content" / "pages").mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(REPO_ROOT / "data" / "site.yaml", root / "data" / "site.yaml")
+    (root / "data" / "plan.yaml").write_text(
+        yaml.safe_dump({"items": plan_items or []}, sort_keys=False), encoding="utf-8"
+    )
+    (root / "scripts" / "manifest.json").write_text(
+        json.dumps({"used_titles": [], "generated_this_run": []}), encoding="utf-8"
+    )
+    (root / "scripts" / "titles_pool.txt").write_text("", encoding="utf-8")
+    return root
+
+
+def write_corpus(root: Path, pages: int, contract_hash: str = "bench", seed: int = 0) -> int:
+    """Write `pages` synthetic pages; returns the number written."""
+    outline = load_outline(root / "data" / "site.yaml")
+    rng = random.Random(seed)
+    pages_dir = root / "content" / "pages"
+    meta = {}
+    for i in range(pages):
+        slug = synthetic_slug(i)
+        links = [synthetic_slug(rng.randrange(pages)) for _ in range(3)] if pages > 1 else []
+        data = build_page(
+            synthetic_title(i), outline, links,
+            hub=HUBS[i % len(HUBS)], page_type=PAGE_TYPES[i % len(PAGE_TYPES)], rng=rng,
+        )
+        fm = {
+            "title": data["title"],
+            "slug": slug,
+            "summary": data["summary"],
+            "description": data["description"],
+            "date": "2026-01-01",
+            "hub": data["hub"],
+            "page_type": data["page_type"],
+        }
+        meta[slug] = {"gen_version": "2", "contract_hash": contract_hash, "prompt_hash": "bench"}
+        fm_txt = yaml.safe_dump(fm, sort_keys=False, allow_unicode=True).strip()
+        d = pages_dir / slug
+        d.mkdir(parents=True, exist_ok=True)
+        (d / "index.md").write_text(
+            f"---\n{fm_txt}\n---\n\n**{data['summary']}**\n\n{data['body_md']}\n\n---\n\n*{data['closing_reassurance']}*\n",
+            encoding="utf-8",
+        )
+    (root / "scripts" / "page_meta.json").write_text(json.dumps(meta, sort_keys=True), encoding="utf-8")
+    return pages
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("root")
+    ap.add_argument("--pages", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    root = init_site(Path(args.root))
+    n = write_corpus(root, args.pages, seed=args.seed)
+    print(f"Wrote {n} pages under {root / 'content' / 'pages'}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,312 @@
+"""
+Local mock of an OpenAI-compatible /chat/completions endpoint for benchmarks.
+
+Usage:
+  python benchmarks/mock_server.py --port 8199 --latency lognormal:0.8,0.4 --rate-429 0.05
+
+Responses are canned pages built from the request's "Title:" line and the
+site's outline_h2 contract, so they pass generate_pages.py and quality_gates.py
+unless a fault (429/5xx, truncation, fenced JSON) is injected. bootstrap_site.py
+requests (a JSON "task" prompt) get a site identity or a batch of titles, and
+continue_page tasks get the missing fields and the rest of the body.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import yaml
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+FALLBACK_LINKS = [
+    "is-it-normal-to-feel-stuck-in-your-career",
+    "is-it-normal-to-feel-awkward-at-social-events",
+    "is-it-normal-to-feel-exhausted-after-work-every-day",
+]
+
+# Gate-safe filler: no dates, numbers, first person, directives, superlatives or absolutes.
+SENTENCES = [
+    "This topic often feels confusing at first, and that reaction is common.",
+    "Many people notice the same pattern in different settings.",
+    "The experience tends to vary with context, energy and expectations.",
+    "It can help to see the feeling as information rather than a verdict.",
+    "Small shifts in routine or environment often change how it shows up.",
+    "Different people describe it in different words, which is normal.",
+    "The pattern usually reflects ordinary pressures rather than a personal flaw.",
+    "Naming the feeling clearly tends to make it easier to think about.",
+]
+
+FAQS = [
+    ("Is this feeling common?", "It is widely shared. Many people recognise it once it is named."),
+    ("Does it change over time?", "It often shifts as circumstances shift. The intensity tends to rise and fall."),
+    ("Can it show up in different settings?", "Yes, it can appear at work, at home or with friends. The context shapes how it feels."),
+    ("Why does it feel so personal?", "Feelings like this touch on identity and belonging. That makes them feel close to home."),
+]
+
+
+TITLE_VERBS = [
+    "feel tired after", "feel nervous about", "worry about", "avoid", "overthink", "feel awkward about",
+    "dread", "feel unsure about", "feel guilty about", "feel bored by", "second-guess", "feel drained by",
+]
+TITLE_OBJECTS = [
+    "meetings", "small talk", "group chats", "feedback", "weekends", "phone calls", "deadlines",
+    "saying no", "new routines", "big decisions", "checking messages", "asking for help",
+    "quiet days", "busy seasons", "plans changing", "being noticed", "starting tasks",
+    "finishing projects", "shared spaces", "long conversations",
+]
+
+
+def load_outline(site_config: Path = REPO_ROOT / "data" / "site.yaml") -> list[str]:
+    try:
+        cfg = yaml.safe_load(site_config.read_text(encoding="utf-8")) or {}
+    except Exception:
+        cfg = {}
+    return ((cfg.get("generation") or {}).get("outline_h2")) or []
+
+
+def paragraph(rng: random.Random) -> str:
+    return " ".join(rng.sample(SENTENCES, 3))
+
+
+def build_body(outline: list[str], link_slugs: list[str], rng: random.Random) -> str:
+    out = []
+    for h2 in outline:
+        out.append(f"## {h2}")
+        if h2 == "FAQs":
+            for q, a in FAQS:
+                out.append(f"### {q}")
+                out.append(a)
+            continue
+        if h2 == "Related topics and deeper reading":
+            out.append(paragraph(rng))
+            for s in (link_slugs or FALLBACK_LINKS)[:3]:
+                out.append(f"- [{s.replace('-', ' ').capitalize()}](/pages/{s}/)")
+            continue
+        out.append(paragraph(rng))
+        out.append(paragraph(rng))
+        out.append(paragraph(rng))
+    return "\n\n".join(out)
+
+
+def build_page(title: str, outline: list[str], link_slugs: list[str] | None = None,
+               hub: str = "work-career", page_type: str = "is-it-normal",
+               rng: random.Random | None = None) -> dict:
+    rng = rng or random.Random(title)
+    return {
+        "title": title,
+        "summary": "This is a widely shared experience and it usually makes sense in context.",
+        "description": "A calm, neutral look at a common experience and why it shows up.",
+        "hub": hub,
+        "page_type": page_type,
+        "closing_reassurance": "It is okay to take this one step at a time.",
+        "body_md": build_body(outline, link_slugs or [], rng),
+    }
+
+
+def build_bootstrap(task: dict, max_tokens: int, rng: random.Random) -> dict:
+    """Identity or titles for bootstrap_site.py; titles are capped by max_tokens like a real model."""
+    required = task.get("required_json") or {}
+    if "titles" not in required:
+        return {
+            "site_title": "Calm Answers",
+            "brand": "Calm Answers",
+            "tagline": "Plain explanations of everyday feelings and the situations behind them",
+            "default_meta_description": "Neutral, beginner-friendly explanations of common experiences.",
+            "theme_pack": "modern-sans",
+            "hubs": [{"id": h, "label": h.replace("-", " ").title()} for h in
+                     ("work-career", "money-stress", "burnout-load", "milestones", "social-norms")],
+        }
+    inputs = task.get("inputs") or {}
+    want = min(int(inputs.get("title_count") or 10), max(0, (max_tokens - 150) // 14))
+    where = str(inputs.get("hub") or "").replace("-", " ")
+    titles = []
+    for _ in range(want):
+        titles.append(f"Is it normal to {rng.choice(TITLE_VERBS)} {rng.choice(TITLE_OBJECTS)}"
+                      f"{' in ' + where if where and rng.random() < 0.5 else ''}?")
+    return {"titles": titles}
+
+
+def build_continuation(task: dict, outline: list[str], rng: random.Random) -> dict:
+    """Answer generate_pages.py's continue_page task: the missing fields and the rest of body_md."""
+    page = build_page(str(task.get("title") or ""), outline, rng=rng)
+    inputs = task.get("inputs") or {}
+    out = {}
+    for key in task.get("required_json") or {}:
+        if key == "body_md_rest":
+            missing = [h for h in outline if h in (inputs.get("missing_h2") or [])]
+            out[key] = ".\n\n" + build_body(missing, [], rng) if missing else "."
+        elif key in page:
+            out[key] = page[key]
+    return out
+
+
+def parse_latency(spec: str):
+    """fixed:S | uniform:A,B | lognormal:MU_SECONDS,SIGMA -> callable returning seconds."""
+    kind, _, args = (spec or "fixed:0").partition(":")
+    vals = [float(x) for x in args.split(",") if x.strip()] or [0.0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(vals[0], vals[1] if len(vals) > 1 else vals[0])
+    if kind == "lognormal":
+        import math
+        mu = math.log(max(vals[0], 1e-6))
+        sigma = vals[1] if len(vals) > 1 else 0.25
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    return lambda rng: vals[0]
+
+
+class MockState:
+    def __init__(self, outline: list[str], latency: str = "fixed:0", rate_429: float = 0.0,
+                 rate_5xx: float = 0.0, rate_truncated: float = 0.0, rate_fenced: float = 0.0,
+                 seed: int = 0, honor_max_tokens: bool = False):
+        self.outline = outline
+        self.latency = parse_latency(latency)
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.rate_truncated = rate_truncated
+        self.rate_fenced = rate_fenced
+        self.honor_max_tokens = honor_max_tokens
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "429": 0, "5xx": 0, "truncated": 0, "fenced": 0, "ok": 0, "over_budget": 0}
+
+    def roll(self) -> tuple[float, float, float, float]:
+        """Returns (error roll, shape roll, truncation point, delay) from the seeded rng."""
+        with self.lock:
+            self.counts["requests"] += 1
+            return self.rng.random(), self.rng.random(), self.rng.uniform(0.3, 0.9), self.latency(self.rng)
+
+    def bump(self, key: str) -> None:
+        with self.lock:
+            self.counts[key] += 1
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, code: int, obj: dict) -> None:
+            b = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(b)))
+            self.end_headers()
+            self.wfile.write(b)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_json(404, {"error": "not found"})
+                return
+            n = int(self.headers.get("Content-Length") or 0)
+            req = json.loads(self.rfile.read(n) or b"{}")
+            r, r2, cut, delay = state.roll()
+            time.sleep(delay)
+
+            if r < state.rate_429:
+                state.bump("429")
+                self.send_json(429, {"error": "rate limited"})
+                return
+            r -= state.rate_429
+            if r < state.rate_5xx:
+                state.bump("5xx")
+                self.send_json(503, {"error": "unavailable"})
+                return
+
+            prompt = "\n".join(str(m.get("content") or "") for m in req.get("messages") or [])
+            try:
+                task = json.loads(str((req.get("messages") or [{}])[-1].get("content") or ""))
+            except (json.JSONDecodeError, AttributeError):
+                task = None
+            m = re.search(r"^Title:\s*(.+)$", prompt, flags=re.M)
+            title = m.group(1).strip() if m else "Is it normal to feel this way?"
+            hub = re.search(r"^Hub \(must use exactly\):\s*(\S+)", prompt, flags=re.M)
+            ptype = re.search(r"^Page type \(must use exactly\):\s*(\S+)", prompt, flags=re.M)
+            links = re.findall(r"\(/pages/([a-z0-9-]+)/\)", prompt)
+            page = build_page(
+                title, state.outline, links,
+                hub=hub.group(1) if hub else "work-career",
+                page_type=ptype.group(1) if ptype else "is-it-normal",
+            )
+            if isinstance(task, dict) and task.get("task") == "continue_page":
+                page = build_continuation(task, state.outline, random.Random(r2))
+            elif isinstance(task, dict) and "task" in task:
+                page = build_bootstrap(task, int(req.get("max_tokens") or 1400), random.Random(r2))
+            content = json.dumps(page, ensure_ascii=False)
+
+            finish = "stop"
+            if r2 < state.rate_truncated:
+                state.bump("truncated")
+                content = content[: int(len(content) * cut)]
+                finish = "length"
+            elif r2 < state.rate_truncated + state.rate_fenced:
+                state.bump("fenced")
+                content = f"```json\n{content}\n```"
+            else:
+                state.bump("ok")
+            # Like a real model, stop at max_tokens (about 4 characters per token here). Opt-in:
+            # canned pages run longer than the default budget, so every page would need a continuation.
+            max_tokens = int(req.get("max_tokens") or 0) if state.honor_max_tokens else 0
+            if finish != "length" and max_tokens and len(content) // 4 > max_tokens:
+                state.bump("over_budget")
+                content = content[: max_tokens * 4]
+                finish = "length"
+
+            completion_tokens = max(1, len(content) // 4)
+            prompt_tokens = max(1, len(prompt) // 4)
+            self.send_json(200, {
+                "id": "mock",
+                "object": "chat.completion",
+                "model": req.get("model") or "mock",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+
+    return Handler
+
+
+def start_server(state: MockState, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start in a daemon thread; returns the server (server.server_address has the bound port)."""
+    srv = ThreadingHTTPServer((host, port), make_handler(state))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8199)
+    ap.add_argument("--latency", default="fixed:0", help="fixed:S | uniform:A,B | lognormal:MEDIAN,SIGMA")
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--rate-5xx", type=float, default=0.0)
+    ap.add_argument("--rate-truncated", type=float, default=0.0)
+    ap.add_argument("--rate-fenced", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--honor-max-tokens", action="store_true", help="cut responses at the request's max_tokens")
+    args = ap.parse_args()
+
+    state = MockState(
+        load_outline(), args.latency, args.rate_429, args.rate_5xx,
+        args.rate_truncated, args.rate_fenced, args.seed, args.honor_max_tokens,
+    )
+    srv = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"Mock chat-completions on http://{args.host}:{args.port}/v1")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(state.counts))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
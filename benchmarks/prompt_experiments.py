@@ -0,0 +1,413 @@
+"""
+Offline prompt experiments: compare prompt variants on a fixed title sample.
+
+Usage:
+  python benchmarks/prompt_experiments.py --variants baseline,dedup_rules --titles 40
+  python benchmarks/prompt_experiments.py --variants baseline,reordered=/tmp/site-reordered.yaml
+  python benchmarks/prompt_experiments.py --live --record runs/prompts.jsonl --repeats 2
+  python benchmarks/prompt_experiments.py --replay runs/prompts.jsonl --out prompts.json
+
+A variant is one of:
+  baseline         contract.render_prompts, exactly what generate_pages.py sends
+  dedup_rules      baseline without the repeated "Return ONLY JSON / H2 sections /
+                   Rules" block (the two rule lists are merged)
+  NAME=FILE.yaml   another site config: its prompts AND its gates (e.g. a reordered outline)
+  NAME=FILE.py     a module defining render_prompts(cfg, contract) -> (system, page_prompt)
+
+Every variant gets the same titles (a seeded sample of the plan's todo items and
+titles_pool.txt, or synthetic titles), the same link hints and max_tokens. Each
+response is rendered the way write_page writes it and checked with the full
+quality_gates.validate_page rule set of the variant's contract. A page passes
+when its JSON is complete and every gate passes; there are no continuations or
+retries on invalid pages, so a variant's first-shot quality is what's compared.
+
+Backends:
+  (default)        an in-process mock server (benchmarks/mock_server.py), or
+                   --base-url for one already running: exercises the harness and
+                   measures prompt tokens; the canned pages ignore the prompt
+  --replay FILE    responses recorded with --record, keyed by the exact request;
+                   requests without a recording are reported as missing
+  --live           the site's configured providers (paid calls)
+
+Reported per variant: gate pass rate (Wilson 95% interval), failures per rule,
+mean prompt/completion tokens and latency (95% intervals), latency p50/p90, and
+the pass-rate difference to the first variant.
+"""
+import argparse
+import hashlib
+import importlib.util
+import json
+import math
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import yaml
+
+from corpus import synthetic_title
+from mock_server import MockState, REPO_ROOT, load_outline, start_server
+
+sys.path.insert(0, str(REPO_ROOT / "scripts"))
+# Experiment calls are not factory runs: keep them out of the site's traces unless asked.
+os.environ.setdefault("TRACE_ENABLED", "0")
+
+import generate_pages  # noqa: E402
+import quality_gates  # noqa: E402
+from contract import load_contract, render_prompts  # noqa: E402
+from json_salvage import parse_or_salvage  # noqa: E402
+from link_graph import unlink_missing  # noqa: E402
+from model_router import Endpoint, ModelRouter, load_router  # noqa: E402
+
+Z95 = 1.96
+# Gate messages that embed page-specific details; counted under their fixed prefix.
+RULE_PREFIX_RE = re.compile(r"^(H2 outline mismatch|Broken internal links)")
+NO_RESPONSE = "No response (request failed)"
+NO_RECORDING = "No recorded response"
+INVALID_JSON = "Invalid or incomplete JSON"
+TRUNCATED = "Truncated (finish_reason length)"
+
+
+# ---------------------------
+# Variants
+# ---------------------------
+
+def dedup_rules(cfg: dict, c: dict) -> tuple[str, str]:
+    """Baseline prompt with its second field list / outline block dropped and the two rule lists merged."""
+    system, page_prompt = render_prompts(cfg, c)
+    head, sep, tail = page_prompt.partition("\n\nReturn ONLY JSON with:")
+    _, rules, rest = tail.partition("\nRules:\n")
+    if not sep or not rules:
+        return system, page_prompt
+    return system, f"{head}\n{rest}"
+
+
+BUILTIN_VARIANTS = {
+    "baseline": render_prompts,
+    "dedup_rules": dedup_rules,
+}
+
+
+def load_variant(spec: str, site_cfg: Path) -> dict:
+    """{"name", "render", "cfg_path"} for a --variants entry."""
+    name, _, path = spec.partition("=")
+    name = name.strip()
+    if not path:
+        if name not in BUILTIN_VARIANTS:
+            raise SystemExit(f"Unknown variant {name!r} (built in: {', '.join(BUILTIN_VARIANTS)}; or NAME=FILE.yaml|.py)")
+        return {"name": name, "render": BUILTIN_VARIANTS[name], "cfg_path": site_cfg}
+    p = Path(path)
+    if p.suffix == ".py":
+        spec_ = importlib.util.spec_from_file_location(f"prompt_variant_{name}", p)
+        mod = importlib.util.module_from_spec(spec_)
+        spec_.loader.exec_module(mod)
+        return {"name": name, "render": mod.render_prompts, "cfg_path": site_cfg}
+    return {"name": name, "render": render_prompts, "cfg_path": p}
+
+
+def build_variant(v: dict, content_root: str) -> dict:
+    cfg = yaml.safe_load(Path(v["cfg_path"]).read_text(encoding="utf-8")) or {}
+    contract = load_contract(str(v["cfg_path"]))
+    system, page_prompt = v["render"](cfg, contract)
+    return dict(v, contract=contract, system=system,
+                page_prompt=generate_pages.with_link_hints(page_prompt, content_root))
+
+
+# ---------------------------
+# Title sample
+# ---------------------------
+
+def sample_titles(site: Path, n: int, seed: int, title_file: str = "") -> list[dict]:
+    """A fixed sample of {"title", "hub", "page_type"}: same args, same titles, in the same order."""
+    items = []
+    if title_file:
+        items = [{"title": t.strip()} for t in Path(title_file).read_text(encoding="utf-8").splitlines() if t.strip()]
+    else:
+        plan = generate_pages.load_plan(str(site / "data" / "plan.yaml"))
+        for it in plan.get("items") or []:
+            if isinstance(it, dict) and it.get("title") and it.get("status", "todo") == "todo":
+                items.append({"title": str(it["title"]), "hub": str(it.get("hub") or ""),
+                              "page_type": str(it.get("page_type") or "")})
+        pool = site / "scripts" / "titles_pool.txt"
+        if pool.is_file():
+            items += [{"title": t} for t in generate_pages.load_titles(str(pool))]
+    items = list({it["title"]: it for it in items}.values())
+    if len(items) < n:
+        items += [{"title": synthetic_title(i)} for i in range(n - len(items))]
+    items = sorted(items, key=lambda it: it["title"])
+    return random.Random(seed).sample(items, n)
+
+
+# ---------------------------
+# Backends
+# ---------------------------
+
+def request_key(system: str, prompt: str, rep: int) -> str:
+    return hashlib.sha256(json.dumps([system, prompt, rep], ensure_ascii=False).encode("utf-8")).hexdigest()[:24]
+
+
+class Recordings:
+    """Responses by request_key; appends new ones to `record_path` when given."""
+
+    def __init__(self, replay_path: str = "", record_path: str = ""):
+        self.responses = {}
+        self.record_path = record_path
+        self.lock = threading.Lock()
+        if replay_path:
+            with open(replay_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        r = json.loads(line)
+                        self.responses[r["key"]] = r
+
+    def get(self, key: str) -> dict | None:
+        return self.responses.get(key)
+
+    def add(self, key: str, meta: dict, res: dict) -> None:
+        if not self.record_path:
+            return
+        row = dict(meta, key=key, content=res.get("content"), finish_reason=res.get("finish_reason"),
+                   usage=res.get("usage") or {}, latency=res.get("latency"), endpoint=res.get("endpoint"))
+        with self.lock:
+            with open(self.record_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def mock_router(base_url: str) -> ModelRouter:
+    return ModelRouter([Endpoint(id="mock", base_url=base_url, model="mock", api_key="mock")])
+
+
+# ---------------------------
+# One call
+# ---------------------------
+
+def rule_key(msg: str) -> str:
+    m = RULE_PREFIX_RE.match(msg)
+    return m.group(1) if m else re.sub(r"\d+", "N", msg).rstrip(".")
+
+
+def run_one(v: dict, item: dict, rep: int, router, recordings: Recordings, known: set,
+            max_tokens: int, temperature: float) -> dict:
+    extra = ""
+    if item.get("hub"):
+        extra += f"\nHub (must use exactly): {item['hub']}"
+    if item.get("page_type"):
+        extra += f"\nPage type (must use exactly): {item['page_type']}"
+    prompt = f"{v['page_prompt']}\n\nTitle: {item['title']}{extra}"
+    key = request_key(v["system"], prompt, rep)
+    out = {"variant": v["name"], "title": item["title"], "rep": rep, "key": key, "ok": False, "failures": [],
+           "prompt_tokens": None, "completion_tokens": None, "latency": None, "finish_reason": None}
+
+    res = recordings.get(key) if router is None else None
+    if router is None and res is None:
+        out["failures"] = [NO_RECORDING]
+        return out
+    if res is None:
+        payload = {
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "response_format": {"type": "json_object"},
+            "messages": [
+                {"role": "system", "content": v["system"]},
+                {"role": "user", "content": prompt},
+            ],
+        }
+        try:
+            res = router.complete(payload, hub=item.get("hub", ""), page_type=item.get("page_type", ""))
+        except Exception:
+            out["failures"] = [NO_RESPONSE]
+            return out
+        recordings.add(key, {"variant": v["name"], "title": item["title"], "rep": rep}, res)
+
+    usage = res.get("usage") or {}
+    out.update(prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"),
+               latency=res.get("latency"), finish_reason=res.get("finish_reason"))
+    data, salvage = parse_or_salvage(res.get("content") or "")
+    if salvage is not None or not isinstance(data, dict):
+        out["failures"] = [TRUNCATED if res.get("finish_reason") == "length" else INVALID_JSON]
+        return out
+
+    slug = generate_pages.slugify(str(data.get("title") or item["title"]))
+    body, _ = unlink_missing((data.get("body_md") or "").strip(), known | {slug})
+    page = {k: str(data.get(k) or "") for k in ("title", "summary", "description", "hub", "page_type")}
+    md = generate_pages.render_page(slug, page, generate_pages.choose_close(data, v["contract"]), body)
+    ok, failures, _, _ = quality_gates.validate_page(Path(slug) / "index.md", v["contract"], known | {slug}, text=md)
+    out["ok"] = ok
+    out["failures"] = [rule_key(f) for f in failures]
+    return out
+
+
+# ---------------------------
+# Statistics
+# ---------------------------
+
+def wilson(k: int, n: int, z: float = Z95) -> tuple[float, float]:
+    if not n:
+        return 0.0, 0.0
+    p = k / n
+    d = 1 + z * z / n
+    mid = (p + z * z / (2 * n)) / d
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / d
+    return max(0.0, mid - half), min(1.0, mid + half)
+
+
+def mean_ci(vals: list[float], z: float = Z95) -> dict:
+    if not vals:
+        return {"mean": None, "lo": None, "hi": None}
+    m = statistics.fmean(vals)
+    half = z * statistics.stdev(vals) / math.sqrt(len(vals)) if len(vals) > 1 else 0.0
+    return {"mean": m, "lo": m - half, "hi": m + half}
+
+
+def percentile(vals: list[float], q: float) -> float | None:
+    if not vals:
+        return None
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(len(vals) * q))]
+
+
+def summarize(rows: list[dict]) -> dict:
+    scored = [r for r in rows if NO_RECORDING not in r["failures"]]
+    n, k = len(scored), sum(r["ok"] for r in scored)
+    failures = {}
+    for r in scored:
+        for f in dict.fromkeys(r["failures"]):
+            failures[f] = failures.get(f, 0) + 1
+    lat = [r["latency"] for r in scored if r["latency"] is not None]
+    lo, hi = wilson(k, n)
+    return {
+        "n": n,
+        "missing": len(rows) - n,
+        "passed": k,
+        "pass_rate": k / n if n else 0.0,
+        "pass_rate_ci": [lo, hi],
+        "prompt_tokens": mean_ci([r["prompt_tokens"] for r in scored if r["prompt_tokens"] is not None]),
+        "completion_tokens": mean_ci([r["completion_tokens"] for r in scored if r["completion_tokens"] is not None]),
+        "latency": dict(mean_ci(lat), p50=percentile(lat, 0.5), p90=percentile(lat, 0.9)),
+        "failures": dict(sorted(failures.items(), key=lambda x: (-x[1], x[0]))),
+    }
+
+
+def diff_ci(a: dict, b: dict, z: float = Z95) -> dict:
+    """Pass-rate difference b - a with a normal-approximation 95% interval."""
+    if not a["n"] or not b["n"]:
+        return {"diff": None, "lo": None, "hi": None}
+    pa, pb = a["pass_rate"], b["pass_rate"]
+    half = z * math.sqrt(pa * (1 - pa) / a["n"] + pb * (1 - pb) / b["n"])
+    return {"diff": pb - pa, "lo": pb - pa - half, "hi": pb - pa + half}
+
+
+def fmt_ci(s: dict, digits: int = 0) -> str:
+    if s["mean"] is None:
+        return "-"
+    return f"{s['mean']:.{digits}f} [{s['lo']:.{digits}f},{s['hi']:.{digits}f}]"
+
+
+def print_report(summaries: dict) -> None:
+    names = list(summaries)
+    base = summaries[names[0]]
+    print(f"{'variant':<16} {'n':>4} {'pass':>6} {'95% CI':>13} {'vs ' + names[0][:10]:>17} "
+          f"{'prompt tok':>18} {'completion tok':>18} {'latency s':>16} {'p50':>6} {'p90':>6}")
+    for name in names:
+        s = summaries[name]
+        lo, hi = s["pass_rate_ci"]
+        d = diff_ci(base, s)
+        vs = "-" if name == names[0] or d["diff"] is None else f"{d['diff']:+.0%} [{d['lo']:+.0%},{d['hi']:+.0%}]"
+        lat = s["latency"]
+        print(f"{name[:16]:<16} {s['n']:>4} {s['pass_rate']:>6.0%} {f'{lo:.0%}..{hi:.0%}':>13} {vs:>17} "
+              f"{fmt_ci(s['prompt_tokens']):>18} {fmt_ci(s['completion_tokens']):>18} {fmt_ci(lat, 2):>16} "
+              f"{lat['p50'] or 0:>6.2f} {lat['p90'] or 0:>6.2f}")
+        if s["missing"]:
+            print(f"  {s['missing']} request(s) without a recorded response (not scored)")
+    print()
+    print("Failures per rule (pages failing it):")
+    rules = sorted({f for s in summaries.values() for f in s["failures"]})
+    if not rules:
+        print("  none")
+    for rule in rules:
+        counts = "  ".join(f"{name}={summaries[name]['failures'].get(rule, 0)}" for name in names)
+        print(f"  {rule[:70]:<70} {counts}")
+
+
+# ---------------------------
+# Main
+# ---------------------------
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--variants", default="baseline,dedup_rules", help="comma-separated variants (see above)")
+    ap.add_argument("--site", default=".", help="site root: data/site.yaml, plan, titles pool and existing pages")
+    ap.add_argument("--titles", type=int, default=30, help="titles in the sample")
+    ap.add_argument("--title-file", default="", help="sample from this file (one title per line) instead")
+    ap.add_argument("--seed", type=int, default=0, help="title sample seed")
+    ap.add_argument("--repeats", type=int, default=1, help="calls per title and variant")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--max-tokens", type=int, default=generate_pages.MAX_OUTPUT_TOKENS)
+    ap.add_argument("--temperature", type=float, default=generate_pages.TEMPERATURE)
+    ap.add_argument("--live", action="store_true", help="call the site's configured providers (paid)")
+    ap.add_argument("--replay", default="", help="score responses recorded with --record; no model calls")
+    ap.add_argument("--record", default="", help="append every response to this JSONL file")
+    ap.add_argument("--base-url", default="", help="an already running local mock endpoint")
+    ap.add_argument("--latency", default="fixed:0.05", help="in-process mock latency: fixed:S | uniform:A,B | lognormal:MEDIAN,SIGMA")
+    ap.add_argument("--out", default="", help="write the results JSON here")
+    args = ap.parse_args()
+
+    if args.live and args.replay:
+        raise SystemExit("--live and --replay are exclusive")
+    site = Path(args.site).resolve()
+    site_cfg = site / "data" / "site.yaml"
+    content_root = str(site / "content" / "pages")
+    known = {p.parent.name for p in Path(content_root).glob("*/index.md")}
+    variants = [build_variant(load_variant(s, site_cfg), content_root) for s in args.variants.split(",") if s.strip()]
+    items = sample_titles(site, args.titles, args.seed, args.title_file)
+    recordings = Recordings(args.replay, args.record)
+
+    srv = None
+    if args.replay:
+        router, backend = None, f"replay:{args.replay}"
+    elif args.live:
+        router, backend = load_router(yaml.safe_load(site_cfg.read_text(encoding="utf-8")) or {}), "live"
+    elif args.base_url:
+        router, backend = mock_router(args.base_url), f"mock:{args.base_url}"
+    else:
+        srv = start_server(MockState(load_outline(site_cfg), latency=args.latency))
+        router, backend = mock_router(f"http://127.0.0.1:{srv.server_address[1]}/v1"), "mock"
+    print(f"[prompts] {len(variants)} variants x {len(items)} titles x {args.repeats} repeats ({backend})",
+          file=sys.stderr)
+
+    jobs = [(v, item, rep) for rep in range(args.repeats) for item in items for v in variants]
+    t0 = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
+            rows = list(ex.map(lambda j: run_one(*j, router, recordings, known, args.max_tokens, args.temperature), jobs))
+    finally:
+        if srv is not None:
+            srv.shutdown()
+
+    summaries = {v["name"]: summarize([r for r in rows if r["variant"] == v["name"]]) for v in variants}
+    print_report(summaries)
+    print(f"\n[prompts] {len(jobs)} calls in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    if args.out:
+        report = {
+            "timestamp_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "backend": backend,
+            "config": {"variants": args.variants, "titles": args.titles, "seed": args.seed, "repeats": args.repeats,
+                       "max_tokens": args.max_tokens, "temperature": args.temperature},
+            "sample": [it["title"] for it in items],
+            "variants": {v["name"]: {"cfg_path": str(v["cfg_path"]), "contract_hash": v["contract"]["hash"],
+                                     "prompt_chars": len(v["system"]) + len(v["page_prompt"])} for v in variants},
+            "results": summaries,
+            "calls": rows,
+        }
+        Path(args.out).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,256 @@
+"""
+End-to-end factory benchmarks against a local mock chat-completions server.
+
+Usage:
+  python benchmarks/run.py --sizes 1000,10000 --gen-pages 20 --out bench.json
+  python benchmarks/run.py --sizes 1000 --baseline bench.json   # exit 1 on regression
+
+Measures, per synthetic corpus size:
+  gates         quality_gates.validate_page pages/second
+  link_hints    generate_pages.build_internal_link_hints seconds
+  regen_select  generate_pages.select_pages_for_regen seconds (contract_mismatch)
+and once per run:
+  generate      generate_pages.py end-to-end pages/minute via the mock server
+
+Every stage runs in its own child process so peak RSS is per stage.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from corpus import init_site, synthetic_title, write_corpus
+from mock_server import MockState, REPO_ROOT, load_outline, start_server
+
+SCRIPTS_DIR = REPO_ROOT / "scripts"
+
+# Metric name -> True if higher is better
+METRIC_DIRECTION = {
+    "pages_per_second": True,
+    "pages_per_minute": True,
+    "seconds": False,
+    "peak_rss_mb": False,
+}
+
+
+# ---------------------------
+# Child-process stages
+# ---------------------------
+
+def worker(stage: str, root: str) -> dict:
+    os.chdir(root)
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+    if stage == "gates":
+        import quality_gates
+        from contract import load_contract
+        contract = load_contract("data/site.yaml")
+        pages = sorted(Path("content/pages").glob("*/index.md"))
+        t0 = time.perf_counter()
+        passed = 0
+        for md in pages:
+            ok, _, _, _ = quality_gates.validate_page(md, contract)
+            passed += int(ok)
+        dt = time.perf_counter() - t0
+        return {"pages": len(pages), "passed": passed, "seconds": dt,
+                "pages_per_second": len(pages) / dt if dt else 0.0}
+
+    os.environ["REGEN_RULE"] = "contract_mismatch"
+    import generate_pages
+
+    if stage == "link_hints":
+        t0 = time.perf_counter()
+        hints = generate_pages.build_internal_link_hints("content/pages", limit=40)
+        return {"links": hints.count("\n") + 1 if hints else 0, "seconds": time.perf_counter() - t0}
+
+    if stage == "regen_select":
+        t0 = time.perf_counter()
+        targets = generate_pages.select_pages_for_regen("content/pages", "current", generate_pages.PageMeta())
+        return {"targets": len(targets), "seconds": time.perf_counter() - t0}
+
+    raise SystemExit(f"Unknown stage: {stage}")
+
+
+def run_child(args: list[str], env: dict | None = None, cwd: str | None = None) -> tuple[str, float, float]:
+    """Run a child to completion; returns (stdout, wall seconds, peak RSS in MB)."""
+    t0 = time.perf_counter()
+    p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env, cwd=cwd, text=True)
+    out = p.stdout.read()
+    _, status, usage = os.wait4(p.pid, 0)
+    p.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - t0
+    if p.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} exited {p.returncode}:\n{out[-2000:]}")
+    # ru_maxrss is KiB on Linux
+    return out, wall, usage.ru_maxrss / 1024.0
+
+
+def run_stage(stage: str, root: Path) -> dict:
+    out, _, rss = run_child([sys.executable, __file__, "--worker", stage, "--root", str(root)])
+    res = json.loads(out.strip().splitlines()[-1])
+    res["peak_rss_mb"] = round(rss, 1)
+    return res
+
+
+def bench_corpus(size: int, workdir: Path) -> dict:
+    root = init_site(workdir / f"corpus-{size}")
+    t0 = time.perf_counter()
+    write_corpus(root, size)
+    build = time.perf_counter() - t0
+    res = {"corpus_build_seconds": build}
+    for stage in ("gates", "link_hints", "regen_select"):
+        res[stage] = run_stage(stage, root)
+        print(f"[bench] {size} pages {stage}: {res[stage]}", file=sys.stderr)
+    return res
+
+
+def bench_generate(pages: int, corpus: int, workdir: Path, mock: dict) -> dict:
+    items = [{"title": synthetic_title(100000 + i), "hub": "work-career", "page_type": "is-it-normal", "status": "todo"}
+             for i in range(pages)]
+    root = init_site(workdir / "generate", plan_items=items)
+    write_corpus(root, corpus)
+
+    state = MockState(load_outline(), **mock)
+    srv = start_server(state)
+    port = srv.server_address[1]
+    env = dict(os.environ)
+    env.update({
+        "MOONSHOT_API_KEY": "bench",
+        "MOONSHOT_BASE_URL": f"http://127.0.0.1:{port}/v1",
+        "PAGES_PER_RUN": str(pages),
+        "MAX_ATTEMPTS": str(pages * 2 + 5),
+        "SLEEP_SECONDS": "0",
+        "FACTORY_MODE": "generate",
+    })
+    try:
+        out, wall, rss = run_child([sys.executable, str(SCRIPTS_DIR / "generate_pages.py")], env=env, cwd=str(root))
+    finally:
+        srv.shutdown()
+
+    def counter(label: str) -> int:
+        m = re.search(rf"^{label}:\s*(\d+)", out, flags=re.M)
+        return int(m.group(1)) if m else 0
+
+    produced = counter("Pages produced")
+    res = {
+        "pages": pages,
+        "produced": produced,
+        "attempted": counter("Pages attempted"),
+        "seconds": wall,
+        "pages_per_minute": produced / wall * 60.0 if wall else 0.0,
+        "peak_rss_mb": round(rss, 1),
+        "mock": state.counts,
+    }
+    print(f"[bench] generate: {res}", file=sys.stderr)
+    return res
+
+
+# ---------------------------
+# Baseline comparison
+# ---------------------------
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for k, v in results.items():
+        key = f"{prefix}.{k}" if prefix else k
+        if isinstance(v, dict):
+            flat.update(flatten(v, key))
+        elif isinstance(v, (int, float)) and k in METRIC_DIRECTION:
+            flat[key] = float(v)
+    return flat
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns human-readable regressions (metric worse than baseline by more than tolerance)."""
+    cur = flatten(current.get("results") or {})
+    base = flatten(baseline.get("results") or {})
+    regressions = []
+    for key, old in sorted(base.items()):
+        if key not in cur or old <= 0:
+            continue
+        new = cur[key]
+        higher_better = METRIC_DIRECTION[key.rsplit(".", 1)[-1]]
+        change = (new - old) / old
+        worse = -change if higher_better else change
+        if worse > tolerance:
+            regressions.append(f"{key}: {old:.3f} -> {new:.3f} ({change:+.1%})")
+    return regressions
+
+
+def git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="1000", help="comma-separated corpus sizes, e.g. 1000,10000,100000")
+    ap.add_argument("--gen-pages", type=int, default=20, help="pages for the end-to-end generate run (0 = skip)")
+    ap.add_argument("--gen-corpus", type=int, default=100, help="existing pages in the generate run's site")
+    ap.add_argument("--latency", default="fixed:0.05", help="mock latency: fixed:S | uniform:A,B | lognormal:MEDIAN,SIGMA")
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--rate-5xx", type=float, default=0.0)
+    ap.add_argument("--rate-truncated", type=float, default=0.0)
+    ap.add_argument("--rate-fenced", type=float, default=0.0)
+    ap.add_argument("--out", default="", help="write results JSON here (default: stdout)")
+    ap.add_argument("--baseline", default="", help="previous results JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before failing")
+    ap.add_argument("--worker", default="", help=argparse.SUPPRESS)
+    ap.add_argument("--root", default="", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, args.root)))
+        return 0
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    mock = {
+        "latency": args.latency,
+        "rate_429": args.rate_429,
+        "rate_5xx": args.rate_5xx,
+        "rate_truncated": args.rate_truncated,
+        "rate_fenced": args.rate_fenced,
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="factory-bench-") as tmp:
+        workdir = Path(tmp)
+        for size in sizes:
+            results[f"corpus_{size}"] = bench_corpus(size, workdir)
+        if args.gen_pages > 0:
+            results["generate"] = bench_generate(args.gen_pages, args.gen_corpus, workdir, mock)
+
+    report = {
+        "timestamp_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_rev": git_rev(),
+        "python": platform.python_version(),
+        "config": {"sizes": sizes, "gen_pages": args.gen_pages, "gen_corpus": args.gen_corpus, "mock": mock},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.tolerance)
+        for r in regressions:
+            print(f"[REGRESSION] {r}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("No regressions against baseline.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
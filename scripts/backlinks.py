@@ -0,0 +1,201 @@
+"""
+Backlinks to newly generated pages, without model calls.
+
+Usage:
+  python scripts/backlinks.py [slug ...]   (default: the last run's generated_this_run)
+
+Link hints are built once before a run, so pages written in the same run never
+link to each other, and existing pages only gained links to new ones when they
+were regenerated. After the quality gates (the workflows run it as its own
+step, after the shard merge when sharded) this pass takes the new pages that
+passed (sidecar gates == "pass") and ranks, for every one of them, the pages
+most related to it: shared title/summary terms weighted by rarity, same hub,
+and shared outgoing links from the link graph. The top BACKLINKS_PER_PAGE of
+them get a "- [Title](/pages/<new>/)" bullet in their "Related topics and
+deeper reading" section.
+
+A page is only edited while it stays within the gates: word count max, the
+prohibition rules (checked on the added line), and at most
+BACKLINKS_MAX_RELATED links in the section. Each edited page is written once,
+and only if its bytes change.
+"""
+import os
+import re
+import sys
+import json
+import math
+
+from contract import load_contract
+from corpus_pack import load_pack, parse_frontmatter
+from link_graph import load_graph, page_links
+from hub_index import listing_fields
+from page_meta import PageMeta
+from page_writer import write_if_changed
+from quality_gates import read_frontmatter, word_count
+from search_index import SearchIndex, tokenize
+from tracing import traced
+
+CONTENT_ROOT = os.getenv("CONTENT_ROOT", "content/pages")
+MANIFEST_PATH = "scripts/manifest.json"
+BACKLINKS = os.getenv("BACKLINKS", "1").strip() == "1"
+BACKLINKS_PER_PAGE = int(os.getenv("BACKLINKS_PER_PAGE", "3"))     # pages that gain a link to each new page
+BACKLINKS_MAX_RELATED = int(os.getenv("BACKLINKS_MAX_RELATED", "8"))  # links a Related section may hold
+RELATED_H2 = "Related topics and deeper reading"
+SAME_HUB_BONUS = 1.0
+SHARED_LINK_WEIGHT = 0.5
+
+BULLET_RE = re.compile(r"^[-*]\s+\[[^\]]+\]\([^)]*\)[^\n]*$", re.M)
+H2_RE = re.compile(r"^##\s+", re.M)
+
+
+def related_section(md: str) -> tuple[int, int] | None:
+    """(start, end) of the Related section's contents in `md`, or None."""
+    m = re.search(rf"^##\s+{re.escape(RELATED_H2)}\s*$", md, flags=re.M)
+    if not m:
+        return None
+    nxt = H2_RE.search(md, m.end())
+    return m.end(), nxt.start() if nxt else len(md)
+
+
+def add_related_link(md: str, line: str) -> str | None:
+    """`md` with `line` appended to the Related section's link list; None without the section."""
+    span_ = related_section(md)
+    if span_ is None:
+        return None
+    start, end = span_
+    section = md[start:end]
+    bullets = list(BULLET_RE.finditer(section))
+    if bullets:
+        # Keep the list's own spacing (models write both tight and blank-line-separated lists).
+        loose = len(bullets) > 1 and "\n\n" in section[bullets[-2].end():bullets[-1].start()]
+        at = start + bullets[-1].end()
+        return md[:at] + ("\n\n" if loose else "\n") + line + md[at:]
+    at = start + len(section.rstrip())
+    return md[:at] + "\n\n" + line + md[at:]
+
+
+class PageIndex:
+    """Title, hub and terms of every page, with an inverted term index for candidate lookup."""
+
+    def __init__(self, content_root: str):
+        self.title, self.hub, self.terms, self.postings = {}, {}, {}, {}
+        with load_pack(content_root) as pack:
+            for slug, fm_view, _ in pack.items():
+                fm = parse_frontmatter(fm_view)
+                title = str(fm.get("title") or slug.replace("-", " ").title()).strip()
+                self.title[slug] = title
+                self.hub[slug] = str(fm.get("hub") or "")
+                self.terms[slug] = set(tokenize(f"{title} {fm.get('summary') or ''}"))
+                for t in self.terms[slug]:
+                    self.postings.setdefault(t, []).append(slug)
+        n = max(1, len(self.terms))
+        self.idf = {t: math.log(n / len(s)) for t, s in self.postings.items()}
+
+    def related(self, slug: str, graph) -> list[tuple[float, str]]:
+        """(score, slug) of pages related to `slug`, best first; ties broken by slug."""
+        scores = {}
+        for t in self.terms.get(slug, ()):
+            for other in self.postings[t]:
+                scores[other] = scores.get(other, 0.0) + self.idf[t]
+        hub = self.hub.get(slug)
+        if hub:
+            for other, h in self.hub.items():
+                if h == hub:
+                    scores[other] = scores.get(other, 0.0) + SAME_HUB_BONUS
+        mine = graph.out.get(slug, set())
+        for target in mine:
+            for other in graph.inbound.get(target, ()):
+                if other in scores:
+                    scores[other] += SHARED_LINK_WEIGHT
+        scores.pop(slug, None)
+        return sorted(((s, o) for o, s in scores.items() if s > 0), key=lambda x: (-x[0], x[1]))
+
+
+@traced("backlinks")
+def inject_backlinks(new_slugs: list[str], content_root: str = CONTENT_ROOT, contract: dict | None = None) -> dict:
+    """
+    Link each new page from its most related pages; returns {edited slug: [new slugs it now links]}.
+    Only new pages that passed the gates get links, so a DELETE_ON_FAIL deletion can't leave
+    them behind. Pages without a Related section, or that would break a gate limit, are skipped.
+    """
+    if contract is None:
+        contract = load_contract()
+    meta = PageMeta()
+    new_slugs = [s for s in dict.fromkeys(new_slugs)
+                 if os.path.isfile(os.path.join(content_root, s, "index.md")) and meta.get(s).get("gates") == "pass"]
+    if not new_slugs:
+        return {}
+    graph = load_graph(content_root)
+    index = PageIndex(content_root)
+    wc_max = contract["wordcount"]["max"]
+    rules = [contract["rx"][r["name"]] for r in contract["rules"]]
+
+    texts = {}   # slug -> current page text, edits applied
+    added = {}
+    for new in new_slugs:
+        title = index.title.get(new)
+        if not title:
+            continue
+        line = f"- [{title.replace('[', '(').replace(']', ')')}](/pages/{new}/)"
+        if any(rx.search(line) for rx in rules):
+            continue
+        linked = 0
+        for _, other in index.related(new, graph):
+            if linked >= BACKLINKS_PER_PAGE:
+                break
+            if new in graph.out.get(other, ()) or new in added.get(other, ()):
+                continue
+            if other not in texts:
+                try:
+                    with open(os.path.join(content_root, other, "index.md"), "r", encoding="utf-8") as f:
+                        texts[other] = f.read()
+                except OSError:
+                    continue
+            md = texts[other]
+            span_ = related_section(md)
+            if span_ is None or len(page_links(md[span_[0]:span_[1]])) >= BACKLINKS_MAX_RELATED:
+                continue
+            _, body = read_frontmatter(md)
+            if word_count(body) + word_count(line) > wc_max:
+                continue
+            texts[other] = add_related_link(md, line)
+            added.setdefault(other, []).append(new)
+            linked += 1
+
+    written = 0
+    search = SearchIndex()
+    for slug in added:
+        path = os.path.join(content_root, slug, "index.md")
+        if write_if_changed(path, texts[slug]):
+            written += 1
+            fm = listing_fields(path)
+            search.update(slug, str(fm.get("title") or slug), str(fm.get("summary") or ""), texts[slug])
+    if written:
+        graph.refresh(content_root)
+        graph.save()
+        search.flush()
+    print(f"[backlinks] {sum(len(v) for v in added.values())} links to {len(new_slugs)} new pages "
+          f"added on {written} pages")
+    return added
+
+
+def main(argv: list | None = None) -> int:
+    if not BACKLINKS:
+        print("[backlinks] disabled (BACKLINKS=0)")
+        return 0
+    slugs = list(argv or [])
+    if not slugs:
+        try:
+            with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+                slugs = json.load(f).get("generated_this_run", [])
+        except (OSError, json.JSONDecodeError):
+            slugs = []
+    if not slugs:
+        print("[backlinks] no pages given and none generated in the last run")
+        return 0
+    inject_backlinks(slugs)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
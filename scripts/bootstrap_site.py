@@ -2,17 +2,17 @@ import os
 import re
 import json
 import time
-import hashlib
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-import requests
 import yaml
 
-BASE_URL = os.getenv("MOONSHOT_BASE_URL", "https://api.moonshot.ai/v1").rstrip("/")
-API_KEY = os.environ.get("MOONSHOT_API_KEY", "")
-MODEL = os.getenv("KIMI_MODEL", "kimi-k2.5")
+from contract import load_contract
+from model_router import load_router
 
-HEADERS = {"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"}
+# Endpoint router (providers.endpoints in data/site.yaml); built on first use
+ROUTER = None
 
 SITE_PATH = Path(os.getenv("SITE_CONFIG", "data/site.yaml"))
 HUGO_PATH = Path("hugo.yaml")
@@ -20,7 +20,17 @@ TITLES_POOL_PATH = Path("scripts/titles_pool.txt")
 MANIFEST_PATH = Path("scripts/manifest.json")
 
 TITLE_COUNT = int(os.getenv("TITLE_COUNT", "300"))
-PAGES_NOW = int(os.getenv("PAGES_NOW", "0"))  # optional: for bootstrap workflow convenience
+# Pages generated and gated in this same run, from titles as they arrive (0 = titles only)
+PAGES_NOW = int(os.getenv("PAGES_NOW", "0"))
+
+# Titles pool: generated in concurrent per-hub x page-type shards, each with its own token budget
+BOOTSTRAP_CONCURRENCY = int(os.getenv("BOOTSTRAP_CONCURRENCY", "6"))
+TITLE_SHARD_MAX = int(os.getenv("TITLE_SHARD_MAX", "40"))  # titles asked for per call
+TITLE_SHARD_MIN = int(os.getenv("TITLE_SHARD_MIN", "5"))
+TITLE_TOKENS_PER_TITLE = int(os.getenv("TITLE_TOKENS_PER_TITLE", "24"))
+TITLE_TOPUP_ROUNDS = int(os.getenv("TITLE_TOPUP_ROUNDS", "3"))
+TITLE_OVERSHOOT = float(os.getenv("TITLE_OVERSHOOT", "1.3"))  # ask for extra to cover duplicates
+TITLE_DUP_THRESHOLD = float(os.getenv("TITLE_DUP_THRESHOLD", "0.8"))  # word-set Jaccard
 
 # Inputs from Actions workflow
 NICHE = (os.getenv("BOOTSTRAP_NICHE") or "").strip()
@@ -33,6 +43,15 @@ THEME_PACKS = [
   "sunset-clay","warm-sunrise"
 ]
 
+BOOTSTRAP_SYSTEM = (
+    "You are a careful site-bootstrapper for an evergreen informational website.\n"
+    "Hard rules:\n"
+    "- No dates/years or time-sensitive words (recent/currently/this year/today/now).\n"
+    "- No prices/cost claims, no statistics, no 'studies show', no numbers-as-facts.\n"
+    "- No medical/legal/financial advice. No guarantees. No first-person.\n"
+    "- Output JSON only.\n"
+)
+
 # Contract defaults (kept stable unless you deliberately change them)
 DEFAULT_OUTLINE_H2 = [
   "Intro",
@@ -86,11 +105,11 @@ def parse_json_strict_or_extract(raw: str) -> dict:
     return json.loads(m.group(0))
 
 def kimi_json(system: str, user: str, temperature: float = 1.0, max_tokens: int = 1400) -> dict:
-    if not API_KEY:
-        raise RuntimeError("MOONSHOT_API_KEY is not set")
+    global ROUTER
+    if ROUTER is None:
+        ROUTER = load_router(load_yaml(SITE_PATH), timeout=90)
 
     payload = {
-        "model": MODEL,
         "temperature": temperature,
         "max_tokens": max_tokens,
         "response_format": {"type": "json_object"},
@@ -100,39 +119,178 @@ def kimi_json(system: str, user: str, temperature: float = 1.0, max_tokens: int
         ],
     }
 
-    last_err = None
-    for attempt in range(3):
-        r = requests.post(f"{BASE_URL}/chat/completions", headers=HEADERS, json=payload, timeout=90)
-        if r.status_code < 400:
-            content = r.json()["choices"][0]["message"]["content"]
-            return parse_json_strict_or_extract(content)
-
-        if r.status_code in (429, 500, 502, 503):
-            time.sleep(2 ** attempt)
-            continue
-        last_err = r.text
-        break
-
-    raise RuntimeError(last_err or "Moonshot API retries exhausted")
+    res = ROUTER.complete(payload)
+    return parse_json_strict_or_extract(res["content"])
 
 def ensure_manifest_reset():
     MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
     MANIFEST_PATH.write_text(json.dumps({"used_titles": [], "generated_this_run": []}, indent=2), encoding="utf-8")
 
+# ---------------------------
+# Titles pool
+# ---------------------------
+
+TITLE_STOPWORDS = {
+    "a", "an", "the", "is", "it", "to", "of", "in", "on", "for", "and", "or", "do", "does", "why",
+    "how", "what", "when", "normal", "your", "you", "my", "i", "be", "about", "with", "at", "after",
+}
+
+def title_words(title: str) -> frozenset:
+    words = re.findall(r"[a-z0-9]+", (title or "").lower())
+    # crude plural folding so "meeting"/"meetings" collide
+    return frozenset(w[:-1] if len(w) > 3 and w.endswith("s") else w for w in words if w not in TITLE_STOPWORDS)
+
+class TitlePool:
+    """
+    Merges titles as they stream in, dropping exact (slug) and near duplicates (word-set Jaccard).
+    seed() registers titles that already exist elsewhere (site, plan) so new ones can't repeat them.
+    """
+
+    def __init__(self, threshold: float = TITLE_DUP_THRESHOLD):
+        self.threshold = threshold
+        self.items = []  # {"title", "hub", "page_type"}
+        self.slugs = set()
+        self.by_word = {}  # word -> indexes into self.words
+        self.words = []
+        self.known = {}  # hub -> seeded titles (shown to the model as avoid_titles)
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def is_near_duplicate(self, words: frozenset) -> bool:
+        if not words:
+            return False
+        seen = set()
+        for w in words:
+            for i in self.by_word.get(w, ()):
+                if i in seen:
+                    continue
+                seen.add(i)
+                other = self.words[i]
+                if len(words & other) / len(words | other) >= self.threshold:
+                    return True
+        return False
+
+    def _index(self, s: str, words: frozenset) -> None:
+        i = len(self.words)
+        self.slugs.add(s)
+        self.words.append(words)
+        for w in words:
+            self.by_word.setdefault(w, []).append(i)
+
+    def seed(self, title: str, hub: str = "") -> None:
+        title = re.sub(r"\s+", " ", str(title or "")).strip()
+        if title:
+            self._index(slugify(title), title_words(title))
+            self.known.setdefault(hub, []).append(title)
+
+    def add(self, title: str, hub: str = "", page_type: str = "") -> bool:
+        title = re.sub(r"\s+", " ", str(title or "")).strip()
+        s = slugify(title)
+        words = title_words(title)
+        if not title or s in self.slugs or self.is_near_duplicate(words):
+            self.rejected += 1
+            return False
+        self._index(s, words)
+        self.items.append({"title": title, "hub": hub, "page_type": page_type})
+        return True
+
+    def avoid(self, hub: str, limit: int = 30) -> list[str]:
+        return (self.known.get(hub, []) + [it["title"] for it in self.items if it["hub"] == hub])[-limit:]
+
+    def titles(self) -> list[str]:
+        return [it["title"] for it in self.items]
+
+def title_shards(hubs: list[str], page_types: list[str], need: int, offset: int = 0) -> list[dict]:
+    """
+    Spread `need` (plus overshoot) over hub x page-type shards of TITLE_SHARD_MIN..TITLE_SHARD_MAX
+    titles. Small top-ups use fewer combos, starting at `offset` so each round covers new ones.
+    """
+    # Hubs vary fastest so even a small top-up is spread across hubs.
+    combos = [(h, t) for t in (page_types or [""]) for h in (hubs or [""])]
+    total = -(-int(need * TITLE_OVERSHOOT * 100) // 100)
+    n_combos = max(1, min(len(combos), total // TITLE_SHARD_MIN))
+    shards = []
+    for k in range(n_combos):
+        hub, page_type = combos[(offset + k) % len(combos)]
+        n = total // n_combos + (1 if k < total % n_combos else 0)
+        while n > 0:
+            c = min(n, TITLE_SHARD_MAX)
+            shards.append({"hub": hub, "page_type": page_type, "count": c})
+            n -= c
+    return shards
+
+def generate_title_shard(system: str, shard: dict, avoid: list[str]) -> list[str]:
+    user = {
+        "task": "Write page titles for one hub and page type of an evergreen website.",
+        "inputs": {
+            "niche": NICHE,
+            "tone": TONE or "neutral, calm, beginner-friendly",
+            "hub": shard["hub"],
+            "page_type": shard["page_type"],
+            "title_count": shard["count"],
+        },
+        "avoid_titles": avoid,
+        "required_json": {"titles": ["list of unique page titles, question-style, evergreen, global-friendly"]},
+        "notes": [
+            "Titles must avoid dates/years, prices, stats, brand names, and advice framing.",
+            "Prefer novice-friendly, definitional and comparison topics.",
+            "Keep titles short and specific; no clickbait.",
+            "Do not repeat or lightly reword anything in avoid_titles.",
+        ],
+    }
+    out = kimi_json(system=system, user=json.dumps(user, ensure_ascii=False), temperature=1.0,
+                    max_tokens=200 + shard["count"] * TITLE_TOKENS_PER_TITLE)
+    titles = out.get("titles") or out.get("titles_pool") or []
+    return [str(t) for t in titles if isinstance(t, str)]
+
+def build_titles_pool(system: str, hubs: list[str], page_types: list[str], target: int = TITLE_COUNT,
+                      pool: TitlePool | None = None, on_add=None) -> TitlePool:
+    """
+    Generate titles until `pool` (a fresh one by default) holds `target` of them.
+    `on_add(item)` is called with each accepted {"title", "hub", "page_type"} as it arrives.
+    """
+    pool = pool if pool is not None else TitlePool()
+    offset = 0
+    for rnd in range(1 + TITLE_TOPUP_ROUNDS):
+        need = target - len(pool)
+        if need <= 0:
+            break
+        shards = title_shards(hubs, page_types, need, offset=offset)
+        offset += len({(sh["hub"], sh["page_type"]) for sh in shards})
+        added = 0
+        with ThreadPoolExecutor(max_workers=max(1, BOOTSTRAP_CONCURRENCY)) as ex:
+            futures = {}
+            for sh in shards:
+                # Show each shard what its hub already has so top-up rounds ask for new ground.
+                futures[ex.submit(generate_title_shard, system, sh, pool.avoid(sh["hub"]))] = sh
+            for fut in as_completed(futures):
+                sh = futures[fut]
+                try:
+                    titles = fut.result()
+                except Exception as e:
+                    print(f"[titles] shard {sh['hub']}/{sh['page_type']} failed: {type(e).__name__}: {e}")
+                    continue
+                for t in titles:
+                    if len(pool) >= target:
+                        break
+                    if pool.add(t, sh["hub"], sh["page_type"]):
+                        added += 1
+                        if on_add is not None:
+                            on_add(pool.items[-1])
+        print(f"[titles] round {rnd + 1}: {len(shards)} shards, +{added} titles "
+              f"({len(pool)}/{target}, {pool.rejected} duplicates dropped)")
+        if added == 0:
+            break
+    return pool
+
 def write_titles_pool(titles: list[str]):
     TITLES_POOL_PATH.parent.mkdir(parents=True, exist_ok=True)
-    uniq = []
-    seen = set()
+    pool = TitlePool()
     for t in titles:
-        t = (t or "").strip()
-        if not t:
-            continue
-        s = slugify(t)
-        if s in seen:
-            continue
-        seen.add(s)
-        uniq.append(t)
-    TITLES_POOL_PATH.write_text("\n".join(uniq) + "\n", encoding="utf-8")
+        pool.add(t)
+    TITLES_POOL_PATH.write_text("\n".join(pool.titles()) + "\n", encoding="utf-8")
 
 def patch_hugo_yaml(site_cfg: dict):
     """Keep hugo.yaml minimal but aligned to site identity for Cloudflare Pages."""
@@ -165,22 +323,13 @@ def main():
 
     existing = load_yaml(SITE_PATH)
 
-    # Bootstrap contract constants
-    system = (
-        "You are a careful site-bootstrapper for an evergreen informational website.\n"
-        "Hard rules:\n"
-        "- No dates/years or time-sensitive words (recent/currently/this year/today/now).\n"
-        "- No prices/cost claims, no statistics, no 'studies show', no numbers-as-facts.\n"
-        "- No medical/legal/financial advice. No guarantees. No first-person.\n"
-        "- Output JSON only.\n"
-    )
+    system = BOOTSTRAP_SYSTEM
 
     user = {
-        "task": "Create site identity + theme choice + titles pool for an evergreen website.",
+        "task": "Create site identity + theme choice for an evergreen website.",
         "inputs": {
             "niche": NICHE,
             "tone": TONE or "neutral, calm, beginner-friendly",
-            "title_count": TITLE_COUNT,
         },
         "allowed_theme_packs": THEME_PACKS,
         "required_json": {
@@ -192,16 +341,11 @@ def main():
             "hubs": [
                 {"id": "work-career|money-stress|burnout-load|milestones|social-norms", "label": "string"}
             ],
-            "titles_pool": ["list of unique page titles, question-style, evergreen, global-friendly"],
         },
-        "notes": [
-            "Titles must avoid dates/years, prices, stats, brand names, and advice framing.",
-            "Prefer novice-friendly, definitional and comparison topics.",
-            "Keep titles short and specific; no clickbait."
-        ],
     }
 
-    out = kimi_json(system=system, user=json.dumps(user, ensure_ascii=False), temperature=1.0, max_tokens=2600)
+    # Identity only; titles come from build_titles_pool() in budgeted shards below.
+    out = kimi_json(system=system, user=json.dumps(user, ensure_ascii=False), temperature=1.0, max_tokens=900)
 
     theme_pack = out.get("theme_pack")
     if theme_pack not in THEME_PACKS:
@@ -291,12 +435,37 @@ def main():
 
     save_yaml(SITE_PATH, site_cfg)
     patch_hugo_yaml(site_cfg)
+    # Before any page is generated: the stream records its pages as used titles.
+    ensure_manifest_reset()
 
-    titles = out.get("titles_pool") or []
+    hub_ids = [str(h.get("id") or "").strip() for h in hubs if isinstance(h, dict) and h.get("id")]
+    written = []
+    if PAGES_NOW > 0:
+        # Pipelined: page workers start on the first accepted titles while later shards are still running.
+        # Imported here: generate_pages pulls in the whole factory, which a titles-only bootstrap doesn't need.
+        import generate_pages
+        import quality_gates
+        from backlinks import BACKLINKS, inject_backlinks
+
+        generate_pages.ROUTER = ROUTER
+        stream = queue.Queue()
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            pages = ex.submit(generate_pages.generate_stream, stream, PAGES_NOW)
+            try:
+                pool = build_titles_pool(system, hub_ids, gen["page_types"], on_add=stream.put)
+            finally:
+                stream.put(None)
+            written = pages.result()
+        if written:
+            quality_gates.main([])
+            # After the gates, so only pages that passed get links.
+            if BACKLINKS:
+                inject_backlinks(written)
+    else:
+        pool = build_titles_pool(system, hub_ids, gen["page_types"])
+    titles = pool.titles()
     write_titles_pool(titles)
 
-    ensure_manifest_reset()
-
     # Write a small bootstrap receipt for debugging/panel consumption later
     receipt = {
         "niche": NICHE,
@@ -304,8 +473,9 @@ def main():
         "site_title": site_title,
         "theme_pack": theme_pack,
         "title_count_written": len(titles),
+        "pages_now": len(written),
         "timestamp_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-        "contract_hash": hashlib.sha256(("|".join(DEFAULT_OUTLINE_H2) + f"|{wc_min}-{wc_max}").encode("utf-8")).hexdigest()[:16],
+        "contract_hash": load_contract(str(SITE_PATH))["hash"],
     }
     Path("scripts/bootstrap_receipt.json").write_text(json.dumps(receipt, indent=2), encoding="utf-8")
 
@@ -314,6 +484,8 @@ def main():
     print(f"Site title: {site_title}")
     print(f"Theme pack: {theme_pack}")
     print(f"Titles written: {len(titles)} (target {TITLE_COUNT})")
+    if PAGES_NOW > 0:
+        print(f"Pages generated now: {len(written)} (target {PAGES_NOW}, gated above)")
     print("Reset: manifest.json")
     print("=============================\n")
 
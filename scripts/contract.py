@@ -0,0 +1,346 @@
+"""
+Compiled site contract: data/site.yaml turned into everything the generator and
+the gates need to agree on a passing page.
+
+Usage:
+  python scripts/contract.py show      # compiled contract (without prompts)
+  python scripts/contract.py hash      # canonical contract hash
+  python scripts/contract.py adopt     # re-stamp sidecar entries that carry the old file-sha1 hash
+
+The artifact holds the rendered prompts, the outline, thresholds, the gate rule
+sets (one alternation per set) and one canonical hash. It is cached in
+.factory/contract/ keyed by the source bytes and this file, so loading it is a
+file read plus a handful of regex compiles.
+"""
+import os
+import re
+import sys
+import json
+import hashlib
+
+import yaml
+
+SITE_CONFIG_PATH = os.getenv("SITE_CONFIG_PATH", "data/site.yaml")
+CONTRACT_CACHE_DIR = os.getenv("CONTRACT_CACHE_DIR", ".factory/contract")
+CONTRACT_VERSION = 1
+
+DEFAULT_OUTLINE = [
+    "What this feeling usually means",
+    "Common reasons",
+    "What makes it worse",
+    "What helps (non-advice)",
+    "When it might signal a bigger issue",
+    "FAQs",
+]
+DEFAULT_HUBS = ["work-career", "money-stress", "burnout-load", "milestones", "social-norms"]
+DEFAULT_PAGE_TYPES = ["is-it-normal", "checklist", "red-flags", "myth-vs-reality", "explainer"]
+DEFAULT_FORBIDDEN_WORDS = ["diagnose", "diagnosis", "prescribed", "guaranteed", "sue"]
+REQUIRED_FRONTMATTER = ["title", "slug", "description", "date", "hub", "page_type", "summary"]
+# Sections that must carry real text (when present in the outline)
+DEFAULT_REQUIRED_SECTIONS = ["Intro", "Definitions and key terms", "How it typically works", "Clarifying examples", "Neutral summary"]
+SECTION_MIN_WORDS = 40
+
+# ---------------------------
+# Gate rule sets
+# ---------------------------
+
+DEFAULT_FORBIDDEN = [
+    r"\bdiagnos(e|is)\b",
+    r"\bprescrib(e|ed|ing)\b",
+    r"\bsue\b",
+    r"\btreat(ment|ments|ing)?\b",
+    r"\bcure(s|d)?\b",
+    r"\btherapy\b",
+    r"\btherapist\b",
+    r"\blawyer\b",
+    r"\baccountant\b",
+]
+
+DEFAULT_NO_DATES = [
+    r"\b(19|20)\d{2}\b",  # years
+    r"\brecent(ly)?\b",
+    r"\bcurrently\b",
+    r"\bthis\s+year\b",
+    r"\blast\s+year\b",
+    r"\btoday\b",
+    r"\bnow\b",
+]
+
+DEFAULT_NO_PRICES = [
+    r"[$€£¥]\s?\d",
+    r"\b\d+(?:\.\d+)?\s?(?:usd|aud|cad|eur|gbp|dollars|bucks)\b",
+    r"\bprice\b",
+    r"\bcost\b",
+]
+
+
+DEFAULT_NO_STATS = [
+    r"\bstudies\s+show\b",
+    r"\bresearch\s+shows\b",
+    r"\baccording\s+to\b",
+    r"\bsurvey\b",
+    r"\bstatistic(s)?\b",
+    r"\b\d{1,3}%\b",
+    r"\b\d+(?:\.\d+)?\s?(?:percent|per\s*cent)\b",
+    r"\b\d+(?:,\d{3})+\b",
+]
+DEFAULT_NO_GUARANTEES = [
+    r"\bguarantee(d|s)?\b",
+    r"\b100%\b",
+    r"\bwill\s+definitely\b",
+    r"\balways\b",
+    r"\bnever\b",
+]
+
+DEFAULT_NO_FIRST_PERSON = [
+    r"\b(i|i'm|i’ve|i've|my|mine|me|we|we're|we’ve|we've|our|ours|us)\b",
+]
+
+DEFAULT_NO_CALLS_TO_ACTION = [
+    r"\bclick\s+here\b",
+    r"\bsign\s+up\b",
+    r"\bsubscribe\b",
+    r"\bbuy\b",
+    r"\bpurchase\b",
+    r"\bdownload\b",
+    r"\bjoin\b",
+    r"\btry\s+this\b",
+    r"\byou\s+should\b",
+    r"\bmake\s+sure\s+to\b",
+    r"\bconsider\s+doing\b",
+]
+
+DEFAULT_NO_AFFILIATE = [
+    r"\baffiliate\b",
+    r"\bsponsored\b",
+    r"\breview\b",
+    r"\bcoupon\b",
+    r"\bdiscount\b",
+]
+
+DEFAULT_SUPERLATIVES = [
+    r"\bbest\b",
+    r"\bworst\b",
+    r"\bbetter\s+than\b",
+    r"\bmore\s+than\b\s+(?:any|everyone)\b",
+    r"\btop\s+\d+\b",
+]
+
+# (name, patterns, failure message, config flag that can switch the set off)
+RULE_SETS = [
+    ("forbidden", DEFAULT_FORBIDDEN, "Forbidden medical/legal term hit.", None),
+    ("no_dates", DEFAULT_NO_DATES, "Date/recency language is forbidden.", "no_dates"),
+    ("no_prices", DEFAULT_NO_PRICES, "Price/cost language is forbidden.", "no_prices"),
+    ("no_stats", DEFAULT_NO_STATS, "Statistics/numbered claims are forbidden.", None),
+    ("no_guarantees", DEFAULT_NO_GUARANTEES, "Guarantee/promise language is forbidden.", "no_guarantees"),
+    ("no_first_person", DEFAULT_NO_FIRST_PERSON, "First-person language is forbidden.", "no_first_person"),
+    ("no_calls_to_action", DEFAULT_NO_CALLS_TO_ACTION, "Calls-to-action / directive phrasing is forbidden.", "no_calls_to_action"),
+    ("no_affiliate", DEFAULT_NO_AFFILIATE, "Affiliate/review language is forbidden.", "no_affiliate"),
+    ("superlatives", DEFAULT_SUPERLATIVES, "Superlative/superiority language is forbidden (stay neutral).", "neutral_comparisons_only"),
+]
+
+# ---------------------------
+# Prompts
+# ---------------------------
+
+def render_prompts(cfg: dict, c: dict) -> tuple[str, str]:
+    """(system, page prompt) for the compiled contract `c`; the text the generator has always sent."""
+    site = cfg.get("site", {}) if isinstance(cfg, dict) else {}
+    brand = site.get("brand") or site.get("title") or "Reality Checks"
+    hubs = c["hubs"]
+    page_types = c["page_types"]
+    wc_min, wc_ideal_min, wc_ideal_max, wc_max = (c["wordcount"][k] for k in ("min", "ideal_min", "ideal_max", "max"))
+    forbidden_str = ", ".join(c["forbidden_words"])
+    outline_md = "\n".join([f"## {h}" for h in c["outline"]])
+
+    closing_templates = c["closing_templates"]
+    closing_hint = ""
+    if closing_templates:
+        closing_hint = "Choose ONE closing reassurance line in a similar style to these:\n- " + "\n- ".join(closing_templates[:3])
+
+    system = f"""You write calm, reassuring evergreen content for the site "{brand}".
+NO medical, legal, or financial advice. Avoid diagnosing. Avoid giving instructions like a professional.
+Forbidden words/phrases: {forbidden_str}.
+Return JSON only. Do not wrap in markdown fences.
+"""
+
+    page_prompt = f"""Return ONLY JSON with:
+title
+summary (one sentence reassurance; also used as meta description)
+description (<= 160 chars, no quotes)
+hub (one of: { " | ".join(hubs) })
+page_type (one of: { " | ".join(page_types) })
+closing_reassurance (one short, gentle line; NOT advice)
+body_md (markdown only; must include the exact H2 headings below)
+
+Use these H2 sections exactly:
+{outline_md}
+
+Rules:
+- Neutral, encyclopedic tone (beginner-friendly). No hype, no fear framing.
+- No medical, legal, or financial advice.
+- No dates or time-sensitive language (no years, “recent”, “currently”, “this year”, “today”, “now”).
+- No prices, costs, or financial claims.
+- No guarantees/promises (“always”, “never”, “100%”, “will definitely”, “guarantee”).
+- No first-person language (“I”, “we”, “our”, “my”).
+- No calls-to-action or directive language (“you should”, “try this”, “make sure to”, “sign up”, “buy”, “download”).
+- No affiliate/product review language (affiliate, sponsored, review, coupon, discount).
+- Comparisons must be neutral (avoid superlatives like “best”, “worst”, “better than”).
+- Short paragraphs: 2–3 sentences max.
+- Use ONLY H2 (##) and H3 (###) headings. No H1, no H4+.
+- Include at least 3 contextually relevant internal links using ONLY relative URLs like /pages/<slug>/ (no external links).
+- Wordcount: minimum {wc_min} words, target {wc_ideal_min}–{wc_ideal_max}, maximum {wc_max}.
+
+Return ONLY JSON with:
+title
+summary (one sentence reassurance; also used as meta description)
+description (<= 160 chars, no quotes)
+hub (one of: { " | ".join(hubs) })
+page_type (one of: { " | ".join(page_types) })
+closing_reassurance (one short, gentle line; NOT advice)
+body_md (markdown only; must include the exact H2 headings below)
+
+Use these H2 sections exactly:
+{outline_md}
+
+Rules:
+- Keep tone grounded and human, not clinical.
+- No "diagnose/diagnosis/prescribed/guaranteed/sue".
+- FAQs: 4-6 Q&As (short).
+- Do not include the closing reassurance inside body_md; put it in closing_reassurance.
+{closing_hint}
+"""
+    return system, page_prompt
+
+# ---------------------------
+# Compile / load
+# ---------------------------
+
+def _first(*vals, default=None):
+    for v in vals:
+        if v is not None and v != "":
+            return v
+    return default
+
+
+def compile_contract(cfg: dict) -> dict:
+    cfg = cfg if isinstance(cfg, dict) else {}
+    gen = cfg.get("generation") or {}
+    gates = cfg.get("gates") or {}
+    internal = cfg.get("internal_linking") or {}
+    prohibitions = gen.get("hard_prohibitions") or {}
+    wc = gen.get("wordcount") or {}
+
+    outline = [str(h) for h in (gen.get("outline_h2") or DEFAULT_OUTLINE)]
+    forbidden_words = [str(w) for w in (gen.get("forbidden_words") or DEFAULT_FORBIDDEN_WORDS)]
+    rules = []
+    for name, patterns, message, flag in RULE_SETS:
+        if flag and (gates.get(flag) is False or prohibitions.get(flag) is False):
+            continue
+        if name == "forbidden":
+            # The words the prompt forbids are gate failures too.
+            patterns = patterns + [rf"\b{re.escape(w.lower())}\b" for w in forbidden_words]
+        rules.append({"name": name, "message": message, "pattern": "|".join(f"(?:{p})" for p in patterns)})
+
+    c = {
+        "outline": outline,
+        "hubs": [h.get("id") for h in ((cfg.get("taxonomy") or {}).get("hubs") or []) if isinstance(h, dict) and h.get("id")] or DEFAULT_HUBS,
+        "page_types": gen.get("page_types") or DEFAULT_PAGE_TYPES,
+        "wordcount": {
+            "min": int(_first(wc.get("min"), gates.get("wordcount_min"), default=900)),
+            "ideal_min": int(_first(wc.get("ideal_min"), default=1100)),
+            "ideal_max": int(_first(wc.get("ideal_max"), default=1600)),
+            "max": int(_first(wc.get("max"), gates.get("wordcount_max"), default=1900)),
+        },
+        "max_sentences_per_paragraph": int(_first(gates.get("max_sentences_per_paragraph"),
+                                                  (gen.get("style_rules") or {}).get("max_sentences_per_paragraph"), default=3)),
+        "min_internal_links": int(_first(internal.get("min_links"), gates.get("min_internal_links"), default=3)),
+        "forbid_external_links": bool(_first(internal.get("forbid_external"), gates.get("forbid_external_links"), default=True)),
+        "broken_links": str(internal.get("broken_links") or "warn").lower(),
+        "faq_min": int(_first(gates.get("faq_min"), default=4)),
+        "required_frontmatter": REQUIRED_FRONTMATTER,
+        "required_sections": gates.get("required_sections") or [s for s in DEFAULT_REQUIRED_SECTIONS if s in outline],
+        "section_min_words": SECTION_MIN_WORDS,
+        "forbidden_words": forbidden_words,
+        "closing_templates": [str(t) for t in (gen.get("closing_reassurance_templates") or [])],
+        "rules": rules,
+    }
+    c["system"], c["page_prompt"] = render_prompts(cfg, c)
+    c["hash"] = hashlib.sha1(json.dumps(c, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    c["version"] = CONTRACT_VERSION
+    return c
+
+
+def _cache_key(source: bytes) -> str:
+    # This file's own bytes are part of the key: changing a default or a rule recompiles.
+    with open(__file__, "rb") as f:
+        code = f.read()
+    return hashlib.sha1(source + b"\0" + code).hexdigest()[:16]
+
+
+_LOADED = {}
+
+
+def load_contract(path: str = SITE_CONFIG_PATH) -> dict:
+    """Compiled contract for `path`, from the in-process memo, then the disk cache, then compiled."""
+    try:
+        with open(path, "rb") as f:
+            source = f.read()
+    except OSError:
+        source = b""
+    key = _cache_key(source)
+    if key in _LOADED:
+        return _LOADED[key]
+    cache_path = os.path.join(CONTRACT_CACHE_DIR, f"{key}.json")
+    c = None
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            c = json.load(f)
+        if c.get("version") != CONTRACT_VERSION:
+            c = None
+    except (OSError, json.JSONDecodeError):
+        pass
+    if c is None:
+        c = compile_contract(yaml.safe_load(source) if source else {})
+        c["source_hash"] = hashlib.sha1(source).hexdigest()
+        try:
+            # Imported here: page_writer is only needed when the cache is (re)written.
+            from page_writer import write_if_changed
+            os.makedirs(CONTRACT_CACHE_DIR, exist_ok=True)
+            write_if_changed(cache_path, json.dumps(c, ensure_ascii=False, indent=1))
+        except OSError:
+            pass  # read-only checkout: compile in memory every time
+    c["rx"] = {r["name"]: re.compile(r["pattern"], flags=re.I | re.M) for r in c["rules"]}
+    _LOADED.clear()
+    _LOADED[key] = c
+    return c
+
+
+def adopt(path: str = SITE_CONFIG_PATH) -> int:
+    """Pages stamped with the old hash (sha1 of the site.yaml bytes) get the canonical hash instead."""
+    from page_meta import PageMeta
+
+    c = load_contract(path)
+    meta = PageMeta()
+    n = 0
+    for slug, entry in list(meta.entries.items()):
+        if entry.get("contract_hash") == c["source_hash"]:
+            meta.update(slug, contract_hash=c["hash"])
+            n += 1
+    meta.save()
+    print(f"[contract] re-stamped {n} sidecar entries with {c['hash']}")
+    return 0
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "show"
+    if cmd == "show":
+        c = load_contract()
+        print(json.dumps({k: v for k, v in c.items() if k not in ("rx", "system", "page_prompt")}, indent=1, ensure_ascii=False))
+        raise SystemExit(0)
+    if cmd == "hash":
+        print(load_contract()["hash"])
+        raise SystemExit(0)
+    if cmd == "adopt":
+        raise SystemExit(adopt())
+    raise SystemExit("Usage: python scripts/contract.py show|hash|adopt")
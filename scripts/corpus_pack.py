@@ -0,0 +1,226 @@
+"""
+Packed, memory-mapped snapshot of content/pages.
+
+Usage:
+  python scripts/corpus_pack.py [refresh|stats]
+
+One file, .factory/corpus.pack: every page's index.md bytes back to back,
+then a JSON table slug -> [offset, length, fm_end, body_start, mtime_ns, size],
+then a 16-byte footer pointing at the table. Bulk readers (link hints,
+backfill, regen selection, gates, importer) map it once and iterate
+(slug, frontmatter, body) memoryviews into the mapping instead of opening
+thousands of small files.
+
+refresh() stats each page and re-reads only those whose mtime/size changed;
+unchanged pages are copied straight from the old mapping. The new pack is
+written beside the old one and swapped in with os.replace, so concurrent
+readers (shard runs) always map a complete file.
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+
+import yaml
+
+CONTENT_ROOT = os.getenv("CONTENT_ROOT", "content/pages")
+PACK_PATH = os.getenv("PACK_PATH", ".factory/corpus.pack")
+PACK_VERSION = 1
+FOOTER = struct.Struct("<4sQI")  # magic, table offset, version
+MAGIC = b"CPK1"
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def split_frontmatter(data: bytes) -> tuple[int, int]:
+    """
+    (fm_end, body_start) within a page, matching generate_pages.read_markdown_frontmatter:
+    frontmatter is data[3:fm_end], body is data[body_start:]. (0, 0) when there is none.
+    """
+    if not data.startswith(b"---"):
+        return 0, 0
+    i = data.find(b"\n---\n", 3)
+    return (i, i + 5) if i >= 0 else (0, 0)
+
+
+def parse_frontmatter(fm) -> dict:
+    """YAML frontmatter (bytes or memoryview) -> dict; {} when absent or invalid."""
+    if not fm:
+        return {}
+    try:
+        data = yaml.load(bytes(fm).decode("utf-8", errors="replace"), Loader=YAML_LOADER) or {}
+    except yaml.YAMLError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def scan_pages(content_root: str) -> dict:
+    """slug -> [mtime_ns, size] of every <slug>/index.md."""
+    out = {}
+    if not os.path.isdir(content_root):
+        return out
+    with os.scandir(content_root) as it:
+        for d in it:
+            try:
+                st = os.stat(os.path.join(d.path, "index.md"))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            out[d.name] = [st.st_mtime_ns, st.st_size]
+    return out
+
+
+class CorpusPack:
+    def __init__(self, path: str = PACK_PATH):
+        self.path = path
+        self.pages = {}   # slug -> [offset, length, fm_end, body_start, mtime_ns, size]
+        self._file = None
+        self._mm = None
+        self._owned = None  # a pack we could not swap in (Windows keeps mapped files locked)
+
+    # -- mapping --
+
+    def open(self) -> "CorpusPack":
+        self.close()
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            return self
+        try:
+            size = os.fstat(f.fileno()).st_size
+            if size < FOOTER.size:
+                raise ValueError("short pack")
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, table_at, version = FOOTER.unpack(mm[size - FOOTER.size:])
+            if magic != MAGIC or version != PACK_VERSION or table_at > size - FOOTER.size:
+                raise ValueError("not a corpus pack")
+            self.pages = json.loads(mm[table_at:size - FOOTER.size])
+        except (OSError, ValueError):
+            f.close()
+            self.pages = {}
+            return self
+        self._file, self._mm = f, mm
+        return self
+
+    def close(self) -> None:
+        self.pages = {}
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass  # a caller still holds views; the mapping is released with them
+        if self._file is not None:
+            self._file.close()
+        self._mm = self._file = None
+        if self._owned:
+            try:
+                os.remove(self._owned)
+            except OSError:
+                pass
+            self._owned = None
+
+    def __enter__(self) -> "CorpusPack":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # -- reading --
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def __contains__(self, slug: str) -> bool:
+        return slug in self.pages
+
+    def raw(self, slug: str) -> memoryview | None:
+        e = self.pages.get(slug)
+        return memoryview(self._mm)[e[0]:e[0] + e[1]] if e else None
+
+    def text(self, slug: str) -> str | None:
+        view = self.raw(slug)
+        return None if view is None else str(view, "utf-8", errors="replace")
+
+    def split(self, slug: str) -> tuple[memoryview, memoryview]:
+        """(frontmatter, body) memoryviews of one page."""
+        off, length, fm_end, body_start = self.pages[slug][:4]
+        mv = memoryview(self._mm)
+        if not body_start:
+            return mv[off:off], mv[off:off + length]
+        return mv[off + 3:off + fm_end], mv[off + body_start:off + length]
+
+    def items(self, shard=None):
+        """(slug, frontmatter view, body view) in slug order; zero-copy."""
+        from sharding import in_shard
+
+        for slug in sorted(self.pages):
+            if in_shard(slug, shard):
+                fm, body = self.split(slug)
+                yield slug, fm, body
+
+    # -- refresh --
+
+    def refresh(self, content_root: str = CONTENT_ROOT) -> int:
+        """Bring the pack up to date with `content_root`; returns pages re-read (0 = pack reused as is)."""
+        if self._mm is None:
+            self.open()
+        on_disk = scan_pages(content_root)
+        stale = [s for s, stamp in on_disk.items() if s not in self.pages or self.pages[s][4:] != stamp]
+        if not stale and len(on_disk) == len(self.pages):
+            return 0
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        table = {}
+        stale_set = set(stale)
+        with open(tmp, "wb") as out:
+            pos = 0
+            for slug in sorted(on_disk):
+                if slug in stale_set:
+                    try:
+                        with open(os.path.join(content_root, slug, "index.md"), "rb") as f:
+                            data = f.read()
+                    except OSError:
+                        continue  # deleted between the scan and the read
+                else:
+                    off, length = self.pages[slug][:2]
+                    data = self._mm[off:off + length]
+                fm_end, body_start = split_frontmatter(data)
+                out.write(data)
+                table[slug] = [pos, len(data), fm_end, body_start] + on_disk[slug]
+                pos += len(data)
+            out.write(json.dumps(table, separators=(",", ":")).encode("utf-8"))
+            out.write(FOOTER.pack(MAGIC, pos, PACK_VERSION))
+        self.close()
+        try:
+            os.replace(tmp, self.path)
+        except OSError:
+            # Another process still maps the old pack (Windows): read from ours and drop it on close.
+            path, self.path = self.path, tmp
+            self.open()
+            self.path, self._owned = path, tmp
+            return len(stale)
+        self.open()
+        return len(stale)
+
+
+def load_pack(content_root: str = CONTENT_ROOT, path: str = PACK_PATH) -> CorpusPack:
+    """Pack mapped and brought up to date with `content_root`."""
+    pack = CorpusPack(path)
+    pack.refresh(content_root)
+    return pack
+
+
+def main(argv: list | None = None) -> int:
+    cmd = (argv or ["refresh"])[0]
+    if cmd not in ("refresh", "stats"):
+        raise SystemExit("Usage: python scripts/corpus_pack.py [refresh|stats]")
+    pack = CorpusPack().open()
+    reread = pack.refresh() if cmd == "refresh" else 0
+    size = os.path.getsize(pack.path) if os.path.exists(pack.path) else 0
+    print(f"[pack] {len(pack)} pages, {size / 1e6:.1f} MB in {pack.path} ({reread} re-read)")
+    pack.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,357 @@
+"""
+Corpus-level quality analytics.
+
+Usage:
+  python scripts/corpus_stats.py build
+  python scripts/corpus_stats.py report [--by hub|page_type|gen_version] [--outliers N]
+
+One batched pass turns every page into a feature vector: words per outline
+section, paragraph and sentence lengths, link and FAQ counts, vocabulary
+size, plus the page's most frequent terms. The vectors are stored column-ready
+in .factory/corpus_stats/ (flat float32/uint32 arrays plus a JSON row index)
+keyed by each page's mtime/size, so a rebuild only re-reads changed pages
+(from the corpus pack, see corpus_pack.py).
+
+`report` prints corpus distributions, per-group medians with their drift
+from the corpus median (by hub, page_type or gen_version), and the pages
+furthest from the norm. It reads what the gates measure, so trends show up
+here before pages start failing them.
+"""
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import argparse
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from contract import load_contract
+from corpus_pack import load_pack
+from hub_index import scalar_value
+from page_meta import PageMeta
+from quality_gates import extract_markdown_links, sentence_count, split_paragraphs, word_count
+from search_index import tokenize
+
+CONTENT_ROOT = os.getenv("CONTENT_ROOT", "content/pages")
+SITE_CONFIG_PATH = os.getenv("SITE_CONFIG_PATH", "data/site.yaml")
+STATS_DIR = os.getenv("STATS_DIR", ".factory/corpus_stats")
+STATS_WORKERS = int(os.getenv("STATS_WORKERS", str(os.cpu_count() or 2)))
+STATS_VERSION = 1
+
+TOP_TERMS = 16           # most frequent terms kept per page (as crc32 ids)
+HUB_PROFILE_TERMS = 50   # a hub's vocabulary = the most common top terms of its pages
+DRIFT_WARN_PCT = float(os.getenv("DRIFT_WARN_PCT", "15"))
+OUTLIER_Z = float(os.getenv("OUTLIER_Z", "4"))
+# Changed pages are read in-process below this count; worker start-up costs more than it saves.
+PARALLEL_MIN_PAGES = 200
+STATS_BATCH = 4096
+
+BASE_COLUMNS = (
+    "words", "paragraphs", "para_words_mean", "para_words_max", "sent_per_para_mean", "sent_per_para_max",
+    "sentence_words_mean", "links_internal", "links_external", "faqs", "vocab",
+)
+# Shown per group and scanned for outliers ("hub_overlap" is derived at report time).
+KEY_COLUMNS = ("words", "para_words_mean", "sent_per_para_max", "sentence_words_mean", "links_internal", "faqs",
+               "vocab", "hub_overlap")
+GROUP_FIELDS = ("hub", "page_type", "gen_version")
+FM_FIELDS = ("hub", "page_type", "gen_version")
+
+EXTERNAL_RE = re.compile(r"^(https?:)?//")
+FAQ_RE = re.compile(r"^###\s+.+|^\*\*Q[:\s].+\*\*", re.M)
+NON_PROSE_RE = re.compile(r"^(#|```|(\-|\*|\d+\.)\s+)")
+
+
+def columns_for(outline: list[str]) -> list[str]:
+    return list(BASE_COLUMNS) + [f"words:{h}" for h in outline]
+
+
+# ---------------------------
+# Per-page features
+# ---------------------------
+
+def split_page(text: str) -> tuple[dict, str]:
+    """(frontmatter scalars in FM_FIELDS, body) without a YAML parse of the whole block."""
+    fm = {}
+    if not text.startswith("---"):
+        return fm, text
+    end = text.find("\n---", 3)
+    if end < 0:
+        return fm, text
+    for line in text[3:end].splitlines():
+        key, sep, val = line.partition(":")
+        if sep and key in FM_FIELDS:
+            fm[key] = scalar_value(val)
+    return fm, text[end + 4:].lstrip("-\n")
+
+
+def page_features(text: str, outline: tuple) -> tuple[dict, list[float], list[int]]:
+    """(frontmatter fields, feature row in columns_for(outline) order, top term ids) of one page's source."""
+    fm, body = split_page(text)
+
+    # One walk over the paragraphs counts each word once: paragraphs split on blank lines,
+    # an H2 line opens a section and whatever follows it is attributed to that section.
+    words = 0
+    section = None
+    section_words = {}
+    faqs = 0
+    para_words, para_sents = [], []
+    for p in split_paragraphs(body):
+        if p.startswith("## "):
+            heading, _, p = p.partition("\n")
+            words += word_count(heading)
+            section = heading[3:].strip()
+            section_words.setdefault(section, 0)
+            p = p.strip()
+            if not p:
+                continue
+        n = word_count(p)
+        words += n
+        if section is not None:
+            section_words[section] += n
+        if section == "FAQs":
+            faqs += len(FAQ_RE.findall(p))
+        if NON_PROSE_RE.match(p):
+            continue
+        para_words.append(n)
+        para_sents.append(sentence_count(p))
+    n_para = len(para_words)
+    sentences = sum(para_sents)
+
+    links = extract_markdown_links(body)
+    internal = sum(1 for _, u in links if u.startswith("/"))
+    external = sum(1 for _, u in links if EXTERNAL_RE.match(u) or u.startswith("www."))
+
+    terms = Counter(tokenize(body))
+    top = [zlib.crc32(t.encode("utf-8")) for t, _ in terms.most_common(TOP_TERMS)]
+
+    row = [
+        words, n_para,
+        sum(para_words) / n_para if n_para else 0.0, max(para_words, default=0),
+        sentences / n_para if n_para else 0.0, max(para_sents, default=0),
+        sum(para_words) / sentences if sentences else 0.0,
+        internal, external, faqs, len(terms),
+    ] + [section_words.get(h, 0) for h in outline]
+    fm = {k: str(v) for k, v in fm.items() if v not in (None, "")}
+    return fm, [float(x) for x in row], top + [0] * (TOP_TERMS - len(top))
+
+
+# ---------------------------
+# Columnar store
+# ---------------------------
+
+class FeatureTable:
+    """
+    Row index (slug, hub, page_type, gen_version, stamp) plus two flat,
+    row-major arrays: `features` (float32, len(columns) per row) and
+    `terms` (uint32, TOP_TERMS per row). column(name) is a strided slice.
+    """
+
+    def __init__(self, columns: list[str]):
+        self.columns = list(columns)
+        self.rows = []             # [slug, hub, page_type, gen_version, [mtime_ns, size]]
+        self.features = array("f")
+        self.terms = array("I")
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def column(self, name: str) -> array:
+        i = self.columns.index(name)
+        return self.features[i::len(self.columns)]
+
+    def load(self, out_dir: str = STATS_DIR) -> "FeatureTable":
+        try:
+            with open(os.path.join(out_dir, "index.json"), "r", encoding="utf-8") as f:
+                idx = json.load(f)
+            if idx.get("version") != STATS_VERSION or idx.get("columns") != self.columns or idx.get("top_terms") != TOP_TERMS:
+                return self  # layout changed: everything is re-read
+            feats, terms = array("f"), array("I")
+            with open(os.path.join(out_dir, "features.f32"), "rb") as f:
+                feats.frombytes(f.read())
+            with open(os.path.join(out_dir, "terms.u32"), "rb") as f:
+                terms.frombytes(f.read())
+        except (OSError, ValueError, json.JSONDecodeError):
+            return self
+        rows = idx.get("rows") or []
+        if len(feats) != len(rows) * len(self.columns) or len(terms) != len(rows) * TOP_TERMS:
+            return self
+        self.rows, self.features, self.terms = rows, feats, terms
+        return self
+
+    def save(self, out_dir: str = STATS_DIR) -> None:
+        os.makedirs(out_dir, exist_ok=True)
+        for name, data in (("features.f32", self.features.tobytes()), ("terms.u32", self.terms.tobytes()),
+                           ("index.json", json.dumps({"version": STATS_VERSION, "columns": self.columns,
+                                                      "top_terms": TOP_TERMS, "rows": self.rows},
+                                                     separators=(",", ":")).encode("utf-8"))):
+            tmp = os.path.join(out_dir, name + ".tmp")
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, os.path.join(out_dir, name))
+
+
+def build(content_root: str = CONTENT_ROOT, out_dir: str = STATS_DIR, workers: int = STATS_WORKERS) -> tuple[FeatureTable, int]:
+    """Feature table for every page under `content_root`; returns (table, pages re-read)."""
+    outline = tuple(load_contract(SITE_CONFIG_PATH)["outline"])
+    cols = columns_for(list(outline))
+    old = FeatureTable(cols).load(out_dir)
+    ncol = len(cols)
+    cached = {r[0]: i for i, r in enumerate(old.rows)}
+
+    fn = partial(page_features, outline=outline)
+    fresh = {}
+    with load_pack(content_root) as pack:
+        on_disk = [(slug, pack.pages[slug][4:]) for slug in sorted(pack.pages)]
+        stale = [slug for slug, stamp in on_disk if slug not in cached or old.rows[cached[slug]][4] != stamp]
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(stale) >= PARALLEL_MIN_PAGES else None
+        try:
+            # Batches bound how much page text is held (and shipped to workers) at once.
+            for i in range(0, len(stale), STATS_BATCH):
+                batch = stale[i:i + STATS_BATCH]
+                texts = [pack.text(slug) for slug in batch]
+                fresh.update(zip(batch, pool.map(fn, texts, chunksize=64) if pool else map(fn, texts)))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    table = FeatureTable(cols)
+    for slug, stamp in on_disk:
+        if slug in fresh:
+            fm, row, top = fresh[slug]
+            table.rows.append([slug, fm.get("hub", ""), fm.get("page_type", ""), fm.get("gen_version", ""), stamp])
+            table.features.extend(row)
+            table.terms.extend(top)
+        else:
+            i = cached[slug]
+            table.rows.append(old.rows[i])
+            table.features.extend(old.features[i * ncol:(i + 1) * ncol])
+            table.terms.extend(old.terms[i * TOP_TERMS:(i + 1) * TOP_TERMS])
+    if fresh or len(table) != len(old):
+        table.save(out_dir)
+    return table, len(fresh)
+
+
+# ---------------------------
+# Statistics
+# ---------------------------
+
+def quantile(sorted_vals: list, q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    pos = (len(sorted_vals) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (pos - lo)
+
+
+def median_mad(vals) -> tuple[float, float]:
+    s = sorted(vals)
+    med = quantile(s, 0.5)
+    mad = quantile(sorted(abs(v - med) for v in s), 0.5)
+    return med, mad
+
+
+def hub_overlap(table: FeatureTable) -> array:
+    """Share of each page's top terms found in its hub's profile (the hub's most common top terms)."""
+    by_hub = {}
+    for i, r in enumerate(table.rows):
+        by_hub.setdefault(r[1], []).append(i)
+    out = array("f", bytes(4 * len(table)))
+    for idx in by_hub.values():
+        counts = Counter()
+        for i in idx:
+            counts.update(t for t in table.terms[i * TOP_TERMS:(i + 1) * TOP_TERMS] if t)
+        profile = {t for t, _ in counts.most_common(HUB_PROFILE_TERMS)}
+        for i in idx:
+            top = [t for t in table.terms[i * TOP_TERMS:(i + 1) * TOP_TERMS] if t]
+            out[i] = sum(1 for t in top if t in profile) / len(top) if top else 0.0
+    return out
+
+
+def report(table: FeatureTable, by: str | None = None, outliers: int = 20) -> None:
+    if not table.rows:
+        print("[stats] no pages")
+        return
+    cols = {name: table.column(name) for name in table.columns}
+    cols["hub_overlap"] = hub_overlap(table)
+    names = list(table.columns) + ["hub_overlap"]
+
+    print(f"\n{'feature':<44}{'p10':>9}{'p50':>9}{'p90':>9}{'mean':>9}")
+    for name in names:
+        s = sorted(cols[name])
+        print(f"{name[:43]:<44}{quantile(s, 0.1):>9.1f}{quantile(s, 0.5):>9.1f}{quantile(s, 0.9):>9.1f}"
+              f"{sum(s) / len(s):>9.1f}")
+
+    stats = {name: median_mad(cols[name]) for name in names}
+
+    if by:
+        field = 1 + GROUP_FIELDS.index(by)
+        groups = {}
+        for i, r in enumerate(table.rows):
+            groups.setdefault(r[field] or "(none)", []).append(i)
+        print(f"\nMedian by {by} (drift vs corpus median; * beyond ±{DRIFT_WARN_PCT:g}%)")
+        print(f"{by:<22}{'n':>7}" + "".join(f"{c[:17]:>19}" for c in KEY_COLUMNS))
+        order = sorted(groups, key=(lambda g: (len(g), g)) if by == "gen_version" else (lambda g: -len(groups[g])))
+        drifting = 0
+        for g in order:
+            idx = groups[g]
+            cells = []
+            for c in KEY_COLUMNS:
+                med = quantile(sorted(cols[c][i] for i in idx), 0.5)
+                base = stats[c][0]
+                pct = (med - base) / base * 100 if base else 0.0
+                flag = "*" if abs(pct) > DRIFT_WARN_PCT else " "
+                drifting += flag == "*"
+                cells.append(f"{med:>9.1f} ({pct:+4.0f}%){flag}")
+            print(f"{g[:21]:<22}{len(idx):>7}" + "".join(f"{cell:>19}" for cell in cells))
+        print(f"[stats] {drifting} group/feature medians drift beyond ±{DRIFT_WARN_PCT:g}%")
+
+    if outliers:
+        # Robust z-score: |x - median| / (1.4826 * MAD); features with no spread are skipped.
+        scan = [c for c in names if c in KEY_COLUMNS or c.startswith("words:")]
+        worst = {}
+        for c in scan:
+            med, mad = stats[c]
+            if not mad:
+                continue
+            scale = 1.4826 * mad
+            for i, v in enumerate(cols[c]):
+                z = abs(v - med) / scale
+                if z > OUTLIER_Z and z > worst.get(i, (0,))[0]:
+                    worst[i] = (z, c, v, med)
+        ranked = sorted(worst.items(), key=lambda kv: -kv[1][0])
+        print(f"\nOutliers (robust z > {OUTLIER_Z:g}): {len(ranked)} pages")
+        for i, (z, c, v, med) in ranked[:outliers]:
+            print(f"  {table.rows[i][0]}: {c} = {v:.1f} (median {med:.1f}, z {z:.1f})")
+
+
+def main(argv: list | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Corpus feature vectors, distributions, drift and outliers.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("build")
+    p.add_argument("--workers", type=int, default=STATS_WORKERS)
+    p = sub.add_parser("report")
+    p.add_argument("--workers", type=int, default=STATS_WORKERS)
+    p.add_argument("--by", choices=GROUP_FIELDS)
+    p.add_argument("--outliers", type=int, default=20, help="outlier pages to list (0 to skip)")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    table, reread = build(workers=args.workers)
+    # gen_version comes from the sidecar; frontmatter only for pages not migrated yet.
+    meta = PageMeta()
+    for r in table.rows:
+        r[3] = str(meta.entries.get(r[0], {}).get("gen_version") or r[3])
+    print(f"[stats] {len(table)} pages, {len(table.columns)} features ({reread} re-read) "
+          f"in {time.perf_counter() - t0:.1f}s; stored in {STATS_DIR}/")
+    if args.cmd == "report":
+        report(table, args.by, args.outliers)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,310 @@
+"""
+Long-running factory daemon with a local job API.
+
+Usage:
+  python scripts/factory_server.py serve [--host 127.0.0.1] [--port 8765]
+  python scripts/factory_server.py serve --socket /tmp/factory.sock
+
+Keeps config, prompt templates, the link-hint index, compiled gate rules and the
+HTTP connection pool warm between jobs. Jobs run one at a time, in order. Each
+job is its own run: its own run id (params.run_id, default <daemon start>-job<id>),
+trace file, stage totals and router counters, so run history and the FACTORY
+SUMMARY count only that job. Endpoint health carries over.
+
+API (JSON):
+  POST   /jobs               {"type": "generate|regen|validate|bootstrap", "params": {...}}
+  GET    /jobs               list jobs
+  GET    /jobs/<id>          status, result and log tail
+  DELETE /jobs/<id>          cancel (queued: dropped; running generate/regen: stops after the current page)
+  GET    /health
+
+Params: generate {pages, max_attempts, shard}; regen {pages, max_attempts, rule, hub, slugs, shard};
+validate {delete_on_fail, shard}; bootstrap {niche, tone, title_count}; any job {run_id}.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import itertools
+import threading
+import contextlib
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import generate_pages
+import quality_gates
+import tracing
+
+JOB_TYPES = ("generate", "regen", "validate", "bootstrap")
+JOB_LOG_LINES = int(os.getenv("JOB_LOG_LINES", "500"))
+
+
+@contextlib.contextmanager
+def overrides(module, **attrs):
+    """Temporarily set module-level settings (the scripts read config from globals)."""
+    saved = {k: getattr(module, k) for k in attrs}
+    for k, v in attrs.items():
+        setattr(module, k, v)
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            setattr(module, k, v)
+
+
+class JobLog:
+    """stdout replacement for the worker: keeps the last lines per job and echoes to the console."""
+
+    def __init__(self, job: dict, echo):
+        self.job = job
+        self.echo = echo
+        self.buf = ""
+
+    def write(self, s: str) -> int:
+        self.echo.write(s)
+        self.buf += s
+        *lines, self.buf = self.buf.split("\n")
+        if lines:
+            log = self.job["log"]
+            log.extend(lines)
+            del log[:-JOB_LOG_LINES]
+        return len(s)
+
+    def flush(self) -> None:
+        self.echo.flush()
+
+
+class Factory:
+    def __init__(self):
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.ids = itertools.count(1)
+        self.current = None
+        self.started = time.strftime("%Y%m%dT%H%M%S", time.gmtime()) + f"-{os.getpid()}"
+        threading.Thread(target=self.worker, daemon=True).start()
+
+    # -- warm state --
+
+    def prime(self) -> None:
+        # load_context also compiles the site contract (prompts and gate regexes) into the process memo.
+        ctx = generate_pages.load_context(generate_pages.resolve_site_config_path())
+        generate_pages.cached_link_hints(generate_pages.CONTENT_ROOT, limit=40)
+        try:
+            generate_pages.ROUTER = generate_pages.load_router(ctx["cfg"], timeout=60)
+        except RuntimeError as e:
+            print(f"[serve] router not ready yet ({e}); it will be built on the first job")
+
+    # -- queue --
+
+    def submit(self, jtype: str, params: dict) -> dict:
+        if jtype not in JOB_TYPES:
+            raise ValueError(f"unknown job type: {jtype} (expected one of {', '.join(JOB_TYPES)})")
+        job = {
+            "id": str(next(self.ids)),
+            "type": jtype,
+            "params": params or {},
+            "status": "queued",
+            "created": time.time(),
+            "started": None,
+            "finished": None,
+            "run": None,
+            "result": None,
+            "error": None,
+            "log": [],
+            "stop": threading.Event(),
+        }
+        with self.lock:
+            self.jobs[job["id"]] = job
+        self.queue.put(job["id"])
+        return self.view(job)
+
+    def cancel(self, job_id: str) -> dict | None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] == "queued":
+                job["status"] = "cancelled"
+                job["finished"] = time.time()
+            elif job["status"] == "running":
+                job["stop"].set()
+                job["status"] = "cancelling"
+            return self.view(job)
+
+    def view(self, job: dict, log_tail: int = 0) -> dict:
+        out = {k: v for k, v in job.items() if k not in ("log", "stop")}
+        if log_tail:
+            out["log"] = job["log"][-log_tail:]
+        return out
+
+    def worker(self) -> None:
+        while True:
+            job_id = self.queue.get()
+            with self.lock:
+                job = self.jobs[job_id]
+                if job["status"] != "queued":
+                    continue
+                job["status"] = "running"
+                job["started"] = time.time()
+                self.current = job
+            try:
+                with contextlib.redirect_stdout(JobLog(job, sys.__stdout__)):
+                    job["result"] = self.run(job)
+                status = "cancelled" if job["stop"].is_set() else "done"
+            except SystemExit as e:
+                job["result"] = e.code if isinstance(e.code, int) else 1
+                job["error"] = None if isinstance(e.code, int) else str(e.code)
+                status = "failed" if job["result"] else "done"
+            except Exception as e:
+                job["error"] = f"{type(e).__name__}: {e}"
+                status = "failed"
+            with self.lock:
+                job["status"] = status
+                job["finished"] = time.time()
+                self.current = None
+
+    def run(self, job: dict):
+        p = job["params"]
+        shard = ["--shard", str(p["shard"])] if p.get("shard") else []
+        gp = generate_pages
+        # A fresh run per job: the warm router and tracing module would otherwise keep adding up.
+        job["run"] = str(p.get("run_id") or f"{self.started}-job{job['id']}")
+        tracing.start_run(job["run"])
+        if gp.ROUTER is not None:
+            gp.ROUTER.reset_counters()
+
+        if job["type"] in ("generate", "regen"):
+            with overrides(
+                gp,
+                FACTORY_MODE=job["type"],
+                PAGES_PER_RUN=int(p.get("pages", gp.PAGES_PER_RUN)),
+                MAX_ATTEMPTS=int(p.get("max_attempts", gp.MAX_ATTEMPTS)),
+                REGEN_RULE=str(p.get("rule", gp.REGEN_RULE)),
+                REGEN_HUB=str(p.get("hub", gp.REGEN_HUB)),
+                REGEN_SLUGS=str(p.get("slugs", gp.REGEN_SLUGS)),
+                STOP_EVENT=job["stop"],
+            ):
+                gp.main(shard)
+            return 0
+
+        if job["type"] == "validate":
+            with overrides(quality_gates, DELETE_ON_FAIL=bool(p.get("delete_on_fail", quality_gates.DELETE_ON_FAIL))):
+                return quality_gates.main(shard)
+
+        import bootstrap_site as bs
+        with overrides(
+            bs,
+            NICHE=str(p.get("niche", bs.NICHE)).strip(),
+            TONE=str(p.get("tone", bs.TONE)).strip(),
+            TITLE_COUNT=int(p.get("title_count", bs.TITLE_COUNT)),
+            ROUTER=gp.ROUTER or bs.ROUTER,
+        ):
+            bs.main()
+        # Bootstrap rewrites data/site.yaml; the next job reloads it via the mtime check.
+        return 0
+
+
+def make_handler(factory: Factory):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, code: int, obj) -> None:
+            b = json.dumps(obj, default=str).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(b)))
+            self.end_headers()
+            self.wfile.write(b)
+
+        def do_GET(self):
+            parts = [x for x in self.path.split("?")[0].split("/") if x]
+            if parts == ["health"]:
+                cur = factory.current
+                self.send_json(200, {"ok": True, "queued": factory.queue.qsize(),
+                                     "running": cur["id"] if cur else None})
+            elif parts == ["jobs"]:
+                with factory.lock:
+                    self.send_json(200, [factory.view(j) for j in factory.jobs.values()])
+            elif len(parts) == 2 and parts[0] == "jobs":
+                with factory.lock:
+                    job = factory.jobs.get(parts[1])
+                    if job is None:
+                        self.send_json(404, {"error": "no such job"})
+                    else:
+                        self.send_json(200, factory.view(job, log_tail=100))
+            else:
+                self.send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                self.send_json(404, {"error": "not found"})
+                return
+            try:
+                n = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(n) or b"{}")
+                self.send_json(202, factory.submit(str(body.get("type", "")), body.get("params") or {}))
+            except (ValueError, json.JSONDecodeError) as e:
+                self.send_json(400, {"error": str(e)})
+
+        def do_DELETE(self):
+            parts = [x for x in self.path.split("/") if x]
+            job = factory.cancel(parts[1]) if len(parts) == 2 and parts[0] == "jobs" else None
+            if job is None:
+                self.send_json(404, {"error": "no such job"})
+            else:
+                self.send_json(200, job)
+
+    return Handler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # BaseHTTPRequestHandler expects a (host, port)-style client address
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+
+def serve(args) -> int:
+    factory = Factory()
+    factory.prime()
+    handler = make_handler(factory)
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        srv = UnixHTTPServer(args.socket, handler)
+        where = f"unix:{args.socket}"
+    else:
+        srv = ThreadingHTTPServer((args.host, args.port), handler)
+        srv.daemon_threads = True
+        where = f"http://{args.host}:{args.port}"
+    print(f"[serve] factory daemon listening on {where}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("serve", help="run the daemon")
+    p.add_argument("--host", default=os.getenv("FACTORY_HOST", "127.0.0.1"))
+    p.add_argument("--port", type=int, default=int(os.getenv("FACTORY_PORT", "8765")))
+    p.add_argument("--socket", default=os.getenv("FACTORY_SOCKET", ""), help="listen on a Unix socket instead")
+    args = ap.parse_args()
+    return serve(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,23 +1,45 @@
 import os
+import sys
 import json
 import time
 import re
 import random
 import hashlib
-import requests
+import queue
+import threading
 from datetime import date
 from pathlib import Path
 import yaml
 
-START_TIME = time.time()
+import hub_index
+import quality_gates
+from contract import load_contract
+from corpus_pack import load_pack, parse_frontmatter
+from json_salvage import PAGE_FIELDS, parse_or_salvage
+from link_graph import unlink_missing
+from model_router import load_router
+from page_meta import PageMeta
+from page_writer import PageWriter, render_frontmatter
+from run_deadline import RUN_DEADLINE, RunDeadline
+from run_history import append_record, stage_ms
+from search_index import SearchIndex
+from sharding import in_shard, shard_from_args, shard_label, write_delta
+from title_scheduler import TitleScheduler, load_stats as load_scheduler_stats, save_stats as save_scheduler_stats
+from token_budget import TokenBudget, load_stats as load_token_stats, save_stats as save_token_stats
+import tracing
+from tracing import span, stage_totals, traced
 
-BASE_URL = os.getenv("MOONSHOT_BASE_URL", "https://api.moonshot.ai/v1").rstrip("/")
-API_KEY = os.environ["MOONSHOT_API_KEY"]
-MODEL = os.getenv("KIMI_MODEL", "kimi-k2.5")
+START_TIME = time.time()
 
 PAGES_PER_RUN = int(os.getenv("PAGES_PER_RUN", "10"))
 MAX_ATTEMPTS = int(os.getenv("MAX_ATTEMPTS", "25"))
+# Concurrent page generations in generate_stream() (bootstrap PAGES_NOW pipeline)
+STREAM_WORKERS = int(os.getenv("STREAM_WORKERS", "3"))
+# Starting max_tokens per page; scripts/token_budget.py learns per page type/hub budgets from there
 MAX_OUTPUT_TOKENS = int(os.getenv("MAX_OUTPUT_TOKENS", "1600"))
+# Follow-up requests for a response cut off by MAX_OUTPUT_TOKENS (0 = drop truncated pages)
+MAX_CONTINUATIONS = int(os.getenv("MAX_CONTINUATIONS", "2"))
+CONTINUATION_TAIL_CHARS = 1200
 TEMPERATURE = float(os.getenv("TEMPERATURE", "1"))
 SLEEP_SECONDS = float(os.getenv("SLEEP_SECONDS", "0.3"))
 
@@ -37,10 +59,25 @@ REGEN_SLUGS = os.getenv("REGEN_SLUGS", "").strip()  # comma-separated
 GEN_VERSION = int(os.getenv("GEN_VERSION", "2"))
 BACKFILL_METADATA = os.getenv("BACKFILL_METADATA", "1").strip() == "1"
 
-HEADERS = {
-    "Authorization": f"Bearer {API_KEY}",
-    "Content-Type": "application/json",
-}
+# Endpoint router (providers.endpoints in data/site.yaml); built in main()
+ROUTER = None
+# (i, N) when run with --shard i/N (or FACTORY_SHARD); None = whole site
+SHARD = None
+# threading.Event set by the factory daemon to cancel a running job
+STOP_EVENT = None
+# RUN_DEADLINE budget (scripts/run_deadline.py); reset per run
+DEADLINE = RunDeadline(0)
+
+# Learned output-token budgets (scripts/token_stats.json); loaded per run
+BUDGET = TokenBudget(default=MAX_OUTPUT_TOKENS)
+# Batched, write-if-changed page output; reset per run in main()
+WRITER = PageWriter()
+# Static search index updated as pages are written; None in shard runs (the merge step syncs it)
+SEARCH = None
+
+# Warm caches (see load_context / cached_link_hints)
+_CONTEXT = {}
+_LINK_HINTS = {}
 
 def resolve_site_config_path() -> str:
     """Prefer the single contract at data/site.yaml.
@@ -71,6 +108,7 @@ def load_manifest():
     with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
         return ensure_manifest_shape(json.load(f))
 
+@traced("save_manifest")
 def save_manifest(m):
     m = ensure_manifest_shape(m)
     with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
@@ -82,9 +120,10 @@ def slugify(s):
     s = re.sub(r"\s+", "-", s)
     return s[:80].strip("-")
 
-def load_titles():
-    with open(TITLES_POOL_PATH, "r", encoding="utf-8") as f:
-        return [t.strip() for t in f if t.strip()]
+def load_titles(path: str = TITLES_POOL_PATH):
+    # "#" lines are comments (the pool file ships with a header), never titles.
+    with open(path, "r", encoding="utf-8") as f:
+        return [t.strip() for t in f if t.strip() and not t.lstrip().startswith("#")]
 
 def load_plan(path: str) -> dict:
     if not os.path.isfile(path):
@@ -92,34 +131,27 @@ def load_plan(path: str) -> dict:
     with open(path, "r", encoding="utf-8") as f:
         return yaml.safe_load(f) or {"items": []}
 
+@traced("save_plan")
 def save_plan(path: str, plan: dict) -> None:
     with open(path, "w", encoding="utf-8") as f:
         yaml.safe_dump(plan or {"items": []}, f, sort_keys=False, allow_unicode=True)
 
 def parse_json_strict_or_extract(raw: str) -> dict:
-    raw = (raw or "").strip()
-    try:
-        return json.loads(raw)
-    except json.JSONDecodeError:
-        pass
-
-    raw2 = re.sub(r"^```(?:json)?\s*", "", raw, flags=re.I)
-    raw2 = re.sub(r"\s*```$", "", raw2)
-    try:
-        return json.loads(raw2)
-    except json.JSONDecodeError:
-        pass
-
-    m = re.search(r"\{.*\}", raw, re.S)
-    if not m:
-        raise json.JSONDecodeError("No JSON object found", raw, 0)
-    return json.loads(m.group(0))
+    data, salvage = parse_or_salvage(raw)
+    if salvage is not None:
+        raise json.JSONDecodeError(f"Incomplete JSON object ({salvage!r})", raw or "", 0)
+    return data
 
-def call_kimi(system: str, prompt: str):
+@traced("call_kimi")
+def call_kimi(system: str, prompt: str, hub: str = "", page_type: str = "", max_tokens: int | None = None) -> dict:
+    """
+    Returns the router result dict (content, finish_reason, usage, endpoint, ...).
+    """
+    max_tokens = max_tokens or MAX_OUTPUT_TOKENS
+    ROUTER.count("max_tokens_reserved", max_tokens)
     payload = {
-        "model": MODEL,
         "temperature": TEMPERATURE,
-        "max_tokens": MAX_OUTPUT_TOKENS,
+        "max_tokens": max_tokens,
         "response_format": {"type": "json_object"},
         "messages": [
             {"role": "system", "content": system},
@@ -127,43 +159,22 @@ def call_kimi(system: str, prompt: str):
         ],
     }
 
-    last_err = None
-    for attempt in range(3):
-        r = requests.post(
-            f"{BASE_URL}/chat/completions",
-            headers=HEADERS,
-            json=payload,
-            timeout=60,
-        )
-        if r.status_code < 400:
-            return r.json()["choices"][0]["message"]["content"]
-
-        if r.status_code in (429, 500, 502, 503):
-            time.sleep(2 ** attempt)
-            continue
-
-        last_err = r.text
-        break
-
-    raise RuntimeError(last_err or "API retries exhausted")
+    return ROUTER.complete(payload, hub=hub, page_type=page_type)
 
 
+@traced("link_hints")
 def build_internal_link_hints(content_root: str = "content/pages", limit: int = 40) -> str:
     """
     Build a curated list of existing internal links for the model to use.
     Format: - [Title](/pages/slug/)
     """
-    root = Path(content_root)
     items = []
-    for md in root.glob("*/index.md"):
-        try:
-            raw = md.read_text(encoding="utf-8")
-        except Exception:
-            continue
-        fm, _ = read_frontmatter(raw)
-        slug = fm.get("slug") or md.parent.name
-        title = fm.get("title") or slug.replace("-", " ").title()
-        items.append((str(title).strip(), str(slug).strip()))
+    with load_pack(content_root) as pack:
+        for name, fm_view, _ in pack.items():
+            fm = parse_frontmatter(fm_view)
+            slug = fm.get("slug") or name
+            title = fm.get("title") or slug.replace("-", " ").title()
+            items.append((str(title).strip(), str(slug).strip()))
     # Stable shuffle
     items = sorted(items, key=lambda x: x[1])
     # Take last N (newer slugs tend to be later alphabetically? doesn't matter)
@@ -171,126 +182,27 @@ def build_internal_link_hints(content_root: str = "content/pages", limit: int =
     return "\n".join([f"- [{t}](/pages/{s}/)" for t, s in items if t and s])
 
 
-def build_prompts(cfg: dict):
-    # data/site.yaml is the single contract.
-    site = cfg.get("site", {}) if isinstance(cfg, dict) else {}
-    taxonomy = cfg.get("taxonomy", {}) if isinstance(cfg, dict) else {}
-    generation = cfg.get("generation", {}) if isinstance(cfg, dict) else {}
-
-    brand = site.get("brand") or site.get("title") or "Reality Checks"
-    hubs = [h.get("id") for h in (taxonomy.get("hubs") or []) if isinstance(h, dict) and h.get("id")] or [
-        "work-career", "money-stress", "burnout-load", "milestones", "social-norms"
-    ]
-    page_types = generation.get("page_types") or [
-        "is-it-normal", "checklist", "red-flags", "myth-vs-reality", "explainer"
-    ]
-
-    wc = generation.get("wordcount") or {}
-    wc_min = int(wc.get("min") or 900)
-    wc_ideal_min = int(wc.get("ideal_min") or 1100)
-    wc_ideal_max = int(wc.get("ideal_max") or 1600)
-    wc_max = int(wc.get("max") or 1900)
-
-    forbidden = generation.get("forbidden_words") or []
-    forbidden_str = ", ".join(forbidden) if forbidden else "diagnose, diagnosis, prescribed, guaranteed, sue"
-
-    outline = generation.get("outline_h2") or [
-        "What this feeling usually means",
-        "Common reasons",
-        "What makes it worse",
-        "What helps (non-advice)",
-        "When it might signal a bigger issue",
-        "FAQs",
-    ]
-    outline_md = "\n".join([f"## {h}" for h in outline])
-
-    closing_templates = generation.get("closing_reassurance_templates") or []
-    closing_hint = ""
-    if closing_templates:
-        closing_hint = "Choose ONE closing reassurance line in a similar style to these:\n- " + "\n- ".join(closing_templates[:3])
-
-    system = f"""You write calm, reassuring evergreen content for the site "{brand}".
-NO medical, legal, or financial advice. Avoid diagnosing. Avoid giving instructions like a professional.
-Forbidden words/phrases: {forbidden_str}.
-Return JSON only. Do not wrap in markdown fences.
-"""
-
-    page_prompt = f"""Return ONLY JSON with:
-title
-summary (one sentence reassurance; also used as meta description)
-description (<= 160 chars, no quotes)
-hub (one of: { " | ".join(hubs) })
-page_type (one of: { " | ".join(page_types) })
-closing_reassurance (one short, gentle line; NOT advice)
-body_md (markdown only; must include the exact H2 headings below)
-
-Use these H2 sections exactly:
-{outline_md}
-
-Rules:
-- Neutral, encyclopedic tone (beginner-friendly). No hype, no fear framing.
-- No medical, legal, or financial advice.
-- No dates or time-sensitive language (no years, “recent”, “currently”, “this year”, “today”, “now”).
-- No prices, costs, or financial claims.
-- No guarantees/promises (“always”, “never”, “100%”, “will definitely”, “guarantee”).
-- No first-person language (“I”, “we”, “our”, “my”).
-- No calls-to-action or directive language (“you should”, “try this”, “make sure to”, “sign up”, “buy”, “download”).
-- No affiliate/product review language (affiliate, sponsored, review, coupon, discount).
-- Comparisons must be neutral (avoid superlatives like “best”, “worst”, “better than”).
-- Short paragraphs: 2–3 sentences max.
-- Use ONLY H2 (##) and H3 (###) headings. No H1, no H4+.
-- Include at least 3 contextually relevant internal links using ONLY relative URLs like /pages/<slug>/ (no external links).
-- Wordcount: minimum {wc_min} words, target {wc_ideal_min}–{wc_ideal_max}, maximum {wc_max}.
-
-Return ONLY JSON with:
-title
-summary (one sentence reassurance; also used as meta description)
-description (<= 160 chars, no quotes)
-hub (one of: { " | ".join(hubs) })
-page_type (one of: { " | ".join(page_types) })
-closing_reassurance (one short, gentle line; NOT advice)
-body_md (markdown only; must include the exact H2 headings below)
-
-Use these H2 sections exactly:
-{outline_md}
-
-Rules:
-- Keep tone grounded and human, not clinical.
-- No "diagnose/diagnosis/prescribed/guaranteed/sue".
-- FAQs: 4-6 Q&As (short).
-- Do not include the closing reassurance inside body_md; put it in closing_reassurance.
-{closing_hint}
-"""
-    return system, page_prompt
-
-def choose_close(data: dict, cfg: dict) -> str:
+def choose_close(data: dict, contract: dict) -> str:
     close = (data.get("closing_reassurance") or "").strip()
     if close:
         return close
 
-    templates = (cfg.get("generation", {}) or {}).get("closing_reassurance_templates") or []
+    templates = contract["closing_templates"]
     if templates:
         return random.choice(templates).strip()
     return "If this hit close to home, you’re not alone — and you’re not failing."
 
-def compute_contract_hash(site_config_path: str) -> str:
-    try:
-        with open(site_config_path, "rb") as f:
-            return hashlib.sha1(f.read()).hexdigest()
-    except Exception:
-        return "unknown"
-
 def read_markdown_frontmatter(md_text: str):
     """
     Returns (frontmatter_dict, body_text_without_frontmatter)
     """
     if not md_text.startswith("---"):
         return {}, md_text
-    parts = md_text.split("\n---\n", 2)
-    if len(parts) < 3:
+    # Skip the opening fence; the first "\n---\n" after it closes the frontmatter.
+    parts = md_text[3:].split("\n---\n", 1)
+    if len(parts) < 2:
         return {}, md_text
-    fm_raw = parts[1]
-    body = parts[2]
+    fm_raw, body = parts
     try:
         fm = yaml.safe_load(fm_raw) or {}
         if not isinstance(fm, dict):
@@ -299,41 +211,36 @@ def read_markdown_frontmatter(md_text: str):
         fm = {}
     return fm, body
 
-def write_markdown_with_frontmatter(front: dict, body: str) -> str:
-    fm_txt = yaml.safe_dump(front or {}, sort_keys=False, allow_unicode=True).strip()
-    return f"---\n{fm_txt}\n---\n\n{body.lstrip() if body else ''}"
-
-def iter_content_pages(root_dir: str) -> list[str]:
+def iter_content_pages(root_dir: str, shard=None) -> list[str]:
     pages = []
     for dirpath, dirnames, filenames in os.walk(root_dir):
-        if "index.md" in filenames:
+        if "index.md" in filenames and in_shard(os.path.basename(dirpath), shard):
             pages.append(os.path.join(dirpath, "index.md"))
     return pages
 
-def backfill_page_metadata(content_root: str, contract_hash: str) -> int:
+@traced("backfill")
+def backfill_page_metadata(content_root: str, contract_hash: str, meta: PageMeta) -> int:
+    """
+    Give every page a sidecar entry. Page files are never rewritten, and existing
+    entries keep their contract_hash so `contract_mismatch` can still find stale pages.
+    """
     updated = 0
-    for path in iter_content_pages(content_root):
-        try:
-            raw = open(path, "r", encoding="utf-8").read()
-            fm, body = read_markdown_frontmatter(raw)
+    with load_pack(content_root) as pack:
+        for slug, fm_view, _ in pack.items(SHARD):
+            if slug in meta.entries:
+                continue
+            fm = parse_frontmatter(fm_view)
             if not fm:
                 continue
-            changed = False
-            if "gen_version" not in fm:
-                fm["gen_version"] = GEN_VERSION
-                changed = True
-            if "contract_hash" not in fm or str(fm.get("contract_hash")) != str(contract_hash):
-                fm["contract_hash"] = contract_hash
-                changed = True
-            if "prompt_hash" not in fm:
+            found = meta.get(slug, fm)
+            meta.update(
+                slug,
+                gen_version=str(found.get("gen_version", GEN_VERSION)),
+                contract_hash=str(found.get("contract_hash", contract_hash)),
                 # We only set a placeholder here; new writes will set a real prompt_hash
-                fm["prompt_hash"] = "backfilled"
-                changed = True
-            if changed:
-                open(path, "w", encoding="utf-8").write(write_markdown_with_frontmatter(fm, body))
-                updated += 1
-        except Exception:
-            continue
+                prompt_hash=str(found.get("prompt_hash", "backfilled")),
+            )
+            updated += 1
     return updated
 
 def parse_regen_rule(rule: str) -> dict:
@@ -345,60 +252,70 @@ def parse_regen_rule(rule: str) -> dict:
         return {"type": k.strip(), "value": v.strip()}
     return {"type": rule, "value": ""}
 
-def select_pages_for_regen(content_root: str, contract_hash: str) -> list[dict]:
+@traced("regen_select")
+def select_pages_for_regen(content_root: str, contract_hash: str, meta: PageMeta) -> list[dict]:
     """
     Returns list of dicts: {path, fm}
     """
     targets = []
     slugs_set = set([s.strip() for s in REGEN_SLUGS.split(",") if s.strip()]) if REGEN_SLUGS else set()
     rule = parse_regen_rule(REGEN_RULE)
-    for path in iter_content_pages(content_root):
-        try:
-            raw = open(path, "r", encoding="utf-8").read()
-            fm, _ = read_markdown_frontmatter(raw)
-            if not fm:
-                continue
-            slug = str(fm.get("slug") or "").strip()
-            hub = str(fm.get("hub") or "").strip()
-            gv = fm.get("gen_version", 0)
+    with load_pack(content_root) as pack:
+        for name, fm_view, _ in pack.items(SHARD):
+            path = os.path.join(content_root, name, "index.md")
             try:
-                gv = int(gv)
-            except Exception:
-                gv = 0
-
-            # Explicit selection wins
-            if slugs_set:
-                if slug and slug in slugs_set:
-                    targets.append({"path": path, "fm": fm})
-                continue
-            if REGEN_HUB:
-                if hub.lower() == REGEN_HUB.lower():
-                    targets.append({"path": path, "fm": fm})
-                continue
-
-            # Rule-based selection
-            if not rule:
-                continue
-            rtype = rule.get("type")
-            rval = rule.get("value")
-            if rtype == "version_lt":
+                fm = parse_frontmatter(fm_view)
+                if not fm:
+                    continue
+                slug = str(fm.get("slug") or "").strip()
+                hub = str(fm.get("hub") or "").strip()
+                pm = meta.get(name, fm)
+                gv = pm.get("gen_version", 0)
                 try:
-                    n = int(rval)
+                    gv = int(gv)
                 except Exception:
-                    n = 0
-                if gv < n:
-                    targets.append({"path": path, "fm": fm})
-            elif rtype == "contract_mismatch":
-                if str(fm.get("contract_hash", "")) != str(contract_hash):
-                    targets.append({"path": path, "fm": fm})
-        except Exception:
-            continue
+                    gv = 0
+
+                # Explicit selection wins
+                if slugs_set:
+                    if slug and slug in slugs_set:
+                        targets.append({"path": path, "fm": fm})
+                    continue
+                if REGEN_HUB:
+                    if hub.lower() == REGEN_HUB.lower():
+                        targets.append({"path": path, "fm": fm})
+                    continue
+
+                # Rule-based selection
+                if not rule:
+                    continue
+                rtype = rule.get("type")
+                rval = rule.get("value")
+                if rtype == "version_lt":
+                    try:
+                        n = int(rval)
+                    except Exception:
+                        n = 0
+                    if gv < n:
+                        targets.append({"path": path, "fm": fm})
+                elif rtype == "contract_mismatch":
+                    if str(pm.get("contract_hash", "")) != str(contract_hash):
+                        targets.append({"path": path, "fm": fm})
+                elif rtype == "broken_links":
+                    # Set by quality_gates when a linked page no longer exists
+                    if pm.get("broken_links"):
+                        targets.append({"path": path, "fm": fm})
+            except Exception:
+                continue
 
     return targets
 
-def generate_one_page(title: str, system: str, page_prompt: str, cfg: dict, pinned_hub: str = "", pinned_page_type: str = ""):
+def generate_one_page(title: str, system: str, page_prompt: str, contract: dict, pinned_hub: str = "", pinned_page_type: str = "",
+                      slug: str = "", known: set | None = None):
     """
     Returns (ok, data_dict). data_dict should include title, summary, description, hub, page_type, body_md.
+    `slug` and `known` are what the caller will pass to write_page; the router is fed the
+    quality gates' verdict on the page rendered that way.
     """
     extra = ""
     if pinned_hub:
@@ -406,97 +323,266 @@ def generate_one_page(title: str, system: str, page_prompt: str, cfg: dict, pinn
     if pinned_page_type:
         extra += f"\nPage type (must use exactly): {pinned_page_type}"
 
+    max_tokens = BUDGET.page_budget(pinned_hub, pinned_page_type)
     try:
-        raw = call_kimi(system, f"{page_prompt}\n\nTitle: {title}{extra}")
-        data = parse_json_strict_or_extract(raw)
+        res = call_kimi(system, f"{page_prompt}\n\nTitle: {title}{extra}", hub=pinned_hub,
+                        page_type=pinned_page_type, max_tokens=max_tokens)
     except Exception:
         return False, {}
 
-    body = (data.get("body_md") or "").strip()
-    required_h2 = (cfg.get("generation", {}) or {}).get("outline_h2", [])
-    if required_h2:
-        missing = [h for h in required_h2 if f"## {h}" not in body]
-        if missing:
-            return False, {}
-    else:
-        if body.count("## ") < 6:
-            return False, {}
-
-    required = ["title", "summary", "description", "hub", "page_type"]
-    if any((k not in data or not str(data[k]).strip()) for k in required):
+    ok = gates_ok = False
+    try:
+        with span("json_parse", endpoint=res["endpoint"]):
+            data, salvage = parse_or_salvage(res["content"])
+        tokens = int((res.get("usage") or {}).get("completion_tokens") or 0)
+        hub = pinned_hub or str(data.get("hub") or "")
+        page_type = pinned_page_type or str(data.get("page_type") or "")
+        BUDGET.record(hub, page_type, tokens, res.get("finish_reason") == "length" or salvage is not None, max_tokens)
+        if salvage is not None:
+            ROUTER.count("truncated")
+            tokens_per_char = tokens / max(1, len(res["content"] or ""))
+            data = continue_page(title, system, contract, data, salvage, hub, page_type, tokens_per_char)
+        with span("validate") as sp:
+            ok = page_data_ok(data, contract)
+            gates_ok = ok and gate_verdict(slug or slugify(title), data, contract, known)
+            sp["passed"] = ok
+            sp["gates"] = gates_ok
+    except Exception:
+        data = {}
+    # Feed the endpoint's gate pass rate so the router prefers models whose pages survive the gates.
+    ROUTER.record_gate(res["endpoint"], gates_ok)
+    if not ok:
         return False, {}
 
-    data["body_md"] = body
+    data["body_md"] = (data.get("body_md") or "").strip()
     return True, data
 
-def write_page(slug: str, data: dict, close: str, contract_hash: str, prompt_hash: str) -> None:
-    page_dir = os.path.join(CONTENT_ROOT, slug)
-    os.makedirs(page_dir, exist_ok=True)
-
-    def esc(s: str) -> str:
-        return str(s).replace('"', r'\\"').strip()
-
+def gate_verdict(slug: str, data: dict, contract: dict, known: set | None = None) -> bool:
+    """quality_gates.validate_page on `data` as write_page would render it (links unlinked, close chosen)."""
     body = (data.get("body_md") or "").strip()
+    if known is not None:
+        body, _ = unlink_missing(body, known | {slug})
+    md = render_page(slug, data, choose_close(data, contract), body)
+    ok, _, _, _ = quality_gates.validate_page(Path(CONTENT_ROOT) / slug / "index.md", contract, text=md)
+    return ok
+
+def continue_page(title: str, system: str, contract: dict, data: dict, salvage, hub: str = "", page_type: str = "",
+                  tokens_per_char: float = 0.3) -> dict:
+    """
+    Finish a page whose JSON was cut off: ask only for the missing fields and,
+    when body_md was cut, for the rest of it after the text already received.
+    Each request's max_tokens is the learned page budget minus what already
+    arrived (body characters x `tokens_per_char` of the first response).
+    Returns the merged page (possibly still incomplete; page_data_ok decides).
+    """
+    body = salvage.partial if salvage.truncated == "body_md" else ""
+    # Nothing usable came back; a fresh attempt costs the same and is simpler.
+    if not data and len(body) < 200:
+        return data
+    # Pinned values don't need a model call.
+    if hub:
+        data.setdefault("hub", hub)
+    if page_type:
+        data.setdefault("page_type", page_type)
+    outline = contract["outline"]
+
+    for n in range(MAX_CONTINUATIONS):
+        missing = [f for f in PAGE_FIELDS if f != "body_md" and not str(data.get(f) or "").strip()]
+        body_cut = "body_md" not in data
+        if not body_cut and not missing:
+            break
+        required = {f: "string" for f in missing}
+        inputs = {}
+        if body_cut and body:
+            required["body_md_rest"] = "markdown that continues body_md exactly where it stops (no repetition)"
+            inputs["body_md_ends_with"] = body[-CONTINUATION_TAIL_CHARS:]
+            inputs["missing_h2"] = [h for h in outline if f"## {h}" not in body]
+        elif body_cut:
+            required["body_md"] = "markdown; must include every H2 in inputs.outline_h2"
+            inputs["outline_h2"] = outline
+        task = {
+            "task": "continue_page",
+            "title": title,
+            "inputs": inputs,
+            "required_json": required,
+            "rules": [
+                "Return JSON only, with exactly the keys in required_json.",
+                "Same voice and rules as the rest of the page.",
+                "body_md_rest starts with the very next characters after inputs.body_md_ends_with.",
+            ],
+        }
+        received = len(body if body_cut else data["body_md"]) * tokens_per_char
+        max_tokens = BUDGET.continuation_budget(hub, page_type, received)
+        print(f"[salvage] {title}: missing {', '.join(required)} "
+              f"(continuation {n + 1}/{MAX_CONTINUATIONS}, max_tokens={max_tokens})")
+        try:
+            with span("continuation", fields=",".join(required)):
+                res = call_kimi(system, json.dumps(task, ensure_ascii=False), hub=hub, page_type=page_type,
+                                max_tokens=max_tokens)
+        except Exception:
+            break
+        more, cut = parse_or_salvage(res["content"])
+        for f in missing:
+            if str(more.get(f) or "").strip():
+                data[f] = more[f]
+        if body_cut:
+            if "body_md" in more:
+                data["body_md"] = more["body_md"]
+            elif "body_md_rest" in more:
+                data["body_md"] = body + more["body_md_rest"]
+            elif cut is not None and cut.truncated == "body_md_rest":
+                body += cut.partial  # the continuation was cut too; ask for the rest again
+            elif cut is not None and cut.truncated == "body_md":
+                body = cut.partial
+
+    if "body_md" in data and all(str(data.get(f) or "").strip() for f in PAGE_FIELDS):
+        ROUTER.count("salvaged")
+    return data
+
+def page_data_ok(data: dict, contract: dict) -> bool:
+    if not isinstance(data, dict):
+        return False
+    body = (data.get("body_md") or "").strip()
+    if any(f"## {h}" not in body for h in contract["outline"]):
+        return False
 
-    md = f"""---
-title: "{esc(data['title'])}"
-slug: "{slug}"
-summary: "{esc(data['summary'])}"
-description: "{esc(data['description'])}"
-date: "{date.today().isoformat()}"
-hub: "{esc(data['hub'])}"
-page_type: "{esc(data['page_type'])}"
-gen_version: "{GEN_VERSION}"
-contract_hash: "{contract_hash}"
-prompt_hash: "{prompt_hash}"
----
-
-**{esc(data['summary'])}**
-
-{body}
-
----
-
-*{esc(close)}*
-"""
-    with open(os.path.join(page_dir, "index.md"), "w", encoding="utf-8") as f:
-        f.write(md)
-
-def main():
-    site_cfg_path = resolve_site_config_path()
-    cfg = load_yaml(site_cfg_path)
-    system, page_prompt = build_prompts(cfg)
+    required = ["title", "summary", "description", "hub", "page_type"]
+    if any((k not in data or not str(data[k]).strip()) for k in required):
+        return False
+    return True
+
+def render_page(slug: str, data: dict, close: str, body: str) -> str:
+    """The page file for `data`, with `body` as its (already link-checked) markdown body."""
+    front = render_frontmatter({
+        "title": data["title"],
+        "slug": slug,
+        "summary": data["summary"],
+        "description": data["description"],
+        "date": date.today().isoformat(),
+        "hub": data["hub"],
+        "page_type": data["page_type"],
+    })
+    summary = str(data["summary"]).strip()
+    return f"{front}\n**{summary}**\n\n{body}\n\n---\n\n*{close.strip()}*\n"
+
+@traced("write_page")
+def write_page(slug: str, data: dict, close: str, known: set | None = None) -> None:
+    body = (data.get("body_md") or "").strip()
+    if known is not None:
+        # Links to pages that don't exist become plain text instead of shipping broken.
+        body, removed = unlink_missing(body, known | {slug})
+        if removed:
+            print(f"[links] {slug}: unlinked {len(removed)} unknown page(s): {', '.join(sorted(set(removed)))}")
+    if SEARCH is not None:
+        SEARCH.update(slug, str(data["title"]).strip(), str(data["summary"]).strip(), body)
+    WRITER.add(os.path.join(CONTENT_ROOT, slug, "index.md"), render_page(slug, data, close, body))
+
+def load_context(site_cfg_path: str) -> dict:
+    """
+    Config plus the compiled contract (prompts, outline, rules, hash), rebuilt only
+    when data/site.yaml changes. A one-shot run builds this once; the factory daemon
+    keeps it warm between jobs.
+    """
+    key = (site_cfg_path, os.path.getmtime(site_cfg_path))
+    if _CONTEXT.get("key") != key:
+        contract = load_contract(site_cfg_path)
+        _CONTEXT.clear()
+        _CONTEXT.update(
+            key=key,
+            cfg=load_yaml(site_cfg_path),
+            contract=contract,
+            system=contract["system"],
+            page_prompt=contract["page_prompt"],
+            contract_hash=contract["hash"],
+        )
+    return _CONTEXT
 
+def cached_link_hints(content_root: str, limit: int = 40) -> str:
+    # Adding/removing a page bundle bumps the directory mtime, which invalidates the cache.
+    try:
+        key = (content_root, os.stat(content_root).st_mtime_ns, limit)
+    except FileNotFoundError:
+        return ""
+    if _LINK_HINTS.get("key") != key:
+        _LINK_HINTS.clear()
+        _LINK_HINTS.update(key=key, hints=build_internal_link_hints(content_root, limit=limit))
+    return _LINK_HINTS["hints"]
+
+def with_link_hints(page_prompt: str, content_root: str = "") -> str:
     # Provide internal link candidates so the model can reliably include them
-    link_hints = build_internal_link_hints(CONTENT_ROOT, limit=40)
+    link_hints = cached_link_hints(content_root or CONTENT_ROOT, limit=40)
     if link_hints:
         page_prompt = page_prompt + "\n\nInternal links you MAY use (choose at least 3; do not invent links; no external links):\n" + link_hints + "\n"
+    return page_prompt
+
+def stop_requested() -> bool:
+    """Checked before every new page: daemon cancel, or too close to RUN_DEADLINE to start one."""
+    if STOP_EVENT is not None and STOP_EVENT.is_set():
+        return True
+    return not DEADLINE.can_start()
+
+def main(argv: list | None = None):
+    global WRITER
+    WRITER = PageWriter()
+    try:
+        run(argv)
+    finally:
+        # Never lose generated pages still sitting in the batch (errors, cancellation).
+        WRITER.flush()
+
+def run(argv: list | None = None):
+    global ROUTER, SHARD, START_TIME, SEARCH, BUDGET, DEADLINE
+    START_TIME = time.time()
+    DEADLINE = RunDeadline(RUN_DEADLINE, started=START_TIME)
+    BUDGET = TokenBudget(load_token_stats(), default=MAX_OUTPUT_TOKENS)
+    SHARD = shard_from_args(sys.argv[1:] if argv is None else argv)
+    SEARCH = None if SHARD else SearchIndex()
+    with span("config_load"):
+        site_cfg_path = resolve_site_config_path()
+        ctx = load_context(site_cfg_path)
+    cfg, contract = ctx["cfg"], ctx["contract"]
+    if ROUTER is None:
+        ROUTER = load_router(cfg, timeout=60)
+    system, page_prompt = ctx["system"], ctx["page_prompt"]
+
+    page_prompt = with_link_hints(page_prompt)
 
     os.makedirs(CONTENT_ROOT, exist_ok=True)
-    contract_hash = compute_contract_hash(site_cfg_path)
+    contract_hash = ctx["contract_hash"]
     manifest = load_manifest()
+    meta = PageMeta()
 
     if BACKFILL_METADATA:
-        backfilled = backfill_page_metadata(CONTENT_ROOT, contract_hash)
+        backfilled = backfill_page_metadata(CONTENT_ROOT, contract_hash, meta)
         if backfilled:
-            print(f"[metadata] backfilled gen_version/contract_hash/prompt_hash on {backfilled} pages")
+            print(f"[metadata] backfilled sidecar entries for {backfilled} pages")
 
     prompt_hash = hashlib.sha1((system + "\n" + page_prompt).encode("utf-8")).hexdigest()
+    # Link targets a generated page may use: pages on disk plus those written this run.
+    known_slugs = set(os.listdir(CONTENT_ROOT))
+
+    def record_meta(slug: str, tokens: int) -> None:
+        meta.update(slug, gen_version=str(GEN_VERSION), contract_hash=contract_hash, prompt_hash=prompt_hash,
+                    tokens=tokens, generated_date=date.today().isoformat(), broken_links=None)
+        known_slugs.add(slug)
 
     # Regen mode: rewrite existing pages deterministically by rule/slug/hub.
     if FACTORY_MODE == "regen":
-        targets = select_pages_for_regen(CONTENT_ROOT, contract_hash)
+        targets = select_pages_for_regen(CONTENT_ROOT, contract_hash, meta)
         if not targets:
             print("[regen] no pages matched the regeneration criteria")
+            if not SHARD:
+                meta.save()
             return
 
         print(f"[regen] matched {len(targets)} pages; regenerating up to {PAGES_PER_RUN}")
 
         regen_count = 0
         attempts = 0
+        deletes = 0
 
         for t in targets:
-            if regen_count >= PAGES_PER_RUN or attempts >= MAX_ATTEMPTS:
+            if regen_count >= PAGES_PER_RUN or attempts >= MAX_ATTEMPTS or stop_requested():
                 break
             fm = t["fm"]
             title = str(fm.get("title") or "").strip()
@@ -509,25 +595,41 @@ def main():
             attempts += 1
             print(f"[regen] {slug}: {title}")
 
+            tokens_before = ROUTER.counters["prompt_tokens"] + ROUTER.counters["completion_tokens"]
+            t0 = time.time()
             ok, data = generate_one_page(
                 title=title,
                 system=system,
                 page_prompt=page_prompt,
-                cfg=cfg,
+                contract=contract,
                 pinned_hub=hub,
                 pinned_page_type=page_type,
+                slug=slug,
+                known=known_slugs,
             )
+            DEADLINE.record(time.time() - t0)
             if not ok:
+                deletes += 1
                 continue
 
-            close = choose_close(data, cfg)
-            write_page(slug=slug, data=data, close=close, contract_hash=contract_hash, prompt_hash=prompt_hash)
+            close = choose_close(data, contract)
+            write_page(slug=slug, data=data, close=close, known=known_slugs)
+            record_meta(slug, ROUTER.counters["prompt_tokens"] + ROUTER.counters["completion_tokens"] - tokens_before)
 
             regen_count += 1
             manifest.setdefault("generated_this_run", []).append(slug)
             time.sleep(SLEEP_SECONDS)
 
+        WRITER.flush()
+        if SHARD:
+            finish_run("regen", attempts, regen_count, deletes, delta={
+                "generated_this_run": manifest.get("generated_this_run", []),
+                "page_meta": meta.delta,
+            })
+            return
         save_manifest(manifest)
+        meta.save()
+        finish_run("regen", attempts, regen_count, deletes)
         return
 
     # Generate mode: consume plan todos first, else fall back to titles_pool (legacy).
@@ -535,16 +637,31 @@ def main():
     plan_items = plan.get("items", []) if isinstance(plan, dict) else []
     todo_items = [it for it in plan_items if isinstance(it, dict) and str(it.get("status", "todo")).lower() == "todo"]
 
-    titles = []
+    candidates = []
     if todo_items:
-        titles = [it.get("title", "").strip() for it in todo_items if it.get("title")]
+        for it in todo_items:
+            if not str(it.get("title") or "").strip():
+                continue
+            if not in_shard(str(it.get("slug") or "").strip() or slugify(str(it["title"])), SHARD):
+                continue
+            candidates.append({
+                "title": str(it["title"]).strip(),
+                "hub": str(it.get("hub") or "").strip(),
+                "page_type": str(it.get("page_type") or "").strip(),
+                "priority": it.get("priority") or 0,
+                "plan_item": it,
+            })
     else:
         titles = load_titles()
         random.shuffle(titles)
+        candidates = [{"title": t, "plan_item": None} for t in titles if in_shard(slugify(t), SHARD)]
+
+    # Order by learned pass rate / token cost, interleaving hubs within plan priority tiers.
+    sched_stats = load_scheduler_stats()
+    scheduler = TitleScheduler(candidates, sched_stats)
 
     produced = 0
     attempts = 0
-    retries = 0
     deletes = 0
 
     manifest["generated_this_run"] = []
@@ -553,18 +670,14 @@ def main():
     per_title_fail = {}
     PER_TITLE_CAP = int(os.getenv("PER_TITLE_CAP", "2"))
 
-    for title in titles:
-        if produced >= PAGES_PER_RUN or attempts >= MAX_ATTEMPTS:
+    while produced < PAGES_PER_RUN and attempts < MAX_ATTEMPTS and not stop_requested():
+        cand = scheduler.next_item()
+        if cand is None:
             break
+        title = cand["title"]
+        plan_item = cand["plan_item"]
 
         # If the plan provides an explicit slug, respect it.
-        plan_item = None
-        if todo_items:
-            for it in todo_items:
-                if it.get("title", "").strip() == title and str(it.get("status", "todo")).lower() == "todo":
-                    plan_item = it
-                    break
-
         slug = (plan_item.get("slug") if isinstance(plan_item, dict) and plan_item.get("slug") else None) or slugify(title)
 
         if slug in used:
@@ -575,27 +688,32 @@ def main():
 
         attempts += 1
 
-        pinned_hub = ""
-        pinned_type = ""
-        if isinstance(plan_item, dict):
-            pinned_hub = str(plan_item.get("hub") or "").strip()
-            pinned_type = str(plan_item.get("page_type") or "").strip()
+        pinned_hub = cand.get("hub", "")
+        pinned_type = cand.get("page_type", "")
 
+        tokens_before = ROUTER.counters["prompt_tokens"] + ROUTER.counters["completion_tokens"]
+        t0 = time.time()
         ok, data = generate_one_page(
             title=title,
             system=system,
             page_prompt=page_prompt,
-            cfg=cfg,
+            contract=contract,
             pinned_hub=pinned_hub,
             pinned_page_type=pinned_type,
+            slug=slug,
+            known=known_slugs,
         )
+        tokens = ROUTER.counters["prompt_tokens"] + ROUTER.counters["completion_tokens"] - tokens_before
+        scheduler.record(cand, ok, tokens=tokens, latency=time.time() - t0)
+        DEADLINE.record(time.time() - t0)
         if not ok:
             deletes += 1
             per_title_fail[slug] = per_title_fail.get(slug, 0) + 1
             continue
 
-        close = choose_close(data, cfg)
-        write_page(slug=slug, data=data, close=close, contract_hash=contract_hash, prompt_hash=prompt_hash)
+        close = choose_close(data, contract)
+        write_page(slug=slug, data=data, close=close, known=known_slugs)
+        record_meta(slug, tokens)
 
         # Mark plan item done (idempotent queue), if used.
         if isinstance(plan_item, dict):
@@ -609,20 +727,193 @@ def main():
         manifest.setdefault("generated_this_run", []).append(slug)
         time.sleep(SLEEP_SECONDS)
 
+    # Pages hit the disk before the manifest/plan that reference them.
+    WRITER.flush()
+    if SHARD:
+        # Shared files are merged later by `python scripts/sharding.py merge`.
+        finish_run("generate", attempts, produced, deletes, delta={
+            "plan_done": [
+                {"title": c["title"], "slug": c["plan_item"]["slug"], "generated_date": c["plan_item"]["generated_date"]}
+                for c in candidates
+                if isinstance(c["plan_item"], dict) and c["plan_item"].get("status") == "done"
+            ],
+            "used_titles": manifest.get("generated_this_run", []),
+            "generated_this_run": manifest.get("generated_this_run", []),
+            "scheduler": scheduler.delta,
+            "page_meta": meta.delta,
+        })
+        return
+
+    save_scheduler_stats(sched_stats)
     save_manifest(manifest)
+    meta.save()
 
     # Persist plan progress.
     if todo_items:
         save_plan(PLAN_PATH, plan)
 
-    duration = int(time.time() - START_TIME)
+    finish_run("generate", attempts, produced, deletes)
+
+def generate_stream(titles: queue.Queue, limit: int, workers: int = STREAM_WORKERS) -> list[str]:
+    """
+    Generate up to `limit` pages from title items ({"title", "hub", "page_type"}) taken off
+    `titles` while they are still being produced (bootstrap_site.py with PAGES_NOW). A None
+    item means no more titles. `workers` pages are generated concurrently; returns the slugs
+    written. Pages are flushed, the sidecar and manifest saved, and the run recorded like a
+    normal generate run (mode "stream").
+    """
+    global ROUTER, SEARCH, START_TIME, BUDGET, DEADLINE
+    START_TIME = time.time()
+    DEADLINE = RunDeadline(RUN_DEADLINE, started=START_TIME)
+    BUDGET = TokenBudget(load_token_stats(), default=MAX_OUTPUT_TOKENS)
+    SEARCH = SearchIndex()
+    ctx = load_context(resolve_site_config_path())
+    contract = ctx["contract"]
+    if ROUTER is None:
+        ROUTER = load_router(ctx["cfg"], timeout=60)
+    system, page_prompt = ctx["system"], with_link_hints(ctx["page_prompt"])
+
+    os.makedirs(CONTENT_ROOT, exist_ok=True)
+    meta = PageMeta()
+    prompt_hash = hashlib.sha1((system + "\n" + page_prompt).encode("utf-8")).hexdigest()
+    known_slugs = set(os.listdir(CONTENT_ROOT))
+    # Slugs on disk plus those a worker has taken: two titles that slugify the same are generated once.
+    taken = set(known_slugs)
+    lock = threading.Lock()
+    state = {"claimed": 0, "attempts": 0, "deletes": 0}
+    written = []
+
+    def worker() -> None:
+        while not stop_requested():
+            with lock:
+                # A claim is a page in flight or produced; failures hand theirs back.
+                if state["claimed"] >= limit or state["attempts"] >= MAX_ATTEMPTS:
+                    return
+                state["claimed"] += 1
+                state["attempts"] += 1
+            item = titles.get()
+            if item is None or stop_requested():
+                titles.put(None)  # let the other workers see the end too
+                with lock:
+                    state["claimed"] -= 1
+                    state["attempts"] -= 1
+                return
+            title = item["title"]
+            slug = slugify(title)
+            with lock:
+                dup = slug in taken
+                taken.add(slug)
+                if dup:
+                    state["claimed"] -= 1
+                    state["attempts"] -= 1
+            if dup:
+                continue
+            t0 = time.time()
+            ok, data = generate_one_page(
+                title=title,
+                system=system,
+                page_prompt=page_prompt,
+                contract=contract,
+                pinned_hub=item.get("hub", ""),
+                pinned_page_type=item.get("page_type", ""),
+                slug=slug,
+                known=known_slugs,
+            )
+            DEADLINE.record(time.time() - t0)
+            with lock:
+                if not ok:
+                    state["claimed"] -= 1
+                    state["deletes"] += 1
+                    taken.discard(slug)  # a later title with the same slug may still try
+                    continue
+                write_page(slug=slug, data=data, close=choose_close(data, contract), known=known_slugs)
+                # Calls overlap, so per-page tokens can't be read off the router counters here.
+                meta.update(slug, gen_version=str(GEN_VERSION), contract_hash=ctx["contract_hash"],
+                            prompt_hash=prompt_hash, generated_date=date.today().isoformat(), broken_links=None)
+                known_slugs.add(slug)
+                written.append(slug)
+            print(f"[stream] {slug}: written ({len(written)}/{limit})")
+            time.sleep(SLEEP_SECONDS)
+
+    with span("stream", limit=limit, workers=workers):
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, min(workers, limit)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    WRITER.flush()
+    meta.save()
+    manifest = load_manifest()
+    manifest.setdefault("used_titles", []).extend(written)
+    manifest["generated_this_run"] = list(written)
+    save_manifest(manifest)
+    finish_run("stream", state["attempts"], len(written), state["deletes"])
+    return written
+
+def finish_run(mode: str, attempts: int, produced: int, deletes: int, delta: dict | None = None) -> None:
+    """
+    Print the FACTORY SUMMARY, append this run to the run history and save the learned
+    token budgets. Shard runs pass `delta` instead: the record and the budget
+    observations go into the shard's delta file.
+    """
+    c = ROUTER.counters
+    duration = time.time() - START_TIME
+    d = int(duration)
     print("\n===== FACTORY SUMMARY =====")
     print(f"Pages attempted: {attempts}")
     print(f"Pages produced: {produced}")
-    print(f"Retries: {retries}")
+    print(f"Retries: {c['retries']} ({c['rate_limited']} rate-limited)")
+    trunc_rate = c.get("truncated", 0) / c["calls"] if c["calls"] else 0.0
+    print(f"Truncated responses: {c.get('truncated', 0)} of {c['calls']} calls ({trunc_rate:.0%}; "
+          f"{c.get('salvaged', 0)} completed by continuation)")
     print(f"Deletes: {deletes}")
-    print(f"Duration: {duration // 60}m {duration % 60}s")
+    print(f"Page files written: {WRITER.written} ({WRITER.unchanged} unchanged)")
+    print(f"Tokens: {c['prompt_tokens']} prompt / {c['completion_tokens']} completion")
+    print(f"Duration: {d // 60}m {d % 60}s")
+    if DEADLINE.stopped:
+        print(f"Stopped early for RUN_DEADLINE={DEADLINE.seconds:.0f}s ({DEADLINE.reserve:.0f}s kept for gates and commit)")
     print("===========================\n")
+    print_router_summary()
+
+    record = {
+        "run": tracing.RUN_ID,
+        "kind": "generate",
+        "mode": mode,
+        "pages_target": PAGES_PER_RUN,
+        "attempted": attempts,
+        "produced": produced,
+        "deletes": deletes,
+        "api_calls": c["calls"],
+        "api_attempts": c["attempts"],
+        "retries": c["retries"],
+        "rate_limited": c["rate_limited"],
+        "truncated": c.get("truncated", 0),
+        "salvaged": c.get("salvaged", 0),
+        "prompt_tokens": c["prompt_tokens"],
+        "completion_tokens": c["completion_tokens"],
+        "max_tokens_reserved": c.get("max_tokens_reserved", 0),
+        "duration_s": round(duration, 2),
+        "deadline_stop": DEADLINE.stopped,
+        "stages_ms": stage_ms(stage_totals()),
+    }
+    if SHARD:
+        record["shard"] = shard_label(SHARD)
+        path = write_delta("generate", SHARD, dict(delta or {}, history=[record], token_budget=BUDGET.delta))
+        print(f"[shard] {shard_label(SHARD)}: wrote {path}")
+        return
+    append_record(record)
+    save_token_stats(BUDGET.stats)
+    if WRITER.written:
+        hub_index.build()
+    if SEARCH is not None:
+        SEARCH.flush()
+
+def print_router_summary() -> None:
+    for st in ROUTER.summary():
+        state = "OPEN" if st["open"] else "ok"
+        print(f"[router] {st['id']} ({st['model']}): calls={st['calls']} p50={st['latency_p50']}s "
+              f"errors={st['error_rate']:.0%} pass={st['pass_rate']:.0%} [{state}]")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,148 @@
+"""
+Precomputed hub listings.
+
+Usage:
+  python scripts/hub_index.py [--page-size N]
+
+Writes data/hub_index/<hub>.json (entries sorted by title, split into pages of
+HUB_PAGE_SIZE) and one content/hubs/<hub>/page-<n>/ stub per extra listing page.
+Hub templates render a single chunk from the data file, so neither build time
+per hub page nor page weight grows with the number of pages in a hub.
+Run automatically after generation, gates and shard merges.
+"""
+import os
+import re
+import sys
+import json
+import shutil
+import argparse
+
+import yaml
+
+from page_writer import render_frontmatter, write_if_changed
+
+CONTENT_ROOT = os.getenv("CONTENT_ROOT", "content/pages")
+HUBS_ROOT = os.getenv("HUBS_ROOT", "content/hubs")
+HUB_INDEX_DIR = os.getenv("HUB_INDEX_DIR", "data/hub_index")
+HUB_PAGE_SIZE = int(os.getenv("HUB_PAGE_SIZE", "50"))
+SITE_CONFIG_PATH = os.getenv("SITE_CONFIG_PATH", "data/site.yaml")
+
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+LISTING_FIELDS = ("title", "summary", "hub")
+STUB_DIR_RE = re.compile(r"^page-(\d+)$")
+
+
+def scalar_value(val: str):
+    """One frontmatter scalar; YAML is parsed only for quoted or structured values."""
+    val = val.strip()
+    # render_frontmatter writes JSON-quoted values; older pages use plain or single-quoted scalars.
+    try:
+        if val.startswith('"'):
+            return json.loads(val)
+        if val[:1] in ("'", "[", "{", "|", ">", "&", "*", "!"):
+            return yaml.load(val, Loader=YAML_LOADER)
+        return val
+    except Exception:
+        return val.strip("'\"")
+
+
+def listing_fields(path: str, fields: tuple = LISTING_FIELDS) -> dict:
+    """title/summary/hub (or `fields`) from a page's frontmatter without a full YAML parse."""
+    out = {}
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        if f.readline().strip() != "---":
+            return out
+        for line in f:
+            if line.rstrip("\n") == "---":
+                break
+            key, sep, val = line.partition(":")
+            if sep and key in fields:
+                out[key] = scalar_value(val)
+    return out
+
+
+def collect(content_root: str = CONTENT_ROOT) -> dict:
+    """hub -> entries sorted by title."""
+    hubs = {}
+    if not os.path.isdir(content_root):
+        return hubs
+    with os.scandir(content_root) as it:
+        for d in it:
+            path = os.path.join(d.path, "index.md")
+            if not d.is_dir() or not os.path.isfile(path):
+                continue
+            fm = listing_fields(path)
+            hub = str(fm.get("hub") or "").strip()
+            if not hub:
+                continue
+            hubs.setdefault(hub, []).append({
+                "slug": d.name,
+                "title": str(fm.get("title") or d.name.replace("-", " ").title()).strip(),
+                "summary": str(fm.get("summary") or "").strip(),
+            })
+    for entries in hubs.values():
+        entries.sort(key=lambda e: (e["title"].lower(), e["slug"]))
+    return hubs
+
+
+def hub_labels(site_config_path: str = SITE_CONFIG_PATH) -> dict:
+    try:
+        with open(site_config_path, "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f) or {}
+    except Exception:
+        return {}
+    hubs = (cfg.get("taxonomy") or {}).get("hubs") or []
+    return {h["id"]: str(h.get("label") or h["id"]) for h in hubs if isinstance(h, dict) and h.get("id")}
+
+
+def sync_stubs(hub: str, label: str, n_pages: int, hubs_root: str = HUBS_ROOT) -> int:
+    """Create page-2..page-N listing stubs under the hub section, remove surplus ones; returns files changed."""
+    hub_dir = os.path.join(hubs_root, hub)
+    if not os.path.isdir(hub_dir):
+        return 0
+    changed = 0
+    for n in range(2, n_pages + 1):
+        front = render_frontmatter({"title": f"{label} (page {n})", "hub_listing": hub, "hub_page": n})
+        changed += write_if_changed(os.path.join(hub_dir, f"page-{n}", "index.md"), front + "\n{{< pageslist >}}\n")
+    for name in os.listdir(hub_dir):
+        m = STUB_DIR_RE.match(name)
+        if m and int(m.group(1)) > n_pages:
+            shutil.rmtree(os.path.join(hub_dir, name), ignore_errors=True)
+            changed += 1
+    return changed
+
+
+def build(page_size: int = HUB_PAGE_SIZE, content_root: str = CONTENT_ROOT, out_dir: str = HUB_INDEX_DIR) -> int:
+    """Rewrite every hub index and its stubs; returns the number of files changed."""
+    page_size = max(1, page_size)
+    hubs = collect(content_root)
+    labels = hub_labels()
+    os.makedirs(out_dir, exist_ok=True)
+    changed = 0
+    for hub in sorted(set(hubs) | set(labels)):
+        entries = hubs.get(hub, [])
+        # An empty hub still gets one (empty) listing page for the template to index.
+        pages = [entries[i:i + page_size] for i in range(0, len(entries), page_size)] or [[]]
+        doc = {"hub": hub, "label": labels.get(hub, hub), "total": len(entries), "page_size": page_size,
+               "page_count": len(pages), "pages": pages}
+        changed += write_if_changed(os.path.join(out_dir, f"{hub}.json"), json.dumps(doc, ensure_ascii=False, indent=1) + "\n")
+        changed += sync_stubs(hub, doc["label"], len(pages))
+    # Hubs that no longer exist anywhere
+    for name in os.listdir(out_dir):
+        if name.endswith(".json") and name[:-5] not in hubs and name[:-5] not in labels:
+            os.remove(os.path.join(out_dir, name))
+            changed += 1
+    print(f"[hubs] {sum(len(v) for v in hubs.values())} pages in {len(hubs)} hubs; {changed} index files changed")
+    return changed
+
+
+def main(argv: list | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Rebuild the precomputed hub listings.")
+    ap.add_argument("--page-size", type=int, default=HUB_PAGE_SIZE)
+    args = ap.parse_args(argv)
+    build(args.page_size)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -1,7 +1,43 @@
-import os, zipfile, re
+"""
+Import a Kimi ZIP bundle (pages/**/*.md) into content/pages/<slug>/index.md.
+
+Usage:
+  python scripts/import_kimi_zip.py <zip_path> [--workers N] [--no-gates] [--report PATH]
+
+Members are read one at a time, frontmatter is parsed as YAML and re-rendered
+canonically, and pages whose bytes already match the site are left untouched,
+so re-importing the same archive is a no-op. Quality gates run in a process
+pool while the import continues; results go to the import report (nothing is
+deleted here; the factory's gates step still does that).
+"""
+import os
+import re
+import sys
+import json
+import time
+import zipfile
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date
+from pathlib import Path
+import yaml
+
+import hub_index
+from page_meta import PageMeta
+from page_writer import content_hash, render_frontmatter, write_if_changed
+from contract import load_contract
+from corpus_pack import CorpusPack, load_pack
+from quality_gates import SITE_CONFIG_PATH, validate_page
+from search_index import SearchIndex
 
 OUTPUT_ROOT = "content/pages"
+IMPORT_REPORT_PATH = os.getenv("IMPORT_REPORT_PATH", ".factory/import_report.json")
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(2 * 1024 * 1024)))  # per page
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", str(os.cpu_count() or 2)))
+
+# libyaml when available: ~10x faster than the pure-Python loader on large archives
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 def slugify(s: str) -> str:
     s = s.lower().strip()
@@ -10,49 +46,179 @@ def slugify(s: str) -> str:
     s = re.sub(r"-+", "-", s)
     return s[:90].strip("-")
 
-def ensure_frontmatter(md: str, fallback_title: str):
-    if md.lstrip().startswith("---"):
-        # ensure required keys exist
-        head, rest = md.split("---", 2)[1], md.split("---", 2)[2]
-        fm = head
-        def has(k): return re.search(rf"^\s*{re.escape(k)}\s*:", fm, flags=re.M) is not None
-        add=[]
-        if not has("slug"): add.append(f"slug: \"{slugify(fallback_title)}\"")
-        if not has("date"): add.append(f"date: {date.today().isoformat()}")
-        if not has("hub"): add.append("hub: work-career")
-        if not has("page_type"): add.append("page_type: explainer")
-        if add:
-            fm = fm.rstrip()+"\n" + "\n".join(add) + "\n"
-        return "---\n"+fm+"---\n"+rest.lstrip("\n")
-    else:
-        slug = slugify(fallback_title)
-        return f"""---\ntitle: \"{fallback_title}\"\nslug: \"{slug}\"\ndescription: \"\"\ndate: {date.today().isoformat()}\nhub: work-career\npage_type: explainer\n---\n\n{md.strip()}\n"""
-
-def main(zip_path: str):
+def decode(raw: bytes) -> tuple[str, str]:
+    """(text, encoding). Never drops bytes silently: non-UTF-8 input is read as cp1252/latin-1 and reported."""
+    for enc in ("utf-8-sig", "cp1252"):
+        try:
+            return raw.decode(enc), enc
+        except UnicodeDecodeError:
+            continue
+    return raw.decode("latin-1"), "latin-1"
+
+def page_slug(fm: dict, member: str) -> str:
+    # URL wins (Hugo serves the page there), then an explicit slug, then the file name.
+    url = str(fm.get("url") or "").strip().strip("/")
+    if url:
+        return slugify(url.split("/")[-1])
+    if str(fm.get("slug") or "").strip():
+        return slugify(str(fm["slug"]))
+    return slugify(os.path.splitext(os.path.basename(member))[0].replace("-", " "))
+
+def parse_frontmatter(md: str) -> tuple[dict, str]:
+    if not md.lstrip().startswith("---"):
+        return {}, md
+    parts = md.lstrip()[3:].split("\n---", 1)
+    if len(parts) < 2:
+        return {}, md
+    fm_raw, body = parts
+    try:
+        fm = yaml.load(fm_raw, Loader=YAML_LOADER) or {}
+    except yaml.YAMLError:
+        return {}, md
+    return (fm if isinstance(fm, dict) else {}), body
+
+def existing_date(pack: CorpusPack, slug: str) -> str | None:
+    if slug not in pack:
+        return None
+    fm, _ = pack.split(slug)
+    m = re.search(rb'^date:\s*["\']?([^"\'\n]+)', fm, flags=re.M)
+    return m.group(1).decode("utf-8", errors="replace").strip() if m else None
+
+def normalize_page(md: str, member: str, pack: CorpusPack) -> tuple[str, str, str]:
+    """Return (slug, canonical page text, body) with required fields filled in."""
+    fm, body = parse_frontmatter(md)
+    fallback_title = os.path.splitext(os.path.basename(member))[0].replace("-", " ").title()
+    slug = page_slug(fm, member)
+    fm.setdefault("title", fallback_title)
+    fm["slug"] = slug
+    fm.setdefault("description", "")
+    # Keep the date of a page we already have so re-imports don't churn it.
+    if not fm.get("date"):
+        fm["date"] = existing_date(pack, slug) or date.today().isoformat()
+    fm.setdefault("hub", "work-career")
+    fm.setdefault("page_type", "explainer")
+    body = body.strip()
+    return slug, render_frontmatter(fm) + "\n" + body + "\n", body
+
+def iter_members(z: zipfile.ZipFile):
+    for info in z.infolist():
+        n = info.filename
+        if n.startswith("pages/") and n.endswith(".md") and not info.is_dir():
+            yield info
+
+def gate_page(path: str, contract: dict, text: str):
+    ok, fails, _, _ = validate_page(Path(path), contract, text=text)
+    return ok, fails
+
+def main(argv: list | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Import a Kimi ZIP bundle into Hugo page bundles.")
+    ap.add_argument("zip_path")
+    ap.add_argument("--workers", type=int, default=IMPORT_WORKERS, help="gate worker processes")
+    ap.add_argument("--no-gates", action="store_true", help="skip quality gates")
+    ap.add_argument("--report", default=IMPORT_REPORT_PATH)
+    args = ap.parse_args(argv)
+
+    started = time.time()
     os.makedirs(OUTPUT_ROOT, exist_ok=True)
-    with zipfile.ZipFile(zip_path) as z:
-        names = [n for n in z.namelist() if n.startswith("pages/") and n.endswith(".md")]
-        if not names:
+    contract = load_contract(SITE_CONFIG_PATH)
+    meta = PageMeta()
+    # Existing pages (dates, unchanged checks) come from the packed snapshot, not one open() per slug.
+    pack = load_pack(OUTPUT_ROOT)
+
+    counts = {"new": 0, "updated": 0, "unchanged": 0, "duplicate": 0, "skipped": 0}
+    pages = {}
+    seen_hashes = {}
+    pending = deque()
+    max_pending = max(1, args.workers) * 4
+
+    def collect(limit: int) -> None:
+        # Take finished gate results in order; wait only while more than `limit` are in flight.
+        while pending and (len(pending) > limit or pending[0][1].done()):
+            slug, fut = pending.popleft()
+            ok, fails = fut.result()
+            pages[slug]["gates"] = "pass" if ok else "fail"
+            if fails:
+                pages[slug]["failures"] = fails
+            meta.update(slug, gates=pages[slug]["gates"])
+
+    pool = None if args.no_gates else ProcessPoolExecutor(max_workers=max(1, args.workers))
+    try:
+        with zipfile.ZipFile(args.zip_path) as z:
+            for info in iter_members(z):
+                if info.file_size > IMPORT_MAX_BYTES:
+                    counts["skipped"] += 1
+                    pages[info.filename] = {"member": info.filename, "status": "skipped", "reason": "too large"}
+                    continue
+                with z.open(info) as f:
+                    text, enc = decode(f.read())
+                try:
+                    slug, page, body = normalize_page(text, info.filename, pack)
+                except Exception as e:
+                    counts["skipped"] += 1
+                    pages[info.filename] = {"member": info.filename, "status": "skipped", "reason": str(e)}
+                    continue
+                if not slug:
+                    counts["skipped"] += 1
+                    pages[info.filename] = {"member": info.filename, "status": "skipped", "reason": "no slug"}
+                    continue
+
+                # Same slug, or the same body under another name, earlier in the archive
+                h = content_hash(body.encode("utf-8"))
+                if slug in pages or h in seen_hashes:
+                    counts["duplicate"] += 1
+                    first = slug if slug in pages else seen_hashes[h]
+                    pages[info.filename] = {"member": info.filename, "status": "duplicate", "of": first}
+                    continue
+                seen_hashes[h] = slug
+
+                path = os.path.join(OUTPUT_ROOT, slug, "index.md")
+                existed = slug in pack
+                if existed and pack.raw(slug) == page.encode("utf-8"):
+                    status = "unchanged"
+                else:
+                    status = ("updated" if existed else "new") if write_if_changed(path, page) else "unchanged"
+                counts[status] += 1
+                pages[slug] = {"member": info.filename, "status": status}
+                if enc != "utf-8-sig":
+                    pages[slug]["encoding"] = enc
+
+                if pool is not None:
+                    pending.append((slug, pool.submit(gate_page, path, contract, page)))
+                    collect(limit=max_pending)
+        if not pages:
             raise SystemExit("No pages/*.md files found in zip.")
-        for n in names:
-            raw = z.read(n).decode("utf-8", errors="ignore")
-            fallback_title = os.path.splitext(os.path.basename(n))[0].replace("-", " ").title()
-            md = ensure_frontmatter(raw, fallback_title)
-            # determine slug folder from url if present
-            m = re.search(r'^\s*url:\s*["\']?(/[^"\']+)["\']?\s*$', md, flags=re.M)
-            if m:
-                url = m.group(1).strip("/")
-                slug = url.split("/")[-1] if url else slugify(fallback_title)
-            else:
-                slug = slugify(fallback_title)
-            out_dir = os.path.join(OUTPUT_ROOT, slug)
-            os.makedirs(out_dir, exist_ok=True)
-            with open(os.path.join(out_dir, "index.md"), "w", encoding="utf-8") as f:
-                f.write(md.strip()+"\n")
-    print(f"Imported {len(names)} pages into {OUTPUT_ROOT}/")
+        collect(limit=0)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        pack.close()
+
+    meta.save()
+    if counts["new"] or counts["updated"]:
+        hub_index.build(content_root=OUTPUT_ROOT)
+        search = SearchIndex()
+        search.sync(OUTPUT_ROOT)
+        search.flush()
+    gated = [p for p in pages.values() if "gates" in p]
+    report = {
+        "zip": os.path.basename(args.zip_path),
+        "counts": counts,
+        "gates": {"checked": len(gated), "passed": sum(p["gates"] == "pass" for p in gated)},
+        "duration_s": round(time.time() - started, 2),
+        "pages": pages,
+    }
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+
+    print(f"Imported into {OUTPUT_ROOT}/: {counts['new']} new, {counts['updated']} updated, "
+          f"{counts['unchanged']} unchanged, {counts['duplicate']} duplicates, {counts['skipped']} skipped")
+    if gated:
+        print(f"Quality gates: {report['gates']['passed']}/{len(gated)} passed")
+    print(f"Report: {args.report}")
+    return 0
 
 if __name__ == "__main__":
-    import sys
     if len(sys.argv) < 2:
         raise SystemExit("Usage: python scripts/import_kimi_zip.py <zip_path>")
-    main(sys.argv[1])
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,161 @@
+"""
+Tolerant, schema-aware parsing of the page JSON.
+
+A response cut off by max_tokens is still a prefix of a valid object:
+{"title": "...", "summary": "...", ..., "body_md": "## Intro\\n...   <- cut here
+salvage_object() walks that prefix field by field, keeps every complete value,
+and reports the one field that was cut (with the text it had so far) plus the
+schema fields that never started. generate_pages.py turns that into a
+continuation request for just the missing part instead of paying for the page
+again.
+"""
+import json
+import re
+
+PAGE_FIELDS = ("title", "summary", "description", "hub", "page_type", "closing_reassurance", "body_md")
+
+_DECODER = json.JSONDecoder()
+_WS = re.compile(r"\s*")
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class Salvage:
+    def __init__(self):
+        self.data = {}          # fields whose value was read completely
+        self.truncated = None   # field cut mid-value (None if the cut fell between fields)
+        self.partial = ""       # decoded text of the truncated string value
+        self.complete = False   # the closing brace was reached
+
+    def missing(self, fields=PAGE_FIELDS) -> list[str]:
+        """Schema fields with no complete value (the truncated one included)."""
+        return [f for f in fields if f not in self.data]
+
+    def __repr__(self) -> str:
+        return f"Salvage(fields={sorted(self.data)}, truncated={self.truncated!r}, complete={self.complete})"
+
+
+def decode_partial_string(s: str) -> str:
+    """Decode the body of a JSON string that has no closing quote, dropping a cut-off escape."""
+    out = []
+    i = 0
+    while i < len(s):
+        c = s[i]
+        if c != "\\":
+            out.append(c)
+            i += 1
+            continue
+        if i + 1 >= len(s):
+            break
+        e = s[i + 1]
+        if e == "u":
+            h = s[i + 2:i + 6]
+            if len(h) < 4:
+                break
+            try:
+                out.append(chr(int(h, 16)))
+            except ValueError:
+                break
+            i += 6
+            continue
+        out.append(_ESCAPES.get(e, e))
+        i += 2
+    # A lone high surrogate means the cut split a \\uXXXX pair.
+    if out and "\ud800" <= out[-1] <= "\udbff":
+        out.pop()
+    return "".join(out)
+
+
+def _string_end(raw: str, i: int) -> int:
+    """Index of the closing quote of the string starting at raw[i] == '"', or -1 if it never closes."""
+    j = i + 1
+    n = len(raw)
+    while j < n:
+        c = raw[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == '"':
+            return j
+        j += 1
+    return -1
+
+
+def salvage_object(raw: str) -> Salvage:
+    """Read as much of the first JSON object in `raw` as is present."""
+    res = Salvage()
+    raw = raw or ""
+    start = raw.find("{")
+    if start < 0:
+        return res
+    i = start + 1
+    n = len(raw)
+    while True:
+        i = _WS.match(raw, i).end()
+        if i >= n:
+            return res
+        if raw[i] == "}":
+            res.complete = True
+            return res
+        if raw[i] == ",":
+            i += 1
+            continue
+        if raw[i] != '"':
+            return res  # not JSON we can follow any further
+        end = _string_end(raw, i)
+        if end < 0:
+            return res  # cut inside a key
+        key = json.loads(raw[i:end + 1])
+        i = _WS.match(raw, end + 1).end()
+        if i >= n or raw[i] != ":":
+            return res
+        i = _WS.match(raw, i + 1).end()
+        if i >= n:
+            res.truncated = key
+            return res
+        if raw[i] == '"':
+            end = _string_end(raw, i)
+            if end < 0:
+                res.truncated = key
+                res.partial = decode_partial_string(raw[i + 1:])
+                return res
+            try:
+                res.data[key] = json.loads(raw[i:end + 1])
+            except json.JSONDecodeError:
+                # Invalid escape or control character: keep what decodes, stop here.
+                res.truncated = key
+                res.partial = decode_partial_string(raw[i + 1:end])
+                return res
+            i = end + 1
+            continue
+        try:
+            res.data[key], i = _DECODER.raw_decode(raw, i)
+        except json.JSONDecodeError:
+            res.truncated = key
+            return res
+
+
+def parse_or_salvage(raw: str) -> tuple[dict, Salvage | None]:
+    """
+    (data, None) when the response is (or contains) a complete JSON object;
+    otherwise (whatever was recovered, Salvage) so the caller can continue it.
+    """
+    raw = (raw or "").strip()
+    try:
+        data = json.loads(raw)
+        if isinstance(data, dict):
+            return data, None
+    except json.JSONDecodeError:
+        pass
+    # Fenced or wrapped output: strip fences, then take the object up to its own closing brace.
+    raw2 = re.sub(r"^```(?:json)?\s*", "", raw, flags=re.I)
+    raw2 = re.sub(r"\s*```$", "", raw2)
+    start = raw2.find("{")
+    if start >= 0:
+        try:
+            data, _ = _DECODER.raw_decode(raw2, start)
+            if isinstance(data, dict):
+                return data, None
+        except json.JSONDecodeError:
+            pass
+    s = salvage_object(raw2)
+    return dict(s.data), s
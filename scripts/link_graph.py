@@ -0,0 +1,151 @@
+"""
+Site-wide internal link graph.
+
+Usage:
+  python scripts/link_graph.py report [--orphans] [--fail-on-broken]
+
+Every /pages/<slug>/ link resolves against an in-memory slug set in O(1), and
+a reverse index answers "who links here" when a page is deleted. Each page's
+outgoing links are cached with its mtime/size in .factory/link_index.json, so
+a refresh only re-reads pages that were added or changed.
+"""
+import os
+import re
+import sys
+import json
+import argparse
+
+LINK_INDEX_PATH = os.getenv("LINK_INDEX_PATH", ".factory/link_index.json")
+
+PAGE_LINK_RE = re.compile(r"\[[^\]]+\]\((/pages/([a-z0-9][a-z0-9-]*)/?(?:[#?][^)]*)?)\)")
+
+
+def page_links(md: str) -> set[str]:
+    """Slugs of every /pages/<slug>/ markdown link in `md`."""
+    return {m.group(2) for m in PAGE_LINK_RE.finditer(md)}
+
+
+def unlink_missing(md: str, known: set[str]) -> tuple[str, list[str]]:
+    """Replace [text](/pages/<unknown>/) with plain text; returns (md, removed slugs)."""
+    removed = []
+
+    def sub(m):
+        if m.group(2) in known:
+            return m.group(0)
+        removed.append(m.group(2))
+        return m.group(0)[1:m.group(0).index("](")]
+
+    return PAGE_LINK_RE.sub(sub, md), removed
+
+
+class LinkGraph:
+    def __init__(self):
+        self.slugs = set()
+        self.out = {}      # slug -> set of linked slugs
+        self.inbound = {}  # slug -> set of slugs linking to it
+        self.stamp = {}    # slug -> [mtime_ns, size] of the index.md the links came from
+
+    def set_page(self, slug: str, targets: set[str]) -> None:
+        for t in self.out.get(slug, set()) - targets:
+            self.inbound.get(t, set()).discard(slug)
+        for t in targets - self.out.get(slug, set()):
+            self.inbound.setdefault(t, set()).add(slug)
+        self.out[slug] = set(targets)
+        self.slugs.add(slug)
+
+    def remove_page(self, slug: str) -> set[str]:
+        """Drop a page; returns the pages whose links to it are now broken."""
+        for t in self.out.pop(slug, set()):
+            self.inbound.get(t, set()).discard(slug)
+        self.slugs.discard(slug)
+        self.stamp.pop(slug, None)
+        return set(self.inbound.get(slug, set()))
+
+    def broken(self, slug: str) -> list[str]:
+        return sorted(t for t in self.out.get(slug, ()) if t not in self.slugs)
+
+    def all_broken(self) -> dict:
+        return {s: b for s in sorted(self.out) if (b := self.broken(s))}
+
+    def orphans(self) -> list[str]:
+        """Pages no other page links to."""
+        return sorted(s for s in self.slugs if not (self.inbound.get(s, set()) - {s}))
+
+    def refresh(self, content_root: str) -> int:
+        """Sync with the pages on disk; returns how many pages were (re)read."""
+        on_disk = {}
+        with os.scandir(content_root) as it:
+            for d in it:
+                if not d.is_dir():
+                    continue
+                try:
+                    st = os.stat(os.path.join(d.path, "index.md"))
+                except FileNotFoundError:
+                    continue
+                on_disk[d.name] = [st.st_mtime_ns, st.st_size]
+        for slug in list(self.slugs):
+            if slug not in on_disk:
+                self.remove_page(slug)
+        read = 0
+        for slug, stamp in on_disk.items():
+            if self.stamp.get(slug) == stamp and slug in self.slugs:
+                continue
+            with open(os.path.join(content_root, slug, "index.md"), "r", encoding="utf-8", errors="replace") as f:
+                self.set_page(slug, page_links(f.read()))
+            self.stamp[slug] = stamp
+            read += 1
+        return read
+
+    # -- cache --
+
+    def load(self, path: str = LINK_INDEX_PATH) -> "LinkGraph":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return self
+        for slug, entry in (data.get("pages") or {}).items():
+            self.set_page(slug, set(entry.get("links") or []))
+            self.stamp[slug] = entry.get("stamp")
+        return self
+
+    def save(self, path: str = LINK_INDEX_PATH) -> None:
+        from page_writer import write_if_changed
+        pages = {s: {"links": sorted(self.out.get(s, ())), "stamp": self.stamp.get(s)} for s in sorted(self.slugs)}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        write_if_changed(path, json.dumps({"pages": pages}, separators=(",", ":")))
+
+
+def load_graph(content_root: str, path: str = LINK_INDEX_PATH) -> LinkGraph:
+    """Cached graph brought up to date with `content_root`, cache rewritten if anything changed."""
+    g = LinkGraph().load(path)
+    if os.path.isdir(content_root) and g.refresh(content_root):
+        g.save(path)
+    return g
+
+
+def main(argv: list | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Internal link report: broken links and orphan pages.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("report")
+    p.add_argument("--content-root", default="content/pages")
+    p.add_argument("--orphans", action="store_true", help="list orphan pages, not just the count")
+    p.add_argument("--fail-on-broken", action="store_true")
+    args = ap.parse_args(argv)
+
+    g = load_graph(args.content_root)
+    broken = g.all_broken()
+    orphans = g.orphans()
+    for slug, targets in broken.items():
+        print(f"[BROKEN] {slug} -> {', '.join(targets)}")
+    if args.orphans:
+        for slug in orphans:
+            print(f"[ORPHAN] {slug}")
+    n_links = sum(len(v) for v in g.out.values())
+    print(f"[links] {len(g.slugs)} pages, {n_links} internal links, "
+          f"{sum(len(v) for v in broken.values())} broken on {len(broken)} pages, {len(orphans)} orphans")
+    return 1 if (broken and args.fail_on_broken) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,302 @@
+import os
+import time
+import threading
+from collections import deque
+
+import requests
+
+from tracing import span
+
+# Rolling health window and circuit breaker settings (per endpoint)
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "20"))
+ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))
+ROUTER_COOLDOWN_SECONDS = float(os.getenv("ROUTER_COOLDOWN_SECONDS", "120"))
+# Assumed latency (seconds) for an endpoint that has not answered yet
+ROUTER_DEFAULT_LATENCY = float(os.getenv("ROUTER_DEFAULT_LATENCY", "30"))
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+DEFAULT_BASE_URL = "https://api.moonshot.ai/v1"
+DEFAULT_MODEL = "kimi-k2.5"
+DEFAULT_KEY_ENV = "MOONSHOT_API_KEY"
+# Set by scripts/multi_site.py for its site processes: every call goes through the shared gateway,
+# which holds the real endpoints and keys. FACTORY_SITE names the site to the gateway.
+FACTORY_GATEWAY = os.getenv("FACTORY_GATEWAY", "").strip()
+FACTORY_SITE = os.getenv("FACTORY_SITE", "").strip()
+GATEWAY_CLIENT_TIMEOUT = float(os.getenv("GATEWAY_CLIENT_TIMEOUT", "900"))  # includes fair-queue waits
+
+
+class Endpoint:
+    """One OpenAI-compatible base_url + model, with rolling health stats."""
+
+    def __init__(self, id: str, base_url: str, model: str, api_key: str,
+                 weight: float = 1.0, timeout: float = 60,
+                 hubs: list | None = None, page_types: list | None = None, gateway: bool = False):
+        self.id = id
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.api_key = api_key
+        self.weight = weight
+        self.timeout = timeout
+        self.hubs = set(hubs or [])
+        self.page_types = set(page_types or [])
+        self.gateway = gateway  # multi_site gateway: forward hub/page_type so it can route
+
+        self.latencies = deque(maxlen=ROUTER_WINDOW)
+        self.errors = deque(maxlen=ROUTER_WINDOW)  # 1 = failed call, 0 = ok
+        self.gates = deque(maxlen=ROUTER_WINDOW)   # 1 = page passed, 0 = rejected
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def headers(self, hub: str = "", page_type: str = "") -> dict:
+        h = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        if self.gateway:
+            h["X-Factory-Hub"] = hub
+            h["X-Factory-Page-Type"] = page_type
+        return h
+
+    def is_open(self, now: float) -> bool:
+        # Once the cooldown passes the endpoint is half-open: the next call is a probe,
+        # and a failure re-opens it straight away because consecutive_failures is kept.
+        return now < self.open_until
+
+    def accepts(self, hub: str = "", page_type: str = "") -> bool:
+        if self.hubs and hub not in self.hubs:
+            return False
+        if self.page_types and page_type not in self.page_types:
+            return False
+        return True
+
+    def record_call(self, latency: float, ok: bool) -> None:
+        self.latencies.append(latency)
+        self.errors.append(0 if ok else 1)
+        if ok:
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+            return
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= ROUTER_FAILURE_THRESHOLD:
+            self.open_until = time.time() + ROUTER_COOLDOWN_SECONDS
+
+    def record_gate(self, ok: bool) -> None:
+        self.gates.append(1 if ok else 0)
+
+    def latency(self) -> float:
+        if not self.latencies:
+            return ROUTER_DEFAULT_LATENCY
+        s = sorted(self.latencies)
+        return s[len(s) // 2]
+
+    def error_rate(self) -> float:
+        return (sum(self.errors) / len(self.errors)) if self.errors else 0.0
+
+    def pass_rate(self) -> float:
+        # Laplace-smoothed so one early rejection does not starve an endpoint
+        return (sum(self.gates) + 1) / (len(self.gates) + 2)
+
+    def score(self) -> float:
+        """Expected passing pages per second of wall time, scaled by weight."""
+        return self.weight * self.pass_rate() * (1.0 - self.error_rate()) / max(self.latency(), 0.1)
+
+    def stats(self) -> dict:
+        return {
+            "id": self.id,
+            "model": self.model,
+            "calls": len(self.errors),
+            "latency_p50": round(self.latency(), 3),
+            "error_rate": round(self.error_rate(), 3),
+            "pass_rate": round(self.pass_rate(), 3),
+            "open": self.is_open(time.time()),
+        }
+
+
+class ModelRouter:
+    """Routes chat completions to the best healthy endpoint, failing over on errors."""
+
+    def __init__(self, endpoints: list, session: requests.Session | None = None):
+        if not endpoints:
+            raise RuntimeError("No model endpoints configured")
+        self.endpoints = list(endpoints)
+        self.by_id = {e.id: e for e in self.endpoints}
+        self.session = session or requests.Session()
+        self._lock = threading.Lock()
+        self.reset_counters()
+
+    def reset_counters(self) -> None:
+        """Run-level counters for the FACTORY SUMMARY and run history; endpoint health is kept."""
+        with self._lock:
+            self.counters = {"calls": 0, "attempts": 0, "retries": 0, "rate_limited": 0,
+                             "errors": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def rank(self, hub: str = "", page_type: str = "") -> list:
+        pool = [e for e in self.endpoints if e.accepts(hub, page_type)] or list(self.endpoints)
+        now = time.time()
+        healthy = [e for e in pool if not e.is_open(now)]
+        if not healthy:
+            # Everything is tripped: probe whichever endpoint recovers first.
+            return sorted(pool, key=lambda e: e.open_until)
+        # sorted() is stable, so config order breaks ties between equal scores
+        return sorted(healthy, key=lambda e: e.score(), reverse=True)
+
+    def complete(self, payload: dict, hub: str = "", page_type: str = "", attempts: int = 3) -> dict:
+        """
+        POST payload to /chat/completions on the best endpoint (model is filled in per endpoint).
+        Returns dict: content, finish_reason, usage, endpoint, model, latency, status, attempts.
+        """
+        last_err = None
+        failed = set()
+        self.count("calls")
+        for attempt in range(attempts):
+            self.count("attempts")
+            if attempt:
+                self.count("retries")
+            ranked = self.rank(hub, page_type)
+            fresh = [e for e in ranked if e.id not in failed]
+            ep = fresh[0] if fresh else ranked[0]
+            if not fresh:
+                # No untried endpoint left for this request: back off before retrying.
+                time.sleep(2 ** attempt)
+
+            body = dict(payload)
+            body["model"] = ep.model
+            with span("api.attempt", endpoint=ep.id, model=ep.model, attempt=attempt + 1) as sp:
+                t0 = time.time()
+                try:
+                    r = self.session.post(
+                        f"{ep.base_url}/chat/completions",
+                        headers=ep.headers(hub, page_type),
+                        json=body,
+                        timeout=ep.timeout,
+                    )
+                except requests.RequestException as e:
+                    self.count("errors")
+                    ep.record_call(time.time() - t0, False)
+                    failed.add(ep.id)
+                    last_err = f"{ep.id}: {e}"
+                    sp["status"] = type(e).__name__
+                    continue
+                latency = time.time() - t0
+                sp["status"] = r.status_code
+
+                if r.status_code < 400:
+                    try:
+                        data = r.json()
+                        choice = data["choices"][0]
+                        content = choice["message"]["content"]
+                    except (ValueError, KeyError, IndexError, TypeError):
+                        self.count("errors")
+                        ep.record_call(latency, False)
+                        failed.add(ep.id)
+                        last_err = f"{ep.id}: malformed response body"
+                        sp["status"] = "malformed"
+                        continue
+                    ep.record_call(latency, True)
+                    usage = data.get("usage") or {}
+                    self.count("prompt_tokens", int(usage.get("prompt_tokens") or 0))
+                    self.count("completion_tokens", int(usage.get("completion_tokens") or 0))
+                    sp["finish_reason"] = choice.get("finish_reason")
+                    sp["prompt_tokens"] = usage.get("prompt_tokens")
+                    sp["completion_tokens"] = usage.get("completion_tokens")
+                    return {
+                        "content": content,
+                        "finish_reason": choice.get("finish_reason"),
+                        "usage": usage,
+                        "endpoint": ep.id,
+                        "model": ep.model,
+                        "latency": latency,
+                        "status": r.status_code,
+                        "attempts": attempt + 1,
+                    }
+
+                self.count("errors")
+                if r.status_code == 429:
+                    self.count("rate_limited")
+                ep.record_call(latency, False)
+                failed.add(ep.id)
+                last_err = f"{ep.id}: HTTP {r.status_code}: {r.text[:300]}"
+                if r.status_code in RETRYABLE_STATUS:
+                    sp["retry"] = True
+                    continue
+            # Non-retryable (auth, bad request): only worth it on a different endpoint.
+            if not [e for e in self.rank(hub, page_type) if e.id not in failed]:
+                break
+
+        raise RuntimeError(last_err or "API retries exhausted")
+
+    def record_gate(self, endpoint_id: str, ok: bool) -> None:
+        ep = self.by_id.get(endpoint_id)
+        if ep is not None:
+            ep.record_gate(ok)
+
+    def summary(self) -> list[dict]:
+        return [e.stats() for e in self.endpoints]
+
+
+def load_router(cfg: dict, timeout: float = 60) -> ModelRouter:
+    """
+    Build a router from `providers.endpoints` in data/site.yaml:
+
+        providers:
+          endpoints:
+            - id: moonshot
+              base_url: https://api.moonshot.ai/v1
+              model: kimi-k2.5
+              api_key_env: MOONSHOT_API_KEY
+              weight: 1
+            - id: fast
+              base_url: http://127.0.0.1:8001/v1
+              model: small-model
+              api_key_env: FAST_API_KEY
+              page_types: [checklist]
+
+    Without a providers block, falls back to MOONSHOT_BASE_URL / KIMI_MODEL / MOONSHOT_API_KEY.
+    Endpoints whose key env var is unset are skipped. Under FACTORY_GATEWAY the site's own
+    providers are ignored and the gateway is the only endpoint.
+    """
+    if FACTORY_GATEWAY:
+        return ModelRouter([Endpoint(
+            id="gateway", base_url=FACTORY_GATEWAY, model="gateway", api_key=FACTORY_SITE or "site",
+            timeout=GATEWAY_CLIENT_TIMEOUT, gateway=True,
+        )])
+
+    providers = (cfg.get("providers") or {}) if isinstance(cfg, dict) else {}
+    entries = providers.get("endpoints") or []
+
+    endpoints = []
+    for i, e in enumerate(entries):
+        if not isinstance(e, dict):
+            continue
+        eid = str(e.get("id") or f"endpoint-{i + 1}")
+        key_env = str(e.get("api_key_env") or DEFAULT_KEY_ENV)
+        key = os.getenv(key_env, "")
+        if not key:
+            print(f"[router] skipping {eid}: {key_env} is not set")
+            continue
+        endpoints.append(Endpoint(
+            id=eid,
+            base_url=str(e.get("base_url") or DEFAULT_BASE_URL),
+            model=str(e.get("model") or DEFAULT_MODEL),
+            api_key=key,
+            weight=float(e.get("weight") or 1.0),
+            timeout=float(e.get("timeout") or timeout),
+            hubs=e.get("hubs") or [],
+            page_types=e.get("page_types") or [],
+        ))
+
+    if not endpoints:
+        key = os.getenv(DEFAULT_KEY_ENV, "")
+        if not key:
+            raise RuntimeError(f"{DEFAULT_KEY_ENV} is not set")
+        endpoints.append(Endpoint(
+            id="default",
+            base_url=os.getenv("MOONSHOT_BASE_URL", DEFAULT_BASE_URL),
+            model=os.getenv("KIMI_MODEL", DEFAULT_MODEL),
+            api_key=key,
+            timeout=timeout,
+        ))
+
+    return ModelRouter(endpoints)
@@ -0,0 +1,399 @@
+"""
+Run the factory for many sites from one orchestrator, sharing one API gateway.
+
+Usage:
+  python scripts/multi_site.py run sites.yaml
+  python scripts/multi_site.py run --root ../site-a --root ../site-b [--pages 5]
+
+Each site is a clone of this factory: its own data/site.yaml, plan, manifest and
+content/pages. Every path in the scripts is relative to the site root, so each
+site's steps (generate, regen, gates) run as child processes of this
+orchestrator with cwd set to the site root. They use these scripts, not the
+clone's own copy. The children talk to the model only through an
+OpenAI-compatible gateway served from this process (FACTORY_GATEWAY, see
+model_router.load_router). The gateway holds what the sites share:
+
+- one ModelRouter: the real endpoints and keys, keep-alive connections, health
+  stats and circuit breakers;
+- a fair limiter: at most `concurrency` upstream requests in flight and `rpm`
+  per minute for the shared key, granted to the waiting site with the least
+  use per unit of `weight`;
+- per-site quotas: `pages` per run (PAGES_PER_RUN for the child) and
+  `max_calls` at the gateway (403 once spent);
+- a response cache. A response whose caller had already given up is kept and
+  handed to the next identical request. An identical request that arrives while
+  the first is still upstream (a client retry) waits for it instead of paying twice.
+
+sites.yaml:
+  gateway: {concurrency: 4, rpm: 0, parallel_sites: 8}
+  providers: {endpoints: [...]}     # as in data/site.yaml; default MOONSHOT_* env
+  sites:
+    - root: ../site-a
+      name: site-a                  # default: the root's directory name
+      pages: 10
+      weight: 2
+      max_calls: 80
+      steps: [generate, gates]      # also: regen (uses regen_rule / regen_hub / regen_slugs)
+      regen_rule: "version_lt:2"
+      env: {GEN_VERSION: "3"}
+"""
+import os
+import sys
+import json
+import time
+import select
+import socket
+import hashlib
+import argparse
+import threading
+import subprocess
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+import yaml
+
+from model_router import load_router
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+GATEWAY_CONCURRENCY = int(os.getenv("GATEWAY_CONCURRENCY", "4"))
+GATEWAY_RPM = int(os.getenv("GATEWAY_RPM", "0"))
+PARALLEL_SITES = int(os.getenv("PARALLEL_SITES", "8"))
+GATEWAY_CACHE_MAX = 256
+GATEWAY_CACHE_TTL = float(os.getenv("GATEWAY_CACHE_TTL", "3600"))
+STEP_SCRIPTS = {"generate": "generate_pages.py", "regen": "generate_pages.py", "gates": "quality_gates.py"}
+
+
+# ---------------------------
+# Shared limiter and cache
+# ---------------------------
+
+class FairGate:
+    """Upstream slots (in-flight cap + requests/minute), granted to the waiting site with the least weighted use."""
+
+    def __init__(self, concurrency: int = GATEWAY_CONCURRENCY, rpm: int = GATEWAY_RPM):
+        self.cond = threading.Condition()
+        self.free = max(1, concurrency)
+        self.rpm = rpm
+        self.granted = deque()  # grant times within the last minute
+        self.waiting = {}       # site -> requests waiting
+        self.used = {}          # site -> grants, in weight units
+        self.weight = {}
+
+    def _next(self) -> str | None:
+        ready = [s for s, n in self.waiting.items() if n > 0]
+        return min(ready, key=lambda s: (self.used[s] / self.weight.get(s, 1.0), s)) if ready else None
+
+    def _rate_wait(self, now: float) -> float:
+        while self.granted and now - self.granted[0] >= 60:
+            self.granted.popleft()
+        if self.rpm > 0 and len(self.granted) >= self.rpm:
+            return 60 - (now - self.granted[0])
+        return 0.0
+
+    def acquire(self, site: str) -> float:
+        """Block until `site` may send; returns seconds waited."""
+        t0 = time.time()
+        with self.cond:
+            if site not in self.used:
+                # Late joiners start level with the others instead of owning the gateway until they catch up.
+                level = min((self.used[s] / self.weight.get(s, 1.0) for s in self.used), default=0.0)
+                self.used[site] = level * self.weight.get(site, 1.0)
+            self.waiting[site] = self.waiting.get(site, 0) + 1
+            while True:
+                wait = self._rate_wait(time.time())
+                if self.free > 0 and not wait and self._next() == site:
+                    break
+                self.cond.wait(timeout=wait or None)
+            self.waiting[site] -= 1
+            self.free -= 1
+            self.used[site] += 1
+            self.granted.append(time.time())
+            self.cond.notify_all()
+        return time.time() - t0
+
+    def release(self) -> None:
+        with self.cond:
+            self.free += 1
+            self.cond.notify_all()
+
+
+class ResponseCache:
+    """Paid-for responses nobody received yet, keyed by request body; plus in-flight request coalescing."""
+
+    def __init__(self, max_items: int = GATEWAY_CACHE_MAX, ttl: float = GATEWAY_CACHE_TTL):
+        self.items = OrderedDict()  # key -> (stored at, response)
+        self.inflight = {}          # key -> threading.Event
+        self.max_items = max_items
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(payload: dict) -> str:
+        body = {k: v for k, v in payload.items() if k != "model"}
+        return hashlib.sha256(json.dumps(body, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def take(self, key: str) -> dict | None:
+        with self.lock:
+            hit = self.items.pop(key, None)
+        if hit is None or time.time() - hit[0] > self.ttl:
+            return None
+        return hit[1]
+
+    def put(self, key: str, response: dict) -> None:
+        with self.lock:
+            self.items[key] = (time.time(), response)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+    def begin(self, key: str) -> threading.Event | None:
+        """None if this request should go upstream; otherwise the Event of the identical one already there."""
+        with self.lock:
+            ev = self.inflight.get(key)
+            if ev is None:
+                self.inflight[key] = threading.Event()
+            return ev
+
+    def end(self, key: str) -> None:
+        with self.lock:
+            ev = self.inflight.pop(key, None)
+        if ev is not None:
+            ev.set()
+
+
+# ---------------------------
+# Gateway
+# ---------------------------
+
+class Gateway:
+    def __init__(self, router, sites: list[dict], concurrency: int, rpm: int):
+        self.router = router
+        self.gate = FairGate(concurrency, rpm)
+        self.cache = ResponseCache()
+        self.quota = {s["name"]: s.get("max_calls") for s in sites}
+        self.gate.weight = {s["name"]: float(s.get("weight") or 1.0) for s in sites}
+        self.stats = {s["name"]: {"calls": 0, "errors": 0, "cache_hits": 0, "wait_s": 0.0,
+                                  "prompt_tokens": 0, "completion_tokens": 0} for s in sites}
+        self.lock = threading.Lock()
+        # One pool sized for the in-flight cap, shared by every site.
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max(1, concurrency))
+        router.session.mount("https://", adapter)
+        router.session.mount("http://", adapter)
+
+    def bump(self, site: str, key: str, n=1) -> None:
+        with self.lock:
+            self.stats.setdefault(site, {}).setdefault(key, 0)
+            self.stats[site][key] += n
+
+    def complete(self, site: str, payload: dict, hub: str, page_type: str, client_gone) -> tuple[int, dict]:
+        """(HTTP status, body) for one child request."""
+        key = self.cache.key(payload)
+        hit = self.cache.take(key)
+        while hit is None:
+            other = self.cache.begin(key)
+            if other is None:
+                break
+            other.wait()  # a retry of a request still upstream: wait for its answer
+            hit = self.cache.take(key)
+        if hit is not None:
+            self.bump(site, "cache_hits")
+            return 200, hit
+
+        try:
+            quota = self.quota.get(site)
+            with self.lock:
+                st = self.stats.setdefault(site, {})
+                # Counted before the call so concurrent requests cannot overrun the quota.
+                if quota is not None and st.get("calls", 0) >= int(quota):
+                    return 403, {"error": f"site {site}: max_calls {quota} spent"}
+                st["calls"] = st.get("calls", 0) + 1
+            self.bump(site, "wait_s", self.gate.acquire(site))
+            try:
+                res = self.router.complete(payload, hub=hub, page_type=page_type)
+            finally:
+                self.gate.release()
+            usage = res.get("usage") or {}
+            self.bump(site, "prompt_tokens", int(usage.get("prompt_tokens") or 0))
+            self.bump(site, "completion_tokens", int(usage.get("completion_tokens") or 0))
+            body = {
+                "id": "gateway",
+                "object": "chat.completion",
+                "model": res["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": res["content"]},
+                             "finish_reason": res["finish_reason"]}],
+                "usage": usage,
+            }
+            if client_gone():
+                self.cache.put(key, body)
+            return 200, body
+        except RuntimeError as e:
+            self.bump(site, "errors")
+            return 502, {"error": str(e)}
+        finally:
+            self.cache.end(key)
+
+
+def peer_closed(sock: socket.socket) -> bool:
+    """True once the client has hung up (it timed out and will retry)."""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b""
+    except (OSError, ValueError):
+        return True
+
+
+def make_handler(gw: Gateway):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive: children reuse their connection to the gateway
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, code: int, obj) -> None:
+            b = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(b)))
+            self.end_headers()
+            self.wfile.write(b)
+
+        def do_POST(self):
+            n = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(n)
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_json(404, {"error": "not found"})
+                return
+            try:
+                payload = json.loads(raw or b"{}")
+            except json.JSONDecodeError:
+                self.send_json(400, {"error": "invalid JSON"})
+                return
+            site = (self.headers.get("Authorization") or "").removeprefix("Bearer ").strip() or "?"
+            code, body = gw.complete(
+                site, payload,
+                hub=self.headers.get("X-Factory-Hub") or "",
+                page_type=self.headers.get("X-Factory-Page-Type") or "",
+                client_gone=lambda: peer_closed(self.connection),
+            )
+            try:
+                self.send_json(code, body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+# ---------------------------
+# Sites
+# ---------------------------
+
+def load_sites(path: str | None, roots: list[str], pages: int) -> tuple[dict, list[dict]]:
+    cfg = {}
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            cfg = yaml.safe_load(f) or {}
+    base = os.path.dirname(os.path.abspath(path)) if path else os.getcwd()
+    entries = list(cfg.get("sites") or []) + [{"root": r} for r in roots]
+    sites, names = [], set()
+    for e in entries:
+        e = dict(e) if isinstance(e, dict) else {"root": str(e)}
+        root = os.path.abspath(os.path.join(base, str(e.get("root") or "")))
+        if not os.path.isfile(os.path.join(root, "data", "site.yaml")):
+            raise SystemExit(f"[multi] {root}: no data/site.yaml (not a factory site root)")
+        e["root"] = root
+        e["name"] = str(e.get("name") or os.path.basename(root.rstrip(os.sep)))
+        if e["name"] in names:
+            raise SystemExit(f"[multi] duplicate site name {e['name']}; set name: in sites.yaml")
+        names.add(e["name"])
+        e["pages"] = int(e.get("pages") or pages)
+        e["steps"] = list(e.get("steps") or ["generate", "gates"])
+        bad = [s for s in e["steps"] if s not in STEP_SCRIPTS]
+        if bad:
+            raise SystemExit(f"[multi] {e['name']}: unknown steps {bad} (expected {', '.join(STEP_SCRIPTS)})")
+        sites.append(e)
+    if not sites:
+        raise SystemExit("[multi] no sites given")
+    return cfg, sites
+
+
+def step_env(site: dict, step: str, gateway_url: str) -> dict:
+    env = dict(os.environ)
+    env.update({str(k): str(v) for k, v in (site.get("env") or {}).items()})
+    env.update(FACTORY_GATEWAY=gateway_url, FACTORY_SITE=site["name"], PAGES_PER_RUN=str(site["pages"]))
+    if step == "regen":
+        env["FACTORY_MODE"] = "regen"
+        for key in ("regen_rule", "regen_hub", "regen_slugs"):
+            if site.get(key):
+                env[key.upper()] = str(site[key])
+    elif step == "generate":
+        env.setdefault("FACTORY_MODE", "generate")
+    return env
+
+
+def run_site(site: dict, gateway_url: str) -> dict:
+    """Run the site's steps in order; a failing step stops the rest. Returns {step: exit code}."""
+    codes = {}
+    for step in site["steps"]:
+        t0 = time.time()
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(SCRIPTS_DIR, STEP_SCRIPTS[step])],
+            cwd=site["root"], env=step_env(site, step, gateway_url),
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding="utf-8", errors="replace",
+        )
+        for line in proc.stdout:
+            print(f"[{site['name']}] {line.rstrip()}", flush=True)
+        codes[step] = proc.wait()
+        print(f"[multi] {site['name']}: {step} exited {codes[step]} after {time.time() - t0:.0f}s", flush=True)
+        if codes[step]:
+            break
+    return codes
+
+
+def cmd_run(args) -> int:
+    cfg, sites = load_sites(args.config, args.root, args.pages)
+    gw_cfg = cfg.get("gateway") or {}
+    concurrency = int(gw_cfg.get("concurrency") or GATEWAY_CONCURRENCY)
+    router = load_router(cfg, timeout=60)
+    gw = Gateway(router, sites, concurrency, int(gw_cfg.get("rpm") or GATEWAY_RPM))
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(gw))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    print(f"[multi] {len(sites)} sites, gateway {url}, {concurrency} upstream slots")
+
+    t0 = time.time()
+    workers = max(1, min(len(sites), int(gw_cfg.get("parallel_sites") or PARALLEL_SITES)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(zip([s["name"] for s in sites], pool.map(lambda s: run_site(s, url), sites)))
+    server.shutdown()
+
+    print("\n===== MULTI-SITE SUMMARY =====")
+    print(f"{'site':<24} {'steps':<28} {'calls':>6} {'cached':>6} {'errors':>6} {'wait':>7} {'tokens':>9}")
+    for s in sites:
+        st = gw.stats.get(s["name"], {})
+        steps = " ".join(f"{k}={v}" for k, v in results[s["name"]].items())
+        print(f"{s['name'][:24]:<24} {steps[:28]:<28} {st.get('calls', 0):>6} {st.get('cache_hits', 0):>6} "
+              f"{st.get('errors', 0):>6} {st.get('wait_s', 0):>6.0f}s "
+              f"{st.get('prompt_tokens', 0) + st.get('completion_tokens', 0):>9}")
+    for st in router.summary():
+        print(f"[router] {st['id']} ({st['model']}): calls={st['calls']} p50={st['latency_p50']}s "
+              f"errors={st['error_rate']:.0%} [{'OPEN' if st['open'] else 'ok'}]")
+    print(f"Duration: {time.time() - t0:.0f}s")
+    return 1 if any(code for r in results.values() for code in r.values()) else 0
+
+
+def main(argv: list | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Run generate/regen/gates for many factory sites through one shared gateway.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("run")
+    p.add_argument("config", nargs="?", help="sites.yaml")
+    p.add_argument("--root", action="append", default=[], help="site root (repeatable), in addition to sites.yaml")
+    p.add_argument("--pages", type=int, default=int(os.getenv("PAGES_PER_RUN", "10")), help="default pages per site")
+    p.add_argument("--port", type=int, default=0, help="gateway port (default: any free port)")
+    args = ap.parse_args(argv)
+    return cmd_run(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
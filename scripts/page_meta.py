@@ -0,0 +1,134 @@
+"""
+Factory metadata sidecar (gen_version, contract_hash, prompt_hash, gate status, token cost).
+
+Usage:
+  python scripts/page_meta.py migrate      # move the fields out of existing page frontmatter
+  python scripts/page_meta.py show [slug]
+
+Kept out of page files so a contract change doesn't rewrite (and re-commit) every page.
+One slug per line, sorted, so git diffs stay proportional to the pages that changed.
+"""
+import os
+import re
+import sys
+import json
+
+from page_writer import write_if_changed
+
+PAGE_META_PATH = os.getenv("PAGE_META_PATH", "scripts/page_meta.json")
+# Fields older pages carry in frontmatter (read as a fallback until migrated)
+FRONTMATTER_KEYS = ("gen_version", "contract_hash", "prompt_hash")
+
+
+def load_meta(path: str = PAGE_META_PATH) -> dict:
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def dump_meta(entries: dict) -> str:
+    lines = [f"{json.dumps(slug)}: {json.dumps(entries[slug], sort_keys=True, separators=(',', ':'))}"
+             for slug in sorted(entries)]
+    return "{\n" + ",\n".join(lines) + "\n}\n" if lines else "{}\n"
+
+
+class PageMeta:
+    """
+    Slug -> metadata entry. `delta` collects entries touched by this process
+    (shard runs hand it to the merge step instead of saving).
+    """
+
+    def __init__(self, path: str = PAGE_META_PATH):
+        self.path = path
+        self.entries = load_meta(path)
+        self.delta = {}
+
+    def get(self, slug: str, fm: dict | None = None) -> dict:
+        """Sidecar entry, falling back to frontmatter fields for pages not migrated yet."""
+        if slug in self.entries:
+            return self.entries[slug]
+        return {k: (fm or {})[k] for k in FRONTMATTER_KEYS if k in (fm or {})}
+
+    def update(self, slug: str, **fields) -> bool:
+        """Merge `fields` into the entry; a None value removes that field."""
+        cur = self.entries.get(slug, {})
+        new = {k: v for k, v in dict(cur, **fields).items() if v is not None}
+        if new == cur and slug in self.entries:
+            return False
+        self.entries[slug] = new
+        # Removed fields stay in the delta as None so `apply` removes them on merge too.
+        removed = {k: None for k, v in (self.delta.get(slug) or {}).items() if v is None and k not in new}
+        removed.update({k: None for k, v in fields.items() if v is None})
+        self.delta[slug] = dict(new, **removed)
+        return True
+
+    def drop(self, slug: str) -> None:
+        if self.entries.pop(slug, None) is not None:
+            self.delta[slug] = None
+
+    def apply(self, delta: dict) -> None:
+        """Fold another process's delta in (None = page deleted)."""
+        for slug, entry in (delta or {}).items():
+            if entry is None:
+                self.drop(slug)
+            else:
+                self.update(slug, **entry)
+
+    def save(self) -> bool:
+        """Write only if something changed; returns True if the file was written."""
+        if not self.delta:
+            return False
+        written = write_if_changed(self.path, dump_meta(self.entries))
+        self.delta = {}
+        return written
+
+
+def strip_frontmatter_keys(md_text: str, keys=FRONTMATTER_KEYS) -> str:
+    """Drop `key: ...` lines from the frontmatter only, leaving every other byte alone."""
+    if not md_text.startswith("---"):
+        return md_text
+    parts = md_text[3:].split("\n---\n", 1)
+    if len(parts) < 2:
+        return md_text
+    pat = re.compile(rf"^(?:{'|'.join(map(re.escape, keys))})\s*:")
+    fm_lines = [ln for ln in parts[0].split("\n") if not pat.match(ln)]
+    return "---" + "\n".join(fm_lines) + "\n---\n" + parts[1]
+
+
+def migrate(content_root: str = "content/pages", path: str = PAGE_META_PATH) -> int:
+    # Imported here so loading the sidecar doesn't need the generator's env.
+    from generate_pages import iter_content_pages, read_markdown_frontmatter
+
+    meta = PageMeta(path)
+    moved = 0
+    for md in iter_content_pages(content_root):
+        with open(md, "r", encoding="utf-8") as f:
+            raw = f.read()
+        fm, _ = read_markdown_frontmatter(raw)
+        found = {k: str(fm[k]) for k in FRONTMATTER_KEYS if k in fm}
+        if not found:
+            continue
+        slug = os.path.basename(os.path.dirname(md))
+        meta.update(slug, **dict(found, **meta.entries.get(slug, {})))
+        write_if_changed(md, strip_frontmatter_keys(raw))
+        moved += 1
+    meta.save()
+    print(f"[meta] moved {', '.join(FRONTMATTER_KEYS)} out of {moved} pages into {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "migrate":
+        raise SystemExit(migrate())
+    if cmd == "show":
+        entries = load_meta()
+        for slug in (sys.argv[2:] or sorted(entries)):
+            print(f"{slug}: {json.dumps(entries.get(slug))}")
+        raise SystemExit(0)
+    raise SystemExit("Usage: python scripts/page_meta.py migrate|show [slug ...]")
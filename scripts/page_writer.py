@@ -0,0 +1,107 @@
+"""
+Page writer: canonical frontmatter, write-if-changed, atomic replace, batched flushes.
+
+A no-op write (same bytes already on disk) never touches the file, so Hugo's
+incremental build and the run's commit only see pages whose content changed.
+Real writes go to a temp file in the same directory, are fsynced, then renamed
+over the target, so a crash can't leave a half-written index.md.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+PAGE_WRITE_BATCH = int(os.getenv("PAGE_WRITE_BATCH", "8"))
+
+
+def render_frontmatter(front: dict) -> str:
+    """
+    `key: "value"` lines in insertion order. JSON string escaping is valid YAML
+    double-quoted syntax, so quotes and backslashes round-trip exactly.
+    """
+    lines = []
+    for k, v in (front or {}).items():
+        if v is None:
+            continue
+        if isinstance(v, (bool, int, float, list, dict)):
+            lines.append(f"{k}: {json.dumps(v, ensure_ascii=False)}")
+        else:
+            lines.append(f"{k}: {json.dumps(str(v).strip(), ensure_ascii=False)}")
+    return "---\n" + "\n".join(lines) + "\n---\n"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def file_hash(path: str) -> str | None:
+    try:
+        with open(path, "rb") as f:
+            return content_hash(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    d = os.path.dirname(path) or "."
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=d)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_if_changed(path: str, text: str) -> bool:
+    """Atomically write `text` unless the file already holds exactly these bytes."""
+    data = text.encode("utf-8")
+    try:
+        same_size = os.path.getsize(path) == len(data)
+    except OSError:
+        same_size = False
+    if same_size and file_hash(path) == content_hash(data):
+        return False
+    atomic_write(path, data)
+    return True
+
+
+class PageWriter:
+    """
+    Buffers page writes and flushes them every `batch_size` pages (and on flush()).
+    Safe to call add() from several generation threads.
+    """
+
+    def __init__(self, batch_size: int = PAGE_WRITE_BATCH):
+        self.batch_size = max(1, batch_size)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.written = 0
+        self.unchanged = 0
+
+    def add(self, path: str, text: str) -> None:
+        with self.lock:
+            self.pending[path] = text
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        with self.lock:
+            batch, self.pending = self.pending, {}
+        n = 0
+        for path, text in batch.items():
+            if write_if_changed(path, text):
+                n += 1
+        with self.lock:
+            self.written += n
+            self.unchanged += len(batch) - n
+        return n
@@ -0,0 +1,190 @@
+"""
+Keep data/plan.yaml stocked with todo items.
+
+Usage:
+  python scripts/plan_replenish.py [--min-todo N] [--refill-to N] [--dry-run]
+
+When fewer than PLAN_MIN_TODO items are todo, top the queue up to PLAN_REFILL_TO:
+unused titles from scripts/titles_pool.txt first (no API calls), then new titles
+generated per hub x page type. Candidates are filtered against existing page slugs,
+the plan and the manifest (exact and near duplicates), given a hub/page_type, and
+appended to the plan in one write. Pool titles get the hub their words point to
+(see HubClassifier), or none: the generator then lets the model pick the hub.
+Runs as a workflow step after the gates, so it never spends a run's time budget.
+"""
+import os
+import sys
+import math
+import argparse
+from datetime import date
+
+import bootstrap_site as bs
+import generate_pages as gp
+from corpus_pack import load_pack, parse_frontmatter
+
+PLAN_MIN_TODO = int(os.getenv("PLAN_MIN_TODO", "20"))
+PLAN_REFILL_TO = int(os.getenv("PLAN_REFILL_TO", "60"))
+# 0 = only refill from titles_pool.txt, never call the model
+PLAN_REPLENISH_GENERATE = os.getenv("PLAN_REPLENISH_GENERATE", "1").strip() == "1"
+# Evidence a pool title needs before it is pinned to a hub; below it the hub is left to the model.
+HUB_MIN_SCORE = float(os.getenv("HUB_MIN_SCORE", "1.0"))
+HUB_LABEL_WEIGHT = 3  # a hub's own id/label/description words count like this many titles
+
+PAGE_TYPE_HINTS = [
+    ("is-it-normal", ("is it normal",)),
+    ("myth-vs-reality", ("myth", "really true", "actually")),
+    ("red-flags", ("red flag", "warning sign", "signs")),
+    ("checklist", ("checklist", "what to check", "steps")),
+]
+
+
+def todo_count(plan: dict) -> int:
+    items = plan.get("items", []) if isinstance(plan, dict) else []
+    return sum(1 for it in items if isinstance(it, dict) and str(it.get("status", "todo")).lower() == "todo")
+
+
+def guess_page_type(title: str, page_types: list[str]) -> str:
+    t = title.lower()
+    for pt, hints in PAGE_TYPE_HINTS:
+        if pt in page_types and any(h in t for h in hints):
+            return pt
+    return "explainer" if "explainer" in page_types else (page_types[0] if page_types else "")
+
+
+class HubClassifier:
+    """
+    Hub for a title from word overlap with what each hub already holds: its id, label
+    and description, and the titles of its pages and plan items. A word counts by how
+    often it occurs in a hub (log-damped) times how specific it is to that hub (idf over
+    hubs), so words every hub shares decide nothing. Returns "" unless one hub clearly wins.
+    """
+
+    def __init__(self, hubs: list[dict]):
+        self.counts = {str(h["id"]): {} for h in hubs}
+        for h in hubs:
+            text = " ".join(str(h.get(k) or "") for k in ("id", "label", "description")).replace("-", " ")
+            self.add(str(h["id"]), text, HUB_LABEL_WEIGHT)
+
+    def add(self, hub: str, title: str, weight: int = 1) -> None:
+        counts = self.counts.get(hub)
+        if counts is None:
+            return
+        for w in bs.title_words(title):
+            counts[w] = counts.get(w, 0) + weight
+
+    def classify(self, title: str) -> str:
+        n = len(self.counts)
+        scores = {}
+        for w in bs.title_words(title):
+            holders = [h for h, c in self.counts.items() if w in c]
+            if not holders:
+                continue
+            idf = math.log(n / len(holders))
+            for h in holders:
+                scores[h] = scores.get(h, 0.0) + math.log1p(self.counts[h][w]) * idf
+        ranked = sorted(scores.items(), key=lambda x: -x[1])
+        if not ranked or ranked[0][1] < HUB_MIN_SCORE or (len(ranked) > 1 and ranked[1][1] == ranked[0][1]):
+            return ""
+        return ranked[0][0]
+
+
+def load_hub_classifier(hubs: list[dict], plan: dict) -> HubClassifier:
+    clf = HubClassifier(hubs)
+    for it in plan.get("items", []) if isinstance(plan, dict) else []:
+        if isinstance(it, dict) and it.get("hub"):
+            clf.add(str(it["hub"]), str(it.get("title") or ""))
+    if os.path.isdir(gp.CONTENT_ROOT):
+        with load_pack(gp.CONTENT_ROOT) as pack:
+            for _, fm_view, _ in pack.items():
+                fm = parse_frontmatter(fm_view)
+                if fm.get("hub"):
+                    clf.add(str(fm["hub"]), str(fm.get("title") or ""))
+    return clf
+
+
+def seed_known(pool: bs.TitlePool, plan: dict) -> None:
+    """Everything already published, queued or used, so candidates can't repeat it."""
+    for it in plan.get("items", []) if isinstance(plan, dict) else []:
+        if isinstance(it, dict):
+            pool.seed(str(it.get("title") or it.get("slug") or ""), str(it.get("hub") or ""))
+    # Page slugs (dir names) carry the same words as their titles; no need to parse every page.
+    if os.path.isdir(gp.CONTENT_ROOT):
+        for slug in os.listdir(gp.CONTENT_ROOT):
+            pool.seed(slug.replace("-", " "))
+    for slug in gp.load_manifest().get("used_titles", []):
+        pool.seed(str(slug).replace("-", " "))
+
+
+def replenish(min_todo: int = PLAN_MIN_TODO, refill_to: int = PLAN_REFILL_TO, dry_run: bool = False) -> int:
+    """Returns the number of plan items added."""
+    plan = gp.load_plan(gp.PLAN_PATH)
+    if not isinstance(plan, dict):
+        plan = {"items": []}
+    plan.setdefault("items", [])
+    depth = todo_count(plan)
+    if depth >= min_todo:
+        print(f"[plan] {depth} todo items (threshold {min_todo}); nothing to do")
+        return 0
+    need = max(0, refill_to - depth)
+
+    cfg = gp.load_yaml(gp.resolve_site_config_path())
+    hub_defs = [h for h in ((cfg.get("taxonomy") or {}).get("hubs") or []) if isinstance(h, dict) and h.get("id")]
+    hubs = [h["id"] for h in hub_defs]
+    page_types = (cfg.get("generation") or {}).get("page_types") or []
+
+    pool = bs.TitlePool()
+    seed_known(pool, plan)
+
+    # 1) Unused titles from the pool, filed under the hub their words point to (or left unpinned).
+    if os.path.isfile(gp.TITLES_POOL_PATH):
+        clf = load_hub_classifier(hub_defs, plan)
+        for title in gp.load_titles():
+            if len(pool) >= need:
+                break
+            pool.add(title, clf.classify(title), guess_page_type(title, page_types))
+    from_titles_pool = len(pool)
+    unpinned = sum(1 for it in pool.items if not it["hub"])
+
+    # 2) New titles from the model, per hub x page type.
+    if len(pool) < need and PLAN_REPLENISH_GENERATE:
+        site = cfg.get("site") or {}
+        bs.NICHE = bs.NICHE or str(site.get("niche") or site.get("default_meta_description") or site.get("title") or "").strip()
+        try:
+            bs.build_titles_pool(bs.BOOTSTRAP_SYSTEM, hubs, page_types, target=need, pool=pool)
+        except Exception as e:
+            # The generator still has whatever the pool provided; never block a run on this.
+            print(f"[plan] title generation failed: {type(e).__name__}: {e}")
+
+    today = date.today().isoformat()
+    added = []
+    for it in pool.items[:need]:
+        added.append({
+            "title": it["title"],
+            "slug": gp.slugify(it["title"]),
+            "hub": it["hub"],
+            "page_type": it["page_type"],
+            "status": "todo",
+            "source": "replenish",
+            "added_date": today,
+        })
+    print(f"[plan] {depth} todo < {min_todo}: adding {len(added)} items "
+          f"({min(from_titles_pool, len(added))} from titles pool, {max(0, len(added) - from_titles_pool)} generated, "
+          f"{unpinned} without a clear hub)")
+    if added and not dry_run:
+        plan["items"].extend(added)
+        gp.save_plan(gp.PLAN_PATH, plan)
+    return len(added)
+
+
+def main(argv: list | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Refill data/plan.yaml when the todo queue runs low.")
+    ap.add_argument("--min-todo", type=int, default=PLAN_MIN_TODO)
+    ap.add_argument("--refill-to", type=int, default=PLAN_REFILL_TO)
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+    replenish(args.min_todo, args.refill_to, args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
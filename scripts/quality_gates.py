@@ -1,10 +1,22 @@
 import os
 import re
 import sys
+import time
 import yaml
 from pathlib import Path
 from typing import Dict, List, Tuple
 
+import hub_index
+from contract import load_contract
+from corpus_pack import load_pack
+from link_graph import load_graph, page_links
+from page_meta import PageMeta
+from run_history import append_record, stage_ms
+from search_index import SearchIndex
+from sharding import in_shard, shard_from_args, shard_label, write_delta
+import tracing
+from tracing import span, stage_totals
+
 SITE_CONFIG_PATH = os.getenv("SITE_CONFIG_PATH", "data/site.yaml")
 CONTENT_ROOT = Path(os.getenv("CONTENT_ROOT", "content/pages"))
 DELETE_ON_FAIL = os.getenv("DELETE_ON_FAIL", "1").strip() == "1"
@@ -24,11 +36,11 @@ def read_frontmatter(md_text: str) -> Tuple[Dict, str]:
     """Return (frontmatter_dict, body_text_without_frontmatter)."""
     if not md_text.startswith("---"):
         return {}, md_text
-    parts = md_text.split("\n---\n", 2)
-    if len(parts) < 3:
+    # Skip the opening fence; the first "\n---\n" after it closes the frontmatter.
+    parts = md_text[3:].split("\n---\n", 1)
+    if len(parts) < 2:
         return {}, md_text
-    fm_raw = parts[1]
-    body = parts[2]
+    fm_raw, body = parts
     try:
         fm = yaml.safe_load(fm_raw) or {}
         if not isinstance(fm, dict):
@@ -82,283 +94,222 @@ def section_text(md: str, h2: str) -> str:
     m2 = re.search(r"^##\s+", rest, flags=re.M)
     return (rest[:m2.start()] if m2 else rest).strip()
 
-def contains_any(text: str, patterns: List[str]) -> bool:
-    for p in patterns:
-        if re.search(p, text, flags=re.I|re.M):
-            return True
-    return False
-
-# ---------------------------
-# Rules (default fallbacks)
-# ---------------------------
-
-DEFAULT_FORBIDDEN = [
-    r"\bdiagnos(e|is)\b",
-    r"\bprescrib(e|ed|ing)\b",
-    r"\bsue\b",
-    r"\btreat(ment|ments|ing)?\b",
-    r"\bcure(s|d)?\b",
-    r"\btherapy\b",
-    r"\btherapist\b",
-    r"\blawyer\b",
-    r"\baccountant\b",
-]
-
-DEFAULT_NO_DATES = [
-    r"\b(19|20)\d{2}\b",  # years
-    r"\brecent(ly)?\b",
-    r"\bcurrently\b",
-    r"\bthis\s+year\b",
-    r"\blast\s+year\b",
-    r"\btoday\b",
-    r"\bnow\b",
-]
-
-DEFAULT_NO_PRICES = [
-    r"[$€£¥]\s?\d",
-    r"\b\d+(?:\.\d+)?\s?(?:usd|aud|cad|eur|gbp|dollars|bucks)\b",
-    r"\bprice\b",
-    r"\bcost\b",
-]
-
-
-DEFAULT_NO_STATS = [
-    r"\bstudies\s+show\b",
-    r"\bresearch\s+shows\b",
-    r"\baccording\s+to\b",
-    r"\bsurvey\b",
-    r"\bstatistic(s)?\b",
-    r"\b\d{1,3}%\b",
-    r"\b\d+(?:\.\d+)?\s?(?:percent|per\s*cent)\b",
-    r"\b\d+(?:,\d{3})+\b",
-]
-DEFAULT_NO_GUARANTEES = [
-    r"\bguarantee(d|s)?\b",
-    r"\b100%\b",
-    r"\bwill\s+definitely\b",
-    r"\balways\b",
-    r"\bnever\b",
-]
-
-DEFAULT_NO_FIRST_PERSON = [
-    r"\b(i|i'm|i’ve|i've|my|mine|me|we|we're|we’ve|we've|our|ours|us)\b",
-]
-
-DEFAULT_NO_CALLS_TO_ACTION = [
-    r"\bclick\s+here\b",
-    r"\bsign\s+up\b",
-    r"\bsubscribe\b",
-    r"\bbuy\b",
-    r"\bpurchase\b",
-    r"\bdownload\b",
-    r"\bjoin\b",
-    r"\btry\s+this\b",
-    r"\byou\s+should\b",
-    r"\bmake\s+sure\s+to\b",
-    r"\bconsider\s+doing\b",
-]
-
-DEFAULT_NO_AFFILIATE = [
-    r"\baffiliate\b",
-    r"\bsponsored\b",
-    r"\breview\b",
-    r"\bcoupon\b",
-    r"\bdiscount\b",
-]
-
-DEFAULT_SUPERLATIVES = [
-    r"\bbest\b",
-    r"\bworst\b",
-    r"\bbetter\s+than\b",
-    r"\bmore\s+than\b\s+(?:any|everyone)\b",
-    r"\btop\s+\d+\b",
-]
+# Frontmatter written by the factory itself, excluded from prose prohibitions
+# (gen_version/contract_hash/prompt_hash only on pages not yet moved to the sidecar)
+MACHINE_FRONTMATTER_KEYS = ("date", "slug", "gen_version", "contract_hash", "prompt_hash")
 
 # ---------------------------
 # Validation
 # ---------------------------
 
-def validate_page(md_path: Path, cfg: dict) -> Tuple[bool, List[str], int, int]:
+def validate_page(md_path: Path, contract: dict, known_slugs: set | None = None, text: str | None = None) -> Tuple[bool, List[str], int, int]:
     """
     Returns (ok, failures, passed_rules, total_rules_scored)
     Only "scored" rules contribute to compliance percentage.
+    `contract` is contract.load_contract(): the same outline, thresholds and rule
+    sets the generator prompts with. With `known_slugs`, /pages/<slug>/ links must
+    resolve to one of them when internal_linking.broken_links is "fail"
+    (default "warn": reported by main). `text` is the page source when the caller
+    already has it (main reads pages from the corpus pack).
     """
     failures: List[str] = []
     scored_total = 0
     scored_pass = 0
 
-    gates = (cfg.get("gates") or {}) if isinstance(cfg, dict) else {}
-    generation = (cfg.get("generation") or {}) if isinstance(cfg, dict) else {}
-    internal = (cfg.get("internal_linking") or {}) if isinstance(cfg, dict) else {}
-
-    required_outline = generation.get("outline_h2") or []
-    wc_cfg = generation.get("wordcount") or {}
-    wc_min = int(wc_cfg.get("min", gates.get("wordcount_min", 800)))
-    wc_max = int(wc_cfg.get("max", gates.get("wordcount_max", 2000)))
-    ideal_min = int(wc_cfg.get("ideal_min", 1000))
-    ideal_max = int(wc_cfg.get("ideal_max", 1400))
+    required_outline = contract["outline"]
+    wc_min = contract["wordcount"]["min"]
+    wc_max = contract["wordcount"]["max"]
+    max_sent = contract["max_sentences_per_paragraph"]
+    min_links = contract["min_internal_links"]
+    forbid_external = contract["forbid_external_links"]
+    fail_broken = contract["broken_links"] == "fail"
 
-    max_sent = int(gates.get("max_sentences_per_paragraph", generation.get("style_rules", {}).get("max_sentences_per_paragraph", 3)))
-    min_links = int(internal.get("min_links", gates.get("min_internal_links", 3)))
-    forbid_external = bool(internal.get("forbid_external", gates.get("forbid_external_links", True)))
-
-    raw = md_path.read_text(encoding="utf-8")
-    fm, body = read_frontmatter(raw)
+    with span("gates.read"):
+        raw = text if text is not None else md_path.read_text(encoding="utf-8")
+        fm, body = read_frontmatter(raw)
 
     # 1) Frontmatter keys
-    for k in ["title", "slug", "description", "date", "hub", "page_type", "summary"]:
+    with span("gates.frontmatter"):
+        for k in contract["required_frontmatter"]:
+            scored_total += 1
+            if fm.get(k) is None or str(fm.get(k)).strip() == "":
+                failures.append(f"Missing frontmatter key: {k}")
+            else:
+                scored_pass += 1
+
+    # 2) Headings restrictions
+    with span("gates.headings"):
         scored_total += 1
-        if fm.get(k) is None or str(fm.get(k)).strip() == "":
-            failures.append(f"Missing frontmatter key: {k}")
+        if not has_only_h2_h3(body):
+            failures.append("Headings must be H2/H3 only (no H1 or H4+).")
         else:
             scored_pass += 1
 
-    # 2) Headings restrictions
-    scored_total += 1
-    if not has_only_h2_h3(body):
-        failures.append("Headings must be H2/H3 only (no H1 or H4+).")
-    else:
-        scored_pass += 1
-
     # 3) Outline (exact H2 set and order)
-    if required_outline:
+    with span("gates.outline"):
+        if required_outline:
+            scored_total += 1
+            got = extract_h2_sequence(body)
+            if got != required_outline:
+                failures.append(f"H2 outline mismatch. Expected exactly: {required_outline}. Got: {got}.")
+            else:
+                scored_pass += 1
+
+    # 4) Wordcount
+    with span("gates.wordcount"):
+        wc = word_count(body)
         scored_total += 1
-        got = extract_h2_sequence(body)
-        if got != required_outline:
-            failures.append(f"H2 outline mismatch. Expected exactly: {required_outline}. Got: {got}.")
+        if wc < wc_min or wc > wc_max:
+            failures.append(f"Wordcount out of bounds: {wc} (min {wc_min}, max {wc_max}).")
         else:
             scored_pass += 1
 
-    # 4) Wordcount
-    wc = word_count(body)
-    scored_total += 1
-    if wc < wc_min or wc > wc_max:
-        failures.append(f"Wordcount out of bounds: {wc} (min {wc_min}, max {wc_max}).")
-    else:
-        scored_pass += 1
-
     # 5) Paragraph sentence limit
-    scored_total += 1
-    bad_paras = 0
-    for p in split_paragraphs(body):
-        sc = sentence_count(p)
-        if sc > max_sent:
-            bad_paras += 1
-    if bad_paras > 0:
-        failures.append(f"Too many long paragraphs: {bad_paras} paragraphs exceed {max_sent} sentences.")
-    else:
-        scored_pass += 1
+    with span("gates.paragraphs"):
+        scored_total += 1
+        bad_paras = 0
+        for p in split_paragraphs(body):
+            sc = sentence_count(p)
+            if sc > max_sent:
+                bad_paras += 1
+        if bad_paras > 0:
+            failures.append(f"Too many long paragraphs: {bad_paras} paragraphs exceed {max_sent} sentences.")
+        else:
+            scored_pass += 1
 
     # 6) Internal links
-    links = extract_markdown_links(body)
-    internal_links = [u for _, u in links if u.startswith("/")]
-    external_links = [u for _, u in links if re.match(r"^(https?:)?//", u) or u.startswith("www.")]
-    scored_total += 1
-    if len(internal_links) < min_links:
-        failures.append(f"Too few internal links: {len(internal_links)} (min {min_links}).")
-    else:
-        scored_pass += 1
+    with span("gates.links"):
+        links = extract_markdown_links(body)
+        internal_links = [u for _, u in links if u.startswith("/")]
+        external_links = [u for _, u in links if re.match(r"^(https?:)?//", u) or u.startswith("www.")]
+        scored_total += 1
+        if len(internal_links) < min_links:
+            failures.append(f"Too few internal links: {len(internal_links)} (min {min_links}).")
+        else:
+            scored_pass += 1
 
-    scored_total += 1
-    if any("click here" in (t or "").lower() for t, _ in links):
-        failures.append('Link text "click here" is forbidden.')
-    else:
-        scored_pass += 1
+        scored_total += 1
+        if any("click here" in (t or "").lower() for t, _ in links):
+            failures.append('Link text "click here" is forbidden.')
+        else:
+            scored_pass += 1
 
-    scored_total += 1
-    if forbid_external and external_links:
-        failures.append(f"External links forbidden (found {len(external_links)}).")
-    else:
-        scored_pass += 1
-
-
-    # Related topics section should carry the internal links (makes linking consistent)
-    def extract_section(md: str, h2_title: str) -> str:
-        # Find "## <title>" section and return its contents until next "## "
-        pat = re.compile(rf"^##\s+{re.escape(h2_title)}\s*$", re.M)
-        m = pat.search(md)
-        if not m:
-            return ""
-        start = m.end()
-        # Next H2
-        m2 = re.search(r"^\s*##\s+", md[start:], flags=re.M)
-        end = start + m2.start() if m2 else len(md)
-        return md[start:end].strip()
-
-    related_section = extract_section(body, "Related topics and deeper reading")
-    related_links = []
-    if related_section:
-        for t, u in links_in_markdown(related_section):
-            if (u or "").startswith("/"):
-                related_links.append((t, u))
-
-    scored_total += 1
-    if len(related_links) < min_links:
-        failures.append(f'Related topics section must include at least {min_links} internal links (found {len(related_links)}).')
-    else:
-        scored_pass += 1
+        scored_total += 1
+        if forbid_external and external_links:
+            failures.append(f"External links forbidden (found {len(external_links)}).")
+        else:
+            scored_pass += 1
 
-    # 7) Hard prohibitions in body + frontmatter
-    full_text = (yaml.safe_dump(fm, sort_keys=False) + "\n" + body)
 
-    def score_rule(ok: bool, msg: str):
-        nonlocal scored_total, scored_pass
+        # Related topics section should carry the internal links (makes linking consistent)
+        def extract_section(md: str, h2_title: str) -> str:
+            # Find "## <title>" section and return its contents until next "## "
+            pat = re.compile(rf"^##\s+{re.escape(h2_title)}\s*$", re.M)
+            m = pat.search(md)
+            if not m:
+                return ""
+            start = m.end()
+            # Next H2
+            m2 = re.search(r"^\s*##\s+", md[start:], flags=re.M)
+            end = start + m2.start() if m2 else len(md)
+            return md[start:end].strip()
+
+        related_section = extract_section(body, "Related topics and deeper reading")
+        related_links = []
+        if related_section:
+            for t, u in extract_markdown_links(related_section):
+                if (u or "").startswith("/"):
+                    related_links.append((t, u))
+
         scored_total += 1
-        if ok:
-            scored_pass += 1
+        if len(related_links) < min_links:
+            failures.append(f'Related topics section must include at least {min_links} internal links (found {len(related_links)}).')
         else:
-            failures.append(msg)
-
-    score_rule(not contains_any(full_text, DEFAULT_FORBIDDEN), "Forbidden medical/legal term hit.")
-    score_rule(not contains_any(full_text, DEFAULT_NO_DATES), "Date/recency language is forbidden.")
-    score_rule(not contains_any(full_text, DEFAULT_NO_PRICES), "Price/cost language is forbidden.")
-    score_rule(not contains_any(full_text, DEFAULT_NO_STATS), "Statistics/numbered claims are forbidden.")
-    score_rule(not contains_any(full_text, DEFAULT_NO_GUARANTEES), "Guarantee/promise language is forbidden.")
-    score_rule(not contains_any(full_text, DEFAULT_NO_FIRST_PERSON), "First-person language is forbidden.")
-    score_rule(not contains_any(full_text, DEFAULT_NO_CALLS_TO_ACTION), "Calls-to-action / directive phrasing is forbidden.")
-    score_rule(not contains_any(full_text, DEFAULT_NO_AFFILIATE), "Affiliate/review language is forbidden.")
-    score_rule(not contains_any(full_text, DEFAULT_SUPERLATIVES), "Superlative/superiority language is forbidden (stay neutral).")
+            scored_pass += 1
+
+        if fail_broken and known_slugs is not None:
+            scored_total += 1
+            broken = sorted(page_links(body) - known_slugs)
+            if broken:
+                failures.append(f"Broken internal links: {', '.join(broken)}.")
+            else:
+                scored_pass += 1
+
+    # 7) Hard prohibitions in body + frontmatter
+    with span("gates.prohibitions"):
+        # Machine-set fields (date, hashes) are not prose; the year regex would always hit `date`.
+        prose_fm = {k: v for k, v in fm.items() if k not in MACHINE_FRONTMATTER_KEYS}
+        full_text = (yaml.safe_dump(prose_fm, sort_keys=False) + "\n" + body)
+
+        def score_rule(ok: bool, msg: str):
+            nonlocal scored_total, scored_pass
+            scored_total += 1
+            if ok:
+                scored_pass += 1
+            else:
+                failures.append(msg)
+
+        for rule in contract["rules"]:
+            score_rule(contract["rx"][rule["name"]].search(full_text) is None, rule["message"])
 
     # 8) Structural content presence within sections
     # Require meaningful text in the key sections
-    required_sections = ["Intro", "Definitions and key terms", "How it typically works", "Clarifying examples", "Neutral summary"]
-    for sec in required_sections:
+    with span("gates.sections"):
+        min_words = contract["section_min_words"]
+        for sec in contract["required_sections"]:
+            scored_total += 1
+            txt = section_text(body, sec)
+            if word_count(txt) < min_words:
+                failures.append(f'Section "{sec}" is too thin (<{min_words} words).')
+            else:
+                scored_pass += 1
+
+    # 9) FAQs count (look for ### Q: lines or bold questions)
+    with span("gates.faqs"):
         scored_total += 1
-        txt = section_text(body, sec)
-        if word_count(txt) < 40:
-            failures.append(f'Section "{sec}" is too thin (<40 words).')
+        faq_txt = section_text(body, "FAQs")
+        # Count question-like lines
+        q_count = len(re.findall(r"^###\s+.+", faq_txt, flags=re.M)) + len(re.findall(r"^\*\*Q[:\s].+\*\*", faq_txt, flags=re.M))
+        if q_count < contract["faq_min"]:
+            failures.append(f"Too few FAQs: {q_count} (min {contract['faq_min']}).")
         else:
             scored_pass += 1
 
-    # 9) FAQs count (look for ### Q: lines or bold questions)
-    scored_total += 1
-    faq_txt = section_text(body, "FAQs")
-    # Count question-like lines
-    q_count = len(re.findall(r"^###\s+.+", faq_txt, flags=re.M)) + len(re.findall(r"^\*\*Q[:\s].+\*\*", faq_txt, flags=re.M))
-    if q_count < int(gates.get("faq_min", 4)):
-        failures.append(f"Too few FAQs: {q_count} (min {int(gates.get('faq_min', 4))}).")
-    else:
-        scored_pass += 1
-
     ok = len(failures) == 0
     return ok, failures, scored_pass, scored_total
 
-def main() -> int:
-    cfg = load_yaml(SITE_CONFIG_PATH)
+def main(argv: List[str] | None = None) -> int:
+    started = time.time()
+    shard = shard_from_args(sys.argv[1:] if argv is None else argv)
+    contract = load_contract(SITE_CONFIG_PATH)
 
-    pages = sorted(CONTENT_ROOT.glob("*/index.md"))
+    with span("gates.pack"):
+        pack = load_pack(str(CONTENT_ROOT))
+    pages = [CONTENT_ROOT / slug / "index.md" for slug in sorted(pack.pages) if in_shard(slug, shard)]
     if not pages:
+        pack.close()
         print("No pages found to validate.")
         return 0
 
     total_scored = 0
     total_passed = 0
     failures_total = 0
+    pages_passed = 0
+    deleted = []
+    meta = PageMeta()
+    with span("gates.link_graph"):
+        graph = load_graph(str(CONTENT_ROOT))
+    # Checked against the pages that existed at the start, so one deletion can't fail its linkers in the same run.
+    known_slugs = set(graph.slugs)
 
     for md in pages:
-        ok, fails, passed, scored = validate_page(md, cfg)
+        with span("gates.page", slug=md.parent.name) as sp:
+            ok, fails, passed, scored = validate_page(md, contract, known_slugs, text=pack.text(md.parent.name))
+            sp["passed"] = ok
         total_scored += scored
         total_passed += passed
+        pages_passed += int(ok)
+        meta.update(md.parent.name, gates="pass" if ok else "fail")
 
         if not ok:
             failures_total += len(fails)
@@ -371,11 +322,57 @@ def main() -> int:
                     for p in md.parent.glob("**/*"):
                         p.unlink(missing_ok=True)
                     md.parent.rmdir()
+                    deleted.append(slug)
+                    meta.drop(slug)
                     print(f"[DEL]  {slug}: removed page folder")
+                    for src in sorted(graph.remove_page(slug)):
+                        print(f"[LINK] {src}: now links to deleted page {slug}")
                 except Exception:
                     pass
 
+    pack.close()
+
+    # Broken links per page go to the sidecar, where REGEN_RULE=broken_links picks them up.
+    broken_total = 0
+    shard_slugs = {md.parent.name for md in pages}
+    for slug in sorted(shard_slugs - set(deleted)):
+        broken = graph.broken(slug)
+        broken_total += len(broken)
+        meta.update(slug, broken_links=broken or None)
+    orphans = graph.orphans()
+    graph.save()
+    if broken_total:
+        print(f"[links] {broken_total} broken internal links on "
+              f"{sum(1 for s in shard_slugs if graph.broken(s))} pages (fix with REGEN_RULE=broken_links)")
+    print(f"[links] {len(orphans)} orphan pages (no inbound links); see `python scripts/link_graph.py report --orphans`")
+
     compliance = 0.0 if total_scored == 0 else (total_passed / total_scored) * 100.0
+    record = {
+        "run": tracing.RUN_ID,
+        "kind": "gates",
+        "pages": len(pages),
+        "passed": pages_passed,
+        "deleted": len(deleted),
+        "failures": failures_total,
+        "broken_links": broken_total,
+        "orphans": len(orphans),
+        "compliance": round(compliance, 2),
+        "duration_s": round(time.time() - started, 2),
+        "stages_ms": stage_ms(stage_totals()),
+    }
+    if shard:
+        # Deletions and history are applied by `python scripts/sharding.py merge`.
+        record["shard"] = shard_label(shard)
+        write_delta("gates", shard, {"deleted": deleted, "history": [record], "page_meta": meta.delta})
+    else:
+        append_record(record)
+        meta.save()
+        if deleted:
+            hub_index.build()
+            search = SearchIndex()
+            for slug in deleted:
+                search.remove(slug)
+            search.flush()
     print(f"\nCompliance score: {compliance:.1f}% ({total_passed}/{total_scored} checks passed)")
     if failures_total:
         print(f"Total failures: {failures_total}")
@@ -0,0 +1,76 @@
+"""
+Wall-clock budget for a factory run.
+
+RUN_DEADLINE is the number of seconds the generate step may take, counted from
+its start (0 = no deadline). Set it from the CI job's timeout, minus setup.
+Before each page the loop asks can_start(). New work starts only if the page
+is expected to finish before the deadline minus a reserve. The page time is
+the p90 of this run's observed page times, or earlier runs' seconds per attempt
+from the run history until this run has some of its own. The reserve covers
+what still has to run after the loop: flushing pages, saving the manifest, plan
+and stats, the gates step (p90 of recent gates runs, scaled by
+GATES_RESERVE_FACTOR) and the commit (COMMIT_RESERVE_S).
+
+Once can_start() says no, the loop stops issuing requests. Pages already in
+flight finish, and the run saves its state as usual.
+"""
+import os
+import time
+import threading
+
+from run_history import load_records
+
+RUN_DEADLINE = float(os.getenv("RUN_DEADLINE", "0") or 0)
+COMMIT_RESERVE_S = float(os.getenv("COMMIT_RESERVE_S", "60"))
+GATES_RESERVE_FACTOR = float(os.getenv("GATES_RESERVE_FACTOR", "1.5"))
+GATES_RESERVE_DEFAULT_S = 120.0   # no gates run in the history yet
+PAGE_S_DEFAULT = 60.0             # no page timings yet: one full call timeout
+HISTORY_WINDOW = 10
+
+
+def p90(vals: list[float]) -> float:
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(len(vals) * 0.9))]
+
+
+class RunDeadline:
+    def __init__(self, seconds: float = RUN_DEADLINE, started: float | None = None, history: list | None = None):
+        self.seconds = seconds
+        self.started = time.time() if started is None else started
+        self.page_times = []
+        self.stopped = False  # can_start() refused at least once
+        self.lock = threading.Lock()
+        records = load_records() if seconds > 0 and history is None else (history or [])
+        gates = [float(r["duration_s"]) for r in records if r.get("kind") == "gates" and r.get("duration_s")]
+        per_page = [float(r["duration_s"]) / int(r["attempted"]) for r in records
+                    if r.get("kind", "generate") == "generate" and r.get("attempted") and r.get("duration_s")]
+        gates_s = p90(gates[-HISTORY_WINDOW:]) * GATES_RESERVE_FACTOR if gates else GATES_RESERVE_DEFAULT_S
+        self.reserve = gates_s + COMMIT_RESERVE_S
+        self.history_page_s = p90(per_page[-HISTORY_WINDOW:]) if per_page else PAGE_S_DEFAULT
+
+    def remaining(self) -> float:
+        return self.seconds - (time.time() - self.started) if self.seconds > 0 else float("inf")
+
+    def page_estimate(self) -> float:
+        with self.lock:
+            return p90(self.page_times) if self.page_times else self.history_page_s
+
+    def record(self, seconds: float) -> None:
+        """Wall time of one finished page attempt (continuations and retries included)."""
+        with self.lock:
+            self.page_times.append(seconds)
+
+    def can_start(self) -> bool:
+        """True while one more page is expected to finish with the reserve still intact."""
+        if self.seconds <= 0:
+            return True
+        left, need = self.remaining(), self.page_estimate()
+        if left - self.reserve >= need:
+            return True
+        with self.lock:
+            first = not self.stopped
+            self.stopped = True
+        if first:
+            print(f"[deadline] stopping new work: {left:.0f}s left, next page ~{need:.0f}s, "
+                  f"{self.reserve:.0f}s reserved for gates and commit")
+        return False
@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import argparse
+from statistics import median
+
+RUN_HISTORY_PATH = os.getenv("RUN_HISTORY_PATH", "scripts/run_history.jsonl")
+RUN_HISTORY_MAX = int(os.getenv("RUN_HISTORY_MAX", "400"))  # records kept (oldest dropped)
+
+# "Clean run" thresholds (FACTORY_COST_POLICY.md: minimal retries, minimal deletes)
+CLEAN_MAX_RETRY_RATE = float(os.getenv("CLEAN_MAX_RETRY_RATE", "0.1"))
+CLEAN_MAX_DELETE_RATE = float(os.getenv("CLEAN_MAX_DELETE_RATE", "0.1"))
+CLEAN_STREAK_TO_SCALE = int(os.getenv("CLEAN_STREAK_TO_SCALE", "3"))
+
+
+def load_records(path: str = RUN_HISTORY_PATH) -> list[dict]:
+    if not os.path.isfile(path):
+        return []
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                out.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return out
+
+
+def append_record(rec: dict, path: str = RUN_HISTORY_PATH) -> None:
+    """Append one compact JSON line, keeping only the newest RUN_HISTORY_MAX records."""
+    rec = dict(rec)
+    rec.setdefault("ts", time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))
+    line = json.dumps(rec, separators=(",", ":"), sort_keys=True)
+    records = load_records(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if len(records) + 1 <= RUN_HISTORY_MAX:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+        return
+    keep = records[-(RUN_HISTORY_MAX - 1):] if RUN_HISTORY_MAX > 1 else []
+    with open(path, "w", encoding="utf-8") as f:
+        for r in keep:
+            f.write(json.dumps(r, separators=(",", ":"), sort_keys=True) + "\n")
+        f.write(line + "\n")
+
+
+def stage_ms(totals: dict) -> dict:
+    """Compact {stage: total ms} from tracing.stage_totals()."""
+    return {k: int(round(v.get("total_ms", 0))) for k, v in sorted(totals.items())}
+
+
+# ---------------------------
+# Analysis
+# ---------------------------
+
+def combine_records(a: dict, b: dict) -> dict:
+    """Sum counters of two shard records; wall time is the slowest shard."""
+    out = dict(a)
+    for k, v in b.items():
+        if k == "duration_s":
+            out[k] = max(float(a.get(k) or 0), float(v or 0))
+        elif k == "compliance":
+            out[k] = min(float(a.get(k) or 0), float(v or 0))
+        elif k == "deadline_stop":
+            out[k] = bool(a.get(k)) or bool(v)
+        elif k == "stages_ms" and isinstance(v, dict):
+            merged = dict(a.get(k) or {})
+            for sk, sv in v.items():
+                merged[sk] = merged.get(sk, 0) + sv
+            out[k] = merged
+        elif isinstance(v, (int, float)) and not isinstance(v, bool) and k in a:
+            out[k] = a[k] + v
+        else:
+            out.setdefault(k, v)
+    return out
+
+
+def merged_runs(records: list[dict]) -> list[dict]:
+    """Group generate + gates records of the same run id, oldest first."""
+    runs = {}
+    order = []
+    for r in records:
+        rid = r.get("run") or r.get("ts")
+        if rid not in runs:
+            runs[rid] = {"run": rid}
+            order.append(rid)
+        kind = r.get("kind", "generate")
+        if kind in runs[rid]:
+            # Parallel shards of one CI run share the run id: fold them together.
+            runs[rid][kind] = combine_records(runs[rid][kind], r)
+        else:
+            runs[rid][kind] = r
+    return [runs[rid] for rid in order if "generate" in runs[rid]]
+
+
+def run_metrics(run: dict) -> dict:
+    g = run.get("generate") or {}
+    q = run.get("gates") or {}
+    attempted = int(g.get("attempted") or 0)
+    produced = int(g.get("produced") or 0)
+    api_attempts = int(g.get("api_attempts") or 0)
+    api_calls = int(g.get("api_calls") or 0)
+    duration = float(g.get("duration_s") or 0)
+    m = {
+        "mode": g.get("mode", "generate"),
+        "produced": produced,
+        "throughput_ppm": (produced / duration * 60.0) if duration > 0 else 0.0,
+        "pass_rate": (produced / attempted) if attempted else 0.0,
+        "retry_rate": (int(g.get("retries") or 0) / api_attempts) if api_attempts else 0.0,
+        "delete_rate": (int(g.get("deletes") or 0) / attempted) if attempted else 0.0,
+        "truncation_rate": (int(g.get("truncated") or 0) / api_calls) if api_calls else 0.0,
+    }
+    if q:
+        pages = int(q.get("pages") or 0)
+        m["gate_pass_rate"] = (int(q.get("passed") or 0) / pages) if pages else 1.0
+    return m
+
+
+def is_clean(run: dict) -> bool:
+    m = run_metrics(run)
+    if m["produced"] == 0:
+        return False
+    if m["retry_rate"] > CLEAN_MAX_RETRY_RATE or m["delete_rate"] > CLEAN_MAX_DELETE_RATE:
+        return False
+    return m.get("gate_pass_rate", 1.0) >= 1.0
+
+
+def clean_streak(runs: list[dict]) -> int:
+    n = 0
+    for run in reversed(runs):
+        if not is_clean(run):
+            break
+        n += 1
+    return n
+
+
+def find_regressions(runs: list[dict], window: int, tolerance: float) -> list[str]:
+    """Compare the latest run with the median of the previous `window` runs of the same mode."""
+    if not runs:
+        return []
+    latest = run_metrics(runs[-1])
+    prev = [run_metrics(r) for r in runs[:-1]]
+    prev = [m for m in prev if m["mode"] == latest["mode"] and m["produced"] > 0][-window:]
+    if not prev:
+        return []
+
+    out = []
+    for key in ("throughput_ppm", "pass_rate", "gate_pass_rate"):
+        vals = [m[key] for m in prev if key in m]
+        if not vals or key not in latest:
+            continue
+        base = median(vals)
+        if base > 0 and latest[key] < base * (1.0 - tolerance):
+            out.append(f"{key}: {latest[key]:.3f} vs baseline {base:.3f} (median of {len(vals)} runs)")
+    return out
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+
+def cmd_show(args) -> int:
+    runs = merged_runs(load_records(args.path))[-args.last:]
+    print(f"{'run':<34} {'mode':<8} {'prod':>5} {'ppm':>7} {'pass':>6} {'gates':>6} {'retry':>6} {'trunc':>6} clean")
+    for run in runs:
+        m = run_metrics(run)
+        gates = f"{m['gate_pass_rate']:.0%}" if "gate_pass_rate" in m else "-"
+        print(f"{str(run['run'])[:34]:<34} {m['mode']:<8} {m['produced']:>5} {m['throughput_ppm']:>7.1f} "
+              f"{m['pass_rate']:>6.0%} {gates:>6} {m['retry_rate']:>6.0%} {m['truncation_rate']:>6.0%} {'yes' if is_clean(run) else 'no'}")
+    return 0
+
+
+def cmd_check(args) -> int:
+    runs = merged_runs(load_records(args.path))
+    if len(runs) < 2:
+        print("[history] not enough runs for a baseline yet")
+        return 0
+    regressions = find_regressions(runs, args.window, args.tolerance)
+    for r in regressions:
+        print(f"[REGRESSION] {r}")
+    if regressions:
+        return 1
+    print(f"[history] latest run within {args.tolerance:.0%} of the rolling baseline")
+    return 0
+
+
+def cmd_scale(args) -> int:
+    streak = clean_streak(merged_runs(load_records(args.path)))
+    ready = streak >= CLEAN_STREAK_TO_SCALE
+    print(f"[history] consecutive clean runs: {streak} (need {CLEAN_STREAK_TO_SCALE}) -> "
+          f"{'OK to raise PAGES_PER_RUN' if ready else 'hold PAGES_PER_RUN'}")
+    return 0 if ready else 1
+
+
+def main(argv: list | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Factory run history: show, regression check, scale readiness.")
+    ap.add_argument("--path", default=RUN_HISTORY_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("show", help="print recent runs")
+    p.add_argument("--last", type=int, default=10)
+    p.set_defaults(fn=cmd_show)
+    p = sub.add_parser("check", help="exit 1 if the latest run regressed vs the rolling baseline")
+    p.add_argument("--window", type=int, default=5)
+    p.add_argument("--tolerance", type=float, default=0.25)
+    p.set_defaults(fn=cmd_check)
+    p = sub.add_parser("scale", help=f"exit 0 after {CLEAN_STREAK_TO_SCALE} consecutive clean runs")
+    p.set_defaults(fn=cmd_scale)
+    args = ap.parse_args(argv)
+    return args.fn(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
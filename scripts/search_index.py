@@ -0,0 +1,224 @@
+"""
+Static search index, sharded by term prefix.
+
+Usage:
+  python scripts/search_index.py [sync|rebuild]
+
+Terms from each page's title, summary and H2 headings go into an inverted
+index written as static files:
+  static/search/meta.json         shard/chunk sizes (read once by the client)
+  static/search/t/<abc>.json      term -> [doc id, weight, doc id, weight, ...] for terms starting "abc"
+  static/search/d/<n>.json        doc id -> [slug, title] for ids n*SEARCH_DOC_CHUNK ...
+static/js/search.js fetches only the shards for the typed words and the doc
+chunks of the top hits, so a query costs a few KB however large the site is.
+
+Per-page terms are kept in scripts/search_state.json (one line per slug), so
+adding, changing or deleting a page rewrites only the shards it touches.
+"""
+import os
+import re
+import sys
+import json
+import shutil
+import hashlib
+
+from page_writer import write_if_changed
+
+SEARCH_DIR = os.getenv("SEARCH_DIR", "static/search")
+SEARCH_STATE_PATH = os.getenv("SEARCH_STATE_PATH", "scripts/search_state.json")
+SEARCH_PREFIX_LEN = 3
+SEARCH_DOC_CHUNK = int(os.getenv("SEARCH_DOC_CHUNK", "64"))
+# Highest-weight docs kept per term; very common words would otherwise dominate shard size.
+SEARCH_MAX_POSTINGS = int(os.getenv("SEARCH_MAX_POSTINGS", "100"))
+
+FIELD_WEIGHTS = {"title": 3, "summary": 2, "h2": 1}
+STOPWORDS = set("""
+a about after again all also an and any are as at be because been before being but by can could did do does
+doing down during each few for from further had has have having here how if in into is it its itself just
+more most no nor not now of off on once only or other out over own same should so some such than that the
+their them then there these they this those through to too under until up very was we were what when where
+which while who whom why will with would you your yours
+""".split())
+
+TERM_RE = re.compile(r"[a-z0-9]+")
+H2_RE = re.compile(r"^##\s+(.+?)\s*$", re.M)
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in TERM_RE.findall((text or "").lower()) if len(t) >= SEARCH_PREFIX_LEN and t not in STOPWORDS]
+
+
+def page_terms(title: str, summary: str, body: str) -> dict:
+    """term -> weight (sum of field weights over occurrences)."""
+    terms = {}
+    fields = {"title": title, "summary": summary, "h2": " ".join(H2_RE.findall(body or ""))}
+    for field, text in fields.items():
+        for t in tokenize(text):
+            terms[t] = terms.get(t, 0) + FIELD_WEIGHTS[field]
+    return terms
+
+
+def shard_key(term: str) -> str:
+    return term[:SEARCH_PREFIX_LEN]
+
+
+def load_state(path: str = SEARCH_STATE_PATH) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def dump_state(docs: dict) -> str:
+    lines = [f"{json.dumps(slug)}: {json.dumps(docs[slug], sort_keys=True, separators=(',', ':'))}" for slug in sorted(docs)]
+    return "{\n" + ",\n".join(lines) + "\n}\n" if lines else "{}\n"
+
+
+class SearchIndex:
+    """
+    Incrementally maintained index. update()/remove() record which shards and
+    doc chunks changed; flush() rewrites just those files.
+    """
+
+    def __init__(self, state_path: str = SEARCH_STATE_PATH, out_dir: str = SEARCH_DIR):
+        self.state_path = state_path
+        self.out_dir = out_dir
+        self.docs = load_state(state_path)  # slug -> {"id", "h", "title", "terms"}
+        self.postings = {}                  # term -> {doc id: weight}
+        self.by_id = {}
+        for slug, d in self.docs.items():
+            self.by_id[d["id"]] = slug
+            for t, w in d["terms"].items():
+                self.postings.setdefault(t, {})[d["id"]] = w
+        self.dirty_shards = set()
+        self.dirty_chunks = set()
+        self.changed = False
+        self.free_from = 0
+
+    def _next_id(self) -> int:
+        # Reuse the lowest free id so doc chunks stay dense after deletions.
+        i = self.free_from
+        while i in self.by_id:
+            i += 1
+        self.free_from = i + 1
+        return i
+
+    def update(self, slug: str, title: str, summary: str, body: str) -> bool:
+        terms = page_terms(title, summary, body)
+        h = hashlib.sha1(json.dumps([title, terms], sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        old = self.docs.get(slug)
+        if old and old["h"] == h:
+            return False
+        doc_id = old["id"] if old else self._next_id()
+        old_terms = old["terms"] if old else {}
+        for t in old_terms:
+            if t not in terms or terms[t] != old_terms[t]:
+                self.postings.get(t, {}).pop(doc_id, None)
+                self.dirty_shards.add(shard_key(t))
+        for t, w in terms.items():
+            if old_terms.get(t) != w:
+                self.postings.setdefault(t, {})[doc_id] = w
+                self.dirty_shards.add(shard_key(t))
+        if not old or old["title"] != title:
+            self.dirty_chunks.add(doc_id // SEARCH_DOC_CHUNK)
+        self.docs[slug] = {"id": doc_id, "h": h, "title": title, "terms": terms}
+        self.by_id[doc_id] = slug
+        self.changed = True
+        return True
+
+    def remove(self, slug: str) -> bool:
+        old = self.docs.pop(slug, None)
+        if not old:
+            return False
+        for t in old["terms"]:
+            self.postings.get(t, {}).pop(old["id"], None)
+            self.dirty_shards.add(shard_key(t))
+        self.by_id.pop(old["id"], None)
+        self.free_from = min(self.free_from, old["id"])
+        self.dirty_chunks.add(old["id"] // SEARCH_DOC_CHUNK)
+        self.changed = True
+        return True
+
+    def sync(self, content_root: str = "content/pages") -> int:
+        """Reconcile with the pages on disk (imports, merges, manual edits); returns docs changed."""
+        from hub_index import listing_fields
+
+        n = 0
+        on_disk = set()
+        if os.path.isdir(content_root):
+            for slug in sorted(os.listdir(content_root)):
+                path = os.path.join(content_root, slug, "index.md")
+                if not os.path.isfile(path):
+                    continue
+                on_disk.add(slug)
+                fm = listing_fields(path)
+                with open(path, "r", encoding="utf-8", errors="replace") as f:
+                    raw = f.read()  # frontmatter has no "## " lines, so H2s can be read from the whole file
+                n += self.update(slug, str(fm.get("title") or slug), str(fm.get("summary") or ""), raw)
+        for slug in set(self.docs) - on_disk:
+            n += self.remove(slug)
+        return n
+
+    def flush(self) -> int:
+        """Write dirty shards, doc chunks and the state file; returns files written."""
+        if not self.changed:
+            return 0
+        written = 0
+        # Group terms by shard once instead of scanning the vocabulary per dirty shard.
+        by_shard = {}
+        for t in self.postings:
+            if shard_key(t) in self.dirty_shards:
+                by_shard.setdefault(shard_key(t), []).append(t)
+        for key in sorted(self.dirty_shards):
+            out = {}
+            for t in sorted(by_shard.get(key, [])):
+                top = sorted(self.postings[t].items(), key=lambda kv: (-kv[1], kv[0]))[:SEARCH_MAX_POSTINGS]
+                if top:
+                    out[t] = [x for kv in top for x in kv]
+                else:
+                    del self.postings[t]
+            path = os.path.join(self.out_dir, "t", f"{key}.json")
+            if out:
+                written += write_if_changed(path, json.dumps(out, separators=(",", ":")))
+            elif os.path.exists(path):
+                os.remove(path)
+                written += 1
+        for c in sorted(self.dirty_chunks):
+            ids = range(c * SEARCH_DOC_CHUNK, (c + 1) * SEARCH_DOC_CHUNK)
+            chunk = {str(i): [self.by_id[i], self.docs[self.by_id[i]]["title"]] for i in ids if i in self.by_id}
+            path = os.path.join(self.out_dir, "d", f"{c}.json")
+            if chunk:
+                written += write_if_changed(path, json.dumps(chunk, ensure_ascii=False, separators=(",", ":")))
+            elif os.path.exists(path):
+                os.remove(path)
+                written += 1
+        meta = {"prefix_len": SEARCH_PREFIX_LEN, "doc_chunk": SEARCH_DOC_CHUNK, "docs": len(self.docs)}
+        written += write_if_changed(os.path.join(self.out_dir, "meta.json"), json.dumps(meta))
+        write_if_changed(self.state_path, dump_state(self.docs))
+        print(f"[search] {len(self.docs)} docs, {len(self.postings)} terms; "
+              f"{len(self.dirty_shards)} shards / {len(self.dirty_chunks)} doc chunks touched, {written} files written")
+        self.dirty_shards, self.dirty_chunks, self.changed = set(), set(), False
+        return written
+
+
+def main(argv: list | None = None) -> int:
+    cmd = (argv or ["sync"])[0]
+    if cmd not in ("sync", "rebuild"):
+        raise SystemExit("Usage: python scripts/search_index.py [sync|rebuild]")
+    if cmd == "rebuild":
+        # Start from an empty state so every shard and chunk is rewritten and stale files go.
+        for sub in ("t", "d"):
+            shutil.rmtree(os.path.join(SEARCH_DIR, sub), ignore_errors=True)
+        idx = SearchIndex(state_path=os.devnull)
+        idx.state_path = SEARCH_STATE_PATH
+    else:
+        idx = SearchIndex()
+    idx.sync()
+    idx.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
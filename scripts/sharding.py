@@ -0,0 +1,169 @@
+import os
+import sys
+import glob
+import json
+import shutil
+import hashlib
+
+SHARD_DELTA_DIR = os.getenv("SHARD_DELTA_DIR", ".factory/shards")
+
+
+def parse_shard(spec: str):
+    """'i/N' -> (i, N) with 0 <= i < N; '' -> None."""
+    spec = (spec or "").strip()
+    if not spec:
+        return None
+    try:
+        i, n = (int(x) for x in spec.split("/", 1))
+    except ValueError:
+        raise SystemExit(f"Invalid shard '{spec}' (expected i/N, e.g. 0/4)")
+    if n < 1 or not (0 <= i < n):
+        raise SystemExit(f"Invalid shard '{spec}' (need 0 <= i < N)")
+    return (i, n)
+
+
+def shard_from_args(argv: list):
+    """--shard i/N (or --shard=i/N) on the command line, else FACTORY_SHARD."""
+    for k, a in enumerate(argv):
+        if a == "--shard" and k + 1 < len(argv):
+            return parse_shard(argv[k + 1])
+        if a.startswith("--shard="):
+            return parse_shard(a.split("=", 1)[1])
+    return parse_shard(os.getenv("FACTORY_SHARD", ""))
+
+
+def shard_of(slug: str, n: int) -> int:
+    # sha1 rather than hash(): stable across processes and Python versions
+    return int(hashlib.sha1(slug.encode("utf-8")).hexdigest()[:8], 16) % n
+
+
+def in_shard(slug: str, shard) -> bool:
+    return shard is None or shard_of(slug, shard[1]) == shard[0]
+
+
+def shard_label(shard) -> str:
+    return f"{shard[0]}of{shard[1]}"
+
+
+# ---------------------------
+# Deltas
+# ---------------------------
+
+def write_delta(kind: str, shard, payload: dict) -> str:
+    """Write this shard's state changes for the merge step instead of touching shared files."""
+    os.makedirs(SHARD_DELTA_DIR, exist_ok=True)
+    path = os.path.join(SHARD_DELTA_DIR, f"{kind}-{shard_label(shard)}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(dict(payload, kind=kind, shard=list(shard)), f, indent=1)
+    return path
+
+
+def load_deltas(delta_dir: str = SHARD_DELTA_DIR) -> list[dict]:
+    out = []
+    for p in sorted(glob.glob(os.path.join(delta_dir, "*.json"))):
+        with open(p, "r", encoding="utf-8") as f:
+            out.append(json.load(f))
+    return out
+
+
+def merge_scheduler(stats: dict, delta: dict) -> dict:
+    for key, d in [("global", delta.get("global") or {})] + list((delta.get("features") or {}).items()):
+        if not d:
+            continue
+        s = stats["global"] if key == "global" else stats["features"].setdefault(
+            key, {"n": 0, "ok": 0, "tokens": 0, "latency": 0.0})
+        s["n"] += int(d.get("n") or 0)
+        s["ok"] += int(d.get("ok") or 0)
+        s["tokens"] += int(d.get("tokens") or 0)
+        s["latency"] = round(s["latency"] + float(d.get("latency") or 0.0), 3)
+    return stats
+
+
+def merge(delta_dir: str = SHARD_DELTA_DIR) -> int:
+    """
+    Fold every shard delta into plan.yaml, manifest.json, scheduler stats, token budgets,
+    page metadata and run history. Backlinks to the generated pages are the next
+    workflow step (`python scripts/backlinks.py`), once gate deletions are applied.
+    Shards own disjoint slugs, so the only shared state is in these files.
+    """
+    # Imported here so the shard helpers stay importable without the generator's env.
+    import generate_pages as gp
+    import hub_index
+    import quality_gates as qg
+    from page_meta import PageMeta
+    from run_history import append_record
+    from search_index import SearchIndex
+    from title_scheduler import load_stats, save_stats
+    from token_budget import TokenBudget, load_stats as load_token_stats, save_stats as save_token_stats
+
+    deltas = load_deltas(delta_dir)
+    if not deltas:
+        print(f"[shard] no deltas in {delta_dir}/")
+        return 0
+    # Generate deltas first: gate results (and deletions) apply to the pages they produced.
+    deltas.sort(key=lambda d: d.get("kind") == "gates")
+
+    plan = gp.load_plan(gp.PLAN_PATH)
+    plan_items = plan.get("items", []) if isinstance(plan, dict) else []
+    manifest = gp.load_manifest()
+    stats = load_stats()
+    budget = TokenBudget(load_token_stats())
+    meta = PageMeta()
+
+    used = list(manifest.get("used_titles", []))
+    seen = set(used)
+    generated = []
+    plan_changed = False
+    removed = 0
+
+    for d in deltas:
+        for done in d.get("plan_done") or []:
+            for it in plan_items:
+                if not isinstance(it, dict) or str(it.get("status", "todo")).lower() != "todo":
+                    continue
+                if (done.get("slug") and it.get("slug") == done["slug"]) or str(it.get("title", "")).strip() == done.get("title"):
+                    it["slug"] = done["slug"]
+                    it["status"] = "done"
+                    it["generated_date"] = done.get("generated_date")
+                    plan_changed = True
+                    break
+        for s in d.get("used_titles") or []:
+            if s not in seen:
+                seen.add(s)
+                used.append(s)
+        generated.extend(d.get("generated_this_run") or [])
+        if d.get("scheduler"):
+            merge_scheduler(stats, d["scheduler"])
+        budget.apply(d.get("token_budget"))
+        meta.apply(d.get("page_meta"))
+        for slug in d.get("deleted") or []:
+            meta.drop(slug)
+            page_dir = os.path.join(str(qg.CONTENT_ROOT), slug)
+            if os.path.isdir(page_dir):
+                shutil.rmtree(page_dir, ignore_errors=True)
+                removed += 1
+        for rec in d.get("history") or []:
+            append_record(rec)
+
+    manifest["used_titles"] = used
+    manifest["generated_this_run"] = generated
+    gp.save_manifest(manifest)
+    if plan_changed:
+        gp.save_plan(gp.PLAN_PATH, plan)
+    save_stats(stats)
+    save_token_stats(budget.stats)
+    meta.save()
+    hub_index.build()
+    search = SearchIndex()
+    search.sync(str(qg.CONTENT_ROOT))
+    search.flush()
+
+    shutil.rmtree(delta_dir, ignore_errors=True)
+    print(f"[shard] merged {len(deltas)} deltas: {len(generated)} pages generated, {removed} gate deletions applied")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "merge":
+        raise SystemExit("Usage: python scripts/sharding.py merge")
+    raise SystemExit(merge())
@@ -0,0 +1,138 @@
+import os
+import json
+
+SCHEDULER_STATS_PATH = os.getenv("SCHEDULER_STATS_PATH", "scripts/scheduler_stats.json")
+# Pseudo-attempts of prior (the global rate) blended into every feature's pass rate
+SCHEDULER_PRIOR = float(os.getenv("SCHEDULER_PRIOR", "4"))
+# 0 = rank by pass rate per attempt only, 1 = fully by pass rate per token
+SCHEDULER_TOKEN_WEIGHT = float(os.getenv("SCHEDULER_TOKEN_WEIGHT", "0.5"))
+# Same for wall time per attempt (API latency, continuations and retries included)
+SCHEDULER_LATENCY_WEIGHT = float(os.getenv("SCHEDULER_LATENCY_WEIGHT", "0.25"))
+
+TITLE_PREFIXES = ["is it normal", "why do", "why does", "why is", "how do", "how does", "what is", "what does", "can", "should"]
+
+
+def title_features(title: str, hub: str = "", page_type: str = "") -> list[str]:
+    t = (title or "").strip().lower()
+    words = len(t.split())
+    length = "short" if words <= 6 else "medium" if words <= 10 else "long"
+    prefix = next((p for p in TITLE_PREFIXES if t.startswith(p)), "other")
+    return [
+        f"hub:{hub or '?'}",
+        f"type:{page_type or '?'}",
+        f"len:{length}",
+        f"prefix:{prefix}",
+    ]
+
+
+def empty_stats() -> dict:
+    return {"global": {"n": 0, "ok": 0, "tokens": 0, "latency": 0.0}, "features": {}}
+
+
+def load_stats(path: str = SCHEDULER_STATS_PATH) -> dict:
+    if not os.path.isfile(path):
+        return empty_stats()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            s = json.load(f)
+    except Exception:
+        return empty_stats()
+    if not isinstance(s, dict):
+        return empty_stats()
+    s.setdefault("global", empty_stats()["global"])
+    s.setdefault("features", {})
+    return s
+
+
+def save_stats(stats: dict, path: str = SCHEDULER_STATS_PATH) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=1, sort_keys=True)
+
+
+class TitleScheduler:
+    """
+    Orders work to maximize passing pages per attempt, per token and per second.
+
+    Items are dicts with at least "title"; optional "hub", "page_type", "priority"
+    (higher first). Higher priority tiers are always drained first; within a tier,
+    hubs are interleaved (each pick divides a hub's score by 1 + picks so far) and
+    each hub offers its best-scoring title. Ties keep plan order.
+    """
+
+    def __init__(self, items: list[dict], stats: dict | None = None):
+        self.stats = stats or empty_stats()
+        # Outcomes recorded by this process only (shard runs hand this to the merge step)
+        self.delta = empty_stats()
+        self.remaining = [dict(it, _order=i) for i, it in enumerate(items)]
+        self.picks = {}
+
+    def _feature_stats(self, item: dict) -> list[dict]:
+        feats = self.stats["features"]
+        keys = title_features(item.get("title", ""), item.get("hub", ""), item.get("page_type", ""))
+        return [feats[k] for k in keys if k in feats]
+
+    def expected_pass(self, item: dict) -> float:
+        g = self.stats["global"]
+        prior = (g["ok"] + 1) / (g["n"] + 2)
+        rates = [(f["ok"] + SCHEDULER_PRIOR * prior) / (f["n"] + SCHEDULER_PRIOR) for f in self._feature_stats(item)]
+        return sum(rates) / len(rates) if rates else prior
+
+    def expected_tokens(self, item: dict) -> float:
+        g = self.stats["global"]
+        g_tok = g["tokens"] / g["n"] if g["n"] else 0.0
+        toks = [f["tokens"] / f["n"] for f in self._feature_stats(item) if f["n"] and f["tokens"]]
+        return sum(toks) / len(toks) if toks else g_tok
+
+    def expected_latency(self, item: dict) -> float:
+        g = self.stats["global"]
+        g_lat = g.get("latency", 0.0) / g["n"] if g["n"] else 0.0
+        lats = [f["latency"] / f["n"] for f in self._feature_stats(item) if f["n"] and f.get("latency")]
+        return sum(lats) / len(lats) if lats else g_lat
+
+    def score(self, item: dict) -> float:
+        p = self.expected_pass(item)
+        g = self.stats["global"]
+        g_tok = g["tokens"] / g["n"] if g["n"] else 0.0
+        tok = self.expected_tokens(item)
+        if g_tok > 0 and tok > 0:
+            p *= (g_tok / tok) ** SCHEDULER_TOKEN_WEIGHT
+        g_lat = g.get("latency", 0.0) / g["n"] if g["n"] else 0.0
+        lat = self.expected_latency(item)
+        if g_lat > 0 and lat > 0:
+            p *= (g_lat / lat) ** SCHEDULER_LATENCY_WEIGHT
+        return p
+
+    def next_item(self) -> dict | None:
+        if not self.remaining:
+            return None
+        top = max(float(it.get("priority") or 0) for it in self.remaining)
+        tier = [it for it in self.remaining if float(it.get("priority") or 0) == top]
+
+        best_by_hub = {}
+        for it in tier:
+            hub = it.get("hub") or ""
+            key = (self.score(it), -it["_order"])
+            if hub not in best_by_hub or key > best_by_hub[hub][0]:
+                best_by_hub[hub] = (key, it)
+
+        def hub_key(hub: str):
+            (score, neg_order), _ = best_by_hub[hub]
+            return (score / (1 + self.picks.get(hub, 0)), neg_order)
+
+        hub = max(best_by_hub, key=hub_key)
+        item = best_by_hub[hub][1]
+        self.remaining.remove(item)
+        self.picks[hub] = self.picks.get(hub, 0) + 1
+        return item
+
+    def record(self, item: dict, ok: bool, tokens: int = 0, latency: float = 0.0) -> None:
+        keys = ["global"] + title_features(item.get("title", ""), item.get("hub", ""), item.get("page_type", ""))
+        for stats in (self.stats, self.delta):
+            for k in keys:
+                s = stats["global"] if k == "global" else stats["features"].setdefault(
+                    k, {"n": 0, "ok": 0, "tokens": 0, "latency": 0.0})
+                s["n"] += 1
+                s["ok"] += int(bool(ok))
+                s["tokens"] += int(tokens)
+                s["latency"] = round(s["latency"] + float(latency), 3)
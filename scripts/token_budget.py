@@ -0,0 +1,154 @@
+"""
+Learned output-token budgets per page type and hub.
+
+Usage:
+  python scripts/token_budget.py show
+
+Every page request records its completion tokens and whether it was cut off
+(finish_reason "length"). The next request for the same page type / hub asks
+for the TOKEN_BUDGET_QUANTILE of recent usage plus headroom, clamped to the
+hard caps in FACTORY_COST_POLICY.md, instead of one global MAX_OUTPUT_TOKENS.
+Long page types stop getting truncated and short ones stop reserving capacity
+they never use. Continuations ask only for what the cut page is still missing.
+"""
+import os
+import sys
+import json
+import threading
+
+TOKEN_STATS_PATH = os.getenv("TOKEN_STATS_PATH", "scripts/token_stats.json")
+# Hard caps (FACTORY_COST_POLICY.md, MAX_OUTPUT_TOKENS 1600-1800): a learned budget never
+# leaves this range. The env vars can only narrow it; lowering the floor is a policy change.
+POLICY_MIN_OUTPUT_TOKENS = 1600
+POLICY_MAX_OUTPUT_TOKENS = 1800
+TOKEN_BUDGET_MIN = max(POLICY_MIN_OUTPUT_TOKENS, int(os.getenv("TOKEN_BUDGET_MIN", str(POLICY_MIN_OUTPUT_TOKENS))))
+TOKEN_BUDGET_MAX = min(POLICY_MAX_OUTPUT_TOKENS, int(os.getenv("TOKEN_BUDGET_MAX", str(POLICY_MAX_OUTPUT_TOKENS))))
+TOKEN_BUDGET_HEADROOM = float(os.getenv("TOKEN_BUDGET_HEADROOM", "1.15"))
+TOKEN_BUDGET_QUANTILE = 0.9
+TOKEN_MIN_SAMPLES = 8      # below this a key falls back to the broader estimate
+TOKEN_SAMPLES_KEPT = 50    # recent samples per key, so budgets follow prompt/model changes
+# A truncated response only says "needed more than max_tokens"; count it as this much more.
+TRUNCATED_INFLATE = 1.25
+CONTINUATION_MIN_TOKENS = 300
+CONTINUATION_MARGIN = 200  # small fields (summary, closing) that may be missing besides body_md
+
+
+def empty_stats() -> dict:
+    return {"keys": {}}
+
+
+def load_stats(path: str = TOKEN_STATS_PATH) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            s = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return empty_stats()
+    if not isinstance(s, dict) or not isinstance(s.get("keys"), dict):
+        return empty_stats()
+    return s
+
+
+def save_stats(stats: dict, path: str = TOKEN_STATS_PATH) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=1, sort_keys=True)
+
+
+def quantile(sorted_vals: list, q: float) -> float:
+    pos = (len(sorted_vals) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (pos - lo)
+
+
+def clamp(n: float) -> int:
+    return int(min(TOKEN_BUDGET_MAX, max(TOKEN_BUDGET_MIN, n)))
+
+
+def budget_keys(hub: str, page_type: str) -> list[str]:
+    return ["global", f"type:{page_type or '?'}", f"hub:{hub or '?'}"]
+
+
+class TokenBudget:
+    """
+    Per-key recent samples: {"samples": [tokens, ...], "n": calls, "truncated": cut-off calls}.
+    `delta` holds this process's observations (shard runs hand it to the merge step).
+    Safe to use from several generation threads.
+    """
+
+    def __init__(self, stats: dict | None = None, default: int = TOKEN_BUDGET_MIN):
+        self.stats = stats if stats is not None else empty_stats()
+        self.default = default
+        self.delta = []
+        self.lock = threading.Lock()
+
+    def estimate(self, key: str) -> float | None:
+        s = self.stats["keys"].get(key)
+        if not s or len(s["samples"]) < TOKEN_MIN_SAMPLES:
+            return None
+        return quantile(sorted(s["samples"]), TOKEN_BUDGET_QUANTILE)
+
+    def expected_tokens(self, hub: str = "", page_type: str = "") -> float:
+        """Learned page size: the larger of the page-type and hub estimates, else global, else the default."""
+        with self.lock:
+            _, *specific = budget_keys(hub, page_type)
+            ests = [e for e in (self.estimate(k) for k in specific) if e is not None]
+            if not ests:
+                g = self.estimate("global")
+                ests = [g] if g is not None else []
+        return max(ests) * TOKEN_BUDGET_HEADROOM if ests else float(self.default)
+
+    def page_budget(self, hub: str = "", page_type: str = "") -> int:
+        """max_tokens for a full page."""
+        return clamp(self.expected_tokens(hub, page_type))
+
+    def continuation_budget(self, hub: str, page_type: str, received_tokens: float) -> int:
+        """
+        max_tokens for the rest of a cut page: expected page size minus what already arrived.
+        Uses the unclamped size, so pages that outgrow TOKEN_BUDGET_MAX finish in one follow-up.
+        """
+        need = self.expected_tokens(hub, page_type) - received_tokens + CONTINUATION_MARGIN
+        return int(min(TOKEN_BUDGET_MAX, max(CONTINUATION_MIN_TOKENS, need)))
+
+    def record(self, hub: str, page_type: str, tokens: int, truncated: bool, max_tokens: int) -> None:
+        obs = {"hub": hub or "", "page_type": page_type or "", "tokens": int(tokens),
+               "truncated": bool(truncated), "max_tokens": int(max_tokens)}
+        with self.lock:
+            self._apply(obs)
+            self.delta.append(obs)
+
+    def apply(self, observations: list | None) -> None:
+        """Fold observations recorded elsewhere (shard deltas) into the stats."""
+        with self.lock:
+            for obs in observations or []:
+                self._apply(obs)
+
+    def _apply(self, obs: dict) -> None:
+        sample = obs["max_tokens"] * TRUNCATED_INFLATE if obs["truncated"] else obs["tokens"]
+        for k in budget_keys(obs["hub"], obs["page_type"]):
+            s = self.stats["keys"].setdefault(k, {"samples": [], "n": 0, "truncated": 0})
+            s["samples"] = (s["samples"] + [round(sample)])[-TOKEN_SAMPLES_KEPT:]
+            s["n"] += 1
+            s["truncated"] += int(obs["truncated"])
+
+
+def main(argv: list | None = None) -> int:
+    cmd = (argv or ["show"])[0]
+    if cmd != "show":
+        raise SystemExit("Usage: python scripts/token_budget.py show")
+    budget = TokenBudget(load_stats())
+    keys = budget.stats["keys"]
+    print(f"{'key':<32} {'calls':>6} {'trunc':>6} {'p50':>6} {'p90':>6} {'budget':>7}")
+    for k in sorted(keys, key=lambda k: (k != "global", k)):
+        s = keys[k]
+        vals = sorted(s["samples"])
+        est = budget.estimate(k)
+        own = f"{clamp(est * TOKEN_BUDGET_HEADROOM)}" if est is not None else "-"
+        print(f"{k[:32]:<32} {s['n']:>6} {s['truncated'] / s['n'] if s['n'] else 0:>6.0%} "
+              f"{quantile(vals, 0.5) if vals else 0:>6.0f} {quantile(vals, 0.9) if vals else 0:>6.0f} {own:>7}")
+    print(f"(budget '-' = fewer than {TOKEN_MIN_SAMPLES} samples; caps {TOKEN_BUDGET_MIN}..{TOKEN_BUDGET_MAX})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import atexit
+import time
+import functools
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1").strip() == "1"
+TRACE_DIR = os.getenv("TRACE_DIR", ".factory/traces")
+
+# Steps of one CI job share GITHUB_RUN_ID, so generate + gates land in the same file.
+RUN_ID = (
+    os.getenv("FACTORY_RUN_ID")
+    or (f"gh-{os.environ['GITHUB_RUN_ID']}-{os.getenv('GITHUB_RUN_ATTEMPT', '1')}" if os.getenv("GITHUB_RUN_ID") else "")
+    or time.strftime("%Y%m%dT%H%M%S", time.gmtime()) + f"-{os.getpid()}"
+)
+
+_lock = threading.Lock()
+_fh = None
+_totals = {}  # span name -> [count, total_ms]
+
+
+def trace_path() -> str:
+    return os.path.join(TRACE_DIR, f"{RUN_ID}.jsonl")
+
+
+def _write(rec: dict) -> None:
+    global _fh
+    with _lock:
+        t = _totals.setdefault(rec["span"], [0, 0.0])
+        t[0] += 1
+        t[1] += rec.get("dur_ms", 0.0)
+        if not TRACE_ENABLED:
+            return
+        if _fh is None:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            _fh = open(trace_path(), "a", encoding="utf-8", buffering=1 << 16)
+        _fh.write(json.dumps(rec, default=str) + "\n")
+
+
+def flush() -> None:
+    with _lock:
+        if _fh is not None:
+            _fh.flush()
+
+
+atexit.register(flush)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time a block and append one JSON line: {run, span, ts, dur_ms, ok, ...attrs}.
+    Yields the attrs dict so the block can add fields (status, tokens, ...).
+    """
+    t0 = time.perf_counter()
+    ok = True
+    try:
+        yield attrs
+    except BaseException as e:
+        ok = False
+        attrs.setdefault("error", f"{type(e).__name__}: {e}"[:300])
+        raise
+    finally:
+        rec = {"run": RUN_ID, "span": name, "ts": round(time.time(), 3),
+               "dur_ms": round((time.perf_counter() - t0) * 1000.0, 3), "ok": ok}
+        rec.update(attrs)
+        _write(rec)
+
+
+def traced(name: str):
+    """Decorator form of span() for whole functions."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def start_run(run_id: str) -> None:
+    """
+    Start a new run in this process: its own run id and trace file, empty stage totals.
+    The factory daemon calls it per job; one-shot scripts use the run id from import.
+    """
+    global RUN_ID, _fh
+    with _lock:
+        if _fh is not None:
+            _fh.close()
+            _fh = None
+        RUN_ID = run_id
+        _totals.clear()
+
+
+def stage_totals() -> dict:
+    """{span name: {"count": n, "total_ms": ms}} for this process, even when tracing to disk is off."""
+    with _lock:
+        return {k: {"count": v[0], "total_ms": round(v[1], 3)} for k, v in _totals.items()}
+
+
+# ---------------------------
+# Report
+# ---------------------------
+
+def percentile(sorted_vals: list, q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[i]
+
+
+def summarize(paths: list) -> dict:
+    by_span = {}
+    for p in paths:
+        with open(p, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                by_span.setdefault(rec.get("span", "?"), []).append(rec)
+
+    out = {}
+    for name, recs in by_span.items():
+        durs = sorted(float(r.get("dur_ms", 0.0)) for r in recs)
+        out[name] = {
+            "count": len(recs),
+            "errors": sum(1 for r in recs if not r.get("ok", True)),
+            "total_ms": round(sum(durs), 1),
+            "p50_ms": round(percentile(durs, 0.50), 1),
+            "p95_ms": round(percentile(durs, 0.95), 1),
+            "max_ms": round(durs[-1], 1) if durs else 0.0,
+        }
+    return out
+
+
+def report(argv: list) -> int:
+    paths = argv or sorted(Path(TRACE_DIR).glob("*.jsonl"), key=lambda p: p.stat().st_mtime)[-1:]
+    if not paths:
+        print(f"No traces found in {TRACE_DIR}/")
+        return 1
+    stats = summarize([str(p) for p in paths])
+    print(f"Trace: {', '.join(str(p) for p in paths)}")
+    print(f"{'span':<28} {'count':>7} {'errors':>6} {'total_ms':>11} {'p50_ms':>9} {'p95_ms':>9} {'max_ms':>9}")
+    for name, s in sorted(stats.items(), key=lambda kv: -kv[1]["total_ms"]):
+        print(f"{name:<28} {s['count']:>7} {s['errors']:>6} {s['total_ms']:>11.1f} "
+              f"{s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['max_ms']:>9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "report":
+        raise SystemExit("Usage: python scripts/tracing.py report [trace.jsonl ...]")
+    raise SystemExit(report(sys.argv[2:]))
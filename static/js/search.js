@@ -0,0 +1,102 @@
+/*
+  Client for the sharded search index written by scripts/search_index.py.
+  Each typed word (3+ chars) needs one term shard (/search/t/<first 3 chars>.json);
+  the top hits then need their doc chunks (/search/d/<n>.json). Everything is cached,
+  so a query costs a few KB regardless of site size.
+*/
+(function () {
+  var input = document.getElementById("siteSearch");
+  var box = document.getElementById("siteSearchResults");
+  if (!input || !box) return;
+
+  var base = input.getAttribute("data-index") || "/search/";
+  var root = base.replace(/search\/$/, "");
+  var MAX_RESULTS = 8;
+  var cache = {};
+  var meta = null;
+  var timer = null;
+  var seq = 0;
+
+  function getJSON(path) {
+    if (!cache[path]) {
+      cache[path] = fetch(base + path)
+        .then(function (r) { return r.ok ? r.json() : {}; })
+        .catch(function () { return {}; });
+    }
+    return cache[path];
+  }
+
+  function words(q) {
+    return (q.toLowerCase().match(/[a-z0-9]+/g) || []).filter(function (w) { return w.length >= 3; });
+  }
+
+  function clear() {
+    box.innerHTML = "";
+    box.hidden = true;
+  }
+
+  function render(hits, docs) {
+    box.innerHTML = "";
+    if (!hits.length) {
+      box.innerHTML = '<div class="search-empty">No matching checks.</div>';
+    }
+    hits.forEach(function (id) {
+      var d = docs[id];
+      if (!d) return;
+      var a = document.createElement("a");
+      a.className = "search-hit";
+      a.href = root + "pages/" + d[0] + "/";
+      a.textContent = d[1];
+      box.appendChild(a);
+    });
+    box.hidden = false;
+  }
+
+  function search(q) {
+    var ws = words(q);
+    if (!ws.length) { clear(); return; }
+    var mine = ++seq;
+    var metaP = meta ? Promise.resolve(meta) : getJSON("meta.json").then(function (m) { meta = m; return m; });
+
+    Promise.all([metaP].concat(ws.map(function (w) { return getJSON("t/" + w.slice(0, 3) + ".json"); })))
+      .then(function (res) {
+        var chunk = res[0].doc_chunk || 64;
+        var score = {}, matched = {};
+        ws.forEach(function (w, i) {
+          var shard = res[i + 1], seen = {};
+          Object.keys(shard).forEach(function (term) {
+            if (term.indexOf(w) !== 0) return; // prefix match, so "burn" finds "burnout"
+            var p = shard[term];
+            for (var j = 0; j < p.length; j += 2) {
+              score[p[j]] = (score[p[j]] || 0) + p[j + 1];
+              if (!seen[p[j]]) { seen[p[j]] = 1; matched[p[j]] = (matched[p[j]] || 0) + 1; }
+            }
+          });
+        });
+        // Pages matching more of the words first, then by weight.
+        var hits = Object.keys(score).map(Number).sort(function (a, b) {
+          return (matched[b] - matched[a]) || (score[b] - score[a]) || (a - b);
+        }).slice(0, MAX_RESULTS);
+        var chunks = {};
+        hits.forEach(function (id) { chunks[Math.floor(id / chunk)] = 1; });
+        return Promise.all(Object.keys(chunks).map(function (c) { return getJSON("d/" + c + ".json"); }))
+          .then(function (parts) {
+            if (mine !== seq) return;
+            var docs = {};
+            parts.forEach(function (p) { Object.keys(p).forEach(function (k) { docs[k] = p[k]; }); });
+            render(hits, docs);
+          });
+      });
+  }
+
+  input.addEventListener("input", function () {
+    clearTimeout(timer);
+    timer = setTimeout(function () { search(input.value); }, 120);
+  });
+  input.addEventListener("keydown", function (e) {
+    if (e.key === "Escape") { input.value = ""; clear(); }
+  });
+  document.addEventListener("click", function (e) {
+    if (e.target !== input && !box.contains(e.target)) clear();
+  });
+})();